@@ -0,0 +1,156 @@
+"""
+NebulaDL - Analysis Memory Benchmark
+
+在固定内存预算下解析合成的大播放列表和多格式视频，检查解析过程的内存峰值。
+合成提取器在本进程内注册，不访问网络。
+
+用法:
+    python bench/analyze_memory.py [--entries 5000] [--formats 40] [--budget-mb 16]
+
+超出预算时退出码为 1。
+"""
+
+import os
+import sys
+import gc
+import time
+import argparse
+import tracemalloc
+from typing import Any, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+
+from core.downloader import VideoAnalyzer
+from core.canonical import url_canonicalizer
+
+
+def _fake_format(video_id: str, i: int) -> dict[str, Any]:
+    """接近真实 DASH 格式的大小：签名地址、请求头、分片列表。"""
+    height = (144, 240, 360, 480, 720, 1080, 1440, 2160)[i % 8]
+    audio = i % 5 == 0
+    base = f'https://cdn.bench.invalid/{video_id}/{i}?sig=' + 'x' * 200 + '&expire=9999999999'
+    return {
+        'format_id': f'{i}',
+        'url': base,
+        'ext': 'm4a' if audio else 'mp4',
+        'height': None if audio else height,
+        'width': None if audio else height * 16 // 9,
+        'vcodec': 'none' if audio else 'avc1.640028',
+        'acodec': 'mp4a.40.2' if audio else 'none',
+        'tbr': 128.0 if audio else height * 4.0,
+        'abr': 128.0 if audio else None,
+        'filesize': 1000000 + i * 1000,
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (bench) ' + 'y' * 100,
+            'Accept': '*/*',
+            'Accept-Language': 'en-us,en;q=0.5',
+            'Sec-Fetch-Mode': 'navigate',
+        },
+        'fragments': [{'path': f'seg-{n}.m4s', 'duration': 2.0} for n in range(10)],
+        'protocol': 'http_dash_segments',
+    }
+
+
+def _fake_video(video_id: str, n_formats: int) -> dict[str, Any]:
+    return {
+        'id': video_id,
+        'title': f'Synthetic video {video_id}',
+        'webpage_url': f'https://bench.invalid/watch/{video_id}',
+        'thumbnail': f'https://bench.invalid/thumb/{video_id}.jpg',
+        'duration': 600,
+        'uploader': 'bench',
+        'description': 'd' * 2000,
+        'formats': [_fake_format(video_id, i) for i in range(n_formats)],
+    }
+
+
+class SyntheticIE(InfoExtractor):
+    """nebuladl-bench:playlist:<条目数>:<每条格式数> / nebuladl-bench:video:<格式数>"""
+
+    IE_NAME = 'nebuladl-bench'
+    _VALID_URL = r'nebuladl-bench:(?P<kind>playlist|video):(?P<n>\d+)(?::(?P<formats>\d+))?'
+
+    def _real_extract(self, url: str) -> dict[str, Any]:
+        m = self._match_valid_url(url)
+        n = int(m.group('n'))
+        if m.group('kind') == 'video':
+            return _fake_video('single', n)
+        n_formats = int(m.group('formats') or 40)
+        # 条目为完整的视频信息（部分站点的列表页就是这样返回的），逐个生成
+        entries = (_fake_video(f'e{i}', n_formats) for i in range(n))
+        return self.playlist_result(entries, 'bench-playlist', f'Synthetic playlist ({n})')
+
+
+class _BenchYoutubeDL(yt_dlp.YoutubeDL):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        ie = SyntheticIE()
+        ie.set_downloader(self)
+        # 放在最前面：Generic 会匹配任意链接
+        self._ies = {ie.ie_key(): ie, **self._ies}
+        self._ies_instances[ie.ie_key()] = ie
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def measure(url: str) -> tuple[dict[str, Any], float, float]:
+    """(解析结果, 耗时秒, Python 分配峰值 MB)"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = VideoAnalyzer.analyze(url)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='NebulaDL analysis memory benchmark')
+    parser.add_argument('--entries', type=int, default=5000, help='播放列表条目数')
+    parser.add_argument('--formats', type=int, default=40, help='每个视频的格式数')
+    parser.add_argument('--budget-mb', type=float, default=16.0, help='每次解析的 Python 内存分配峰值预算（MB）')
+    args = parser.parse_args()
+
+    yt_dlp.YoutubeDL = _BenchYoutubeDL  # type: ignore[misc]
+    url_canonicalizer.ie_key('https://example.com/')  # 分派索引不计入测量
+
+    cases = [
+        ('playlist', f'nebuladl-bench:playlist:{args.entries}:{args.formats}'),
+        ('video', f'nebuladl-bench:video:{args.formats}'),
+    ]
+    failed = False
+    for name, url in cases:
+        result, elapsed, peak_mb = measure(url)
+        if name == 'playlist':
+            ok = len((result.get('playlist') or {}).get('urls') or ()) == args.entries
+        else:
+            ok = bool(result.get('success'))
+        within = peak_mb <= args.budget_mb
+        failed = failed or not ok or not within
+        print(f'{name:<9} {elapsed:7.2f}s  peak {peak_mb:7.1f} MB / {args.budget_mb:.0f} MB  '
+              f'{"ok" if ok else "WRONG RESULT"}{"" if within else "  OVER BUDGET"}')
+        if not ok:
+            print('  ', result.get('error'))
+
+    rss = _peak_rss_mb()
+    if rss is not None:
+        print(f'process peak RSS {rss:.1f} MB')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
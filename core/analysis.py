@@ -0,0 +1,231 @@
+"""
+NebulaDL - Analysis Jobs Module
+
+可取消的解析任务：每次解析是一个带 job_id 的任务，在有界线程池中执行。
+新的解析会取代同一分组中尚未完成的解析，超时会真正中止 yt-dlp 提取
+（在下一次网络请求前抛出），工作线程不会在后台堆积。
+
+解析结果缓存：粘贴链接后即在后台（独立的低并发线程池，不占用交互解析的线程）预解析，
+结果（含完整的提取信息）按视频键缓存，
+之后的解析请求直接命中或等待进行中的同一解析，下载任务也复用其提取信息。
+"""
+
+import copy
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Callable, Any
+
+from .metrics import engine_metrics
+from .prefetch import info_expiry
+
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_CANCELLED = 'cancelled'
+JOB_TIMEOUT = 'timeout'
+
+_CANCEL_MESSAGES = {
+    'superseded': '解析已被新的请求取代',
+    'cancel': '解析已取消',
+    'timeout': '网络异常，解析超时，请检查网络连接或稍后再试',
+}
+
+
+@dataclass
+class AnalysisJob:
+    id: str
+    url: str
+    group: str = ''
+    created: float = field(default_factory=time.time)
+    state: str = JOB_PENDING
+    reason: str = ''
+    result: Optional[dict[str, Any]] = None
+    stop_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    done_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def cancel(self, reason: str = 'cancel') -> None:
+        if not self.reason:
+            self.reason = reason
+        self.stop_event.set()
+
+
+class AnalysisRunner:
+    """有界线程池中的解析任务（线程安全）"""
+
+    MAX_WORKERS = 3
+    TIMEOUT_SECONDS = 180
+
+    def __init__(
+        self,
+        max_workers: int = MAX_WORKERS,
+        timeout: float = TIMEOUT_SECONDS,
+        call_later: Optional[Callable[..., Any]] = None,
+        name: str = 'analyze',
+    ):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'nebuladl-{name}')
+        self._timeout = timeout
+        # 超时定时器：默认每个任务一个 threading.Timer；传入事件循环的 call_later 可避免额外线程
+        self._call_later = call_later or self._thread_timer
+        self._lock = threading.Lock()
+        self._jobs: dict[str, AnalysisJob] = {}
+
+    def submit(
+        self,
+        url: str,
+        work: Callable[[AnalysisJob], dict[str, Any]],
+        on_done: Optional[Callable[[AnalysisJob], None]] = None,
+        group: str = '',
+    ) -> AnalysisJob:
+        """提交解析任务；group 非空时取消同组中尚未完成的任务。"""
+        job = AnalysisJob(id=uuid.uuid4().hex, url=url, group=group)
+        with self._lock:
+            if group:
+                for other in self._jobs.values():
+                    if other.group == group:
+                        other.cancel('superseded')
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, work, on_done)
+        return job
+
+    def cancel(self, job_id: str, reason: str = 'cancel') -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        job.cancel(reason)
+        return True
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+    @staticmethod
+    def _thread_timer(delay: float, fn: Callable[..., Any], *args: Any) -> threading.Timer:
+        timer = threading.Timer(delay, fn, args=args)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+    def _run(self, job: AnalysisJob, work: Callable[[AnalysisJob], dict[str, Any]], on_done: Optional[Callable[[AnalysisJob], None]]) -> None:
+        result: Optional[dict[str, Any]] = None
+        started = time.monotonic()
+        if not job.stop_event.is_set():
+            job.state = JOB_RUNNING
+            # 超时只计算实际执行时间，不包括在线程池中排队的时间
+            timer = self._call_later(self._timeout, job.cancel, 'timeout')
+            try:
+                result = work(job)
+            except Exception as e:
+                result = {'success': False, 'error': f'发生未知错误: {str(e)}'}
+            finally:
+                timer.cancel()
+
+        if not isinstance(result, dict):
+            result = {'success': False, 'error': '发生未知错误: 无效的解析结果'}
+        if job.stop_event.is_set() and not result.get('success'):
+            reason = job.reason or 'cancel'
+            result = {'success': False, 'cancelled': reason != 'timeout', 'error': _CANCEL_MESSAGES.get(reason, _CANCEL_MESSAGES['cancel'])}
+            job.state = JOB_TIMEOUT if reason == 'timeout' else JOB_CANCELLED
+        else:
+            job.state = JOB_DONE
+        outcome = ('success' if result.get('success') else 'error') if job.state == JOB_DONE else job.state
+        engine_metrics.analyze_seconds.observe(time.monotonic() - started, result=outcome)
+
+        job.result = result
+        with self._lock:
+            self._jobs.pop(job.id, None)
+        job.done_event.set()
+        if on_done is not None:
+            try:
+                on_done(job)
+            except Exception:
+                pass
+
+
+@dataclass
+class CachedAnalysis:
+    result: dict[str, Any]              # 返回给界面的解析结果
+    info: Optional[dict[str, Any]]      # yt-dlp 提取信息（sanitize 后），供下载任务复用
+    fresh_until: float
+
+
+class AnalysisCache:
+    """
+    按视频键缓存的解析结果（线程安全，LRU 有界）
+
+    有效期与共享解析源相同：最多 MAX_AGE 秒，且在最早过期的签名地址之前失效。
+    begin/end 标记进行中的解析，同一视频的并发请求只解析一次。
+    """
+
+    MAX_ENTRIES = 64   # 提取信息可能有数百 KB，只保留最近的视频
+    MAX_AGE = 1800
+    EXPIRY_MARGIN = 120
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, CachedAnalysis] = OrderedDict()
+        self._inflight: dict[str, threading.Event] = {}
+
+    def get(self, key: str) -> Optional[CachedAnalysis]:
+        """未过期的缓存条目（result 为副本，可以修改）。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() >= entry.fresh_until:
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+        return CachedAnalysis(copy.deepcopy(entry.result), entry.info, entry.fresh_until)
+
+    def put(self, key: str, result: dict[str, Any], info: Optional[dict[str, Any]] = None) -> None:
+        if not key or not result.get('success'):
+            return
+        now = time.time()
+        fresh_until = now + self.MAX_AGE
+        expires = info_expiry(info) if info else None
+        if expires is not None:
+            fresh_until = min(fresh_until, expires - self.EXPIRY_MARGIN)
+        if fresh_until <= now:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = CachedAnalysis(copy.deepcopy(result), info, fresh_until)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def begin(self, key: str) -> Optional[threading.Event]:
+        """标记开始解析；该键已在解析中时返回其完成事件（调用方应等待后重新查询缓存）。"""
+        with self._lock:
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                self._inflight[key] = threading.Event()
+            return waiter
+
+    def end(self, key: str) -> None:
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def is_pending(self, key: str) -> bool:
+        """已缓存或正在解析。"""
+        with self._lock:
+            if key in self._inflight:
+                return True
+            entry = self._entries.get(key)
+            return entry is not None and time.time() < entry.fresh_until
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
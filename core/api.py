@@ -5,31 +5,52 @@ NebulaDL - JavaScript Bridge API Module
 import os
 import json
 import uuid
+import time
 import threading
-import queue
+from collections import deque
+import functools
 from typing import Optional, Any
 from urllib.parse import urlparse
 
 import webview
-from .downloader import VideoAnalyzer, DownloadTask
-from .history import download_history
+from .downloader import VideoAnalyzer, DownloadTask, SharedSource, _format_bytes
+from .recorder import LiveRecordTask
+from .history import download_history, HistoryFilter, SORT_KEYS
+from .library import library_index
+from .subscriptions import subscription_store, Subscription
+from .schedule import WindowPolicy, WindowLimits, parse_windows, parse_rate
+from .bandwidth import bandwidth_governor
+from .retry import RetryPolicy, classify_error, ERROR_RATE_LIMITED
+from .analysis import AnalysisRunner, AnalysisJob, AnalysisCache
+from .orchestrator import Orchestrator, EventFanout, LoopTimer
+from .diskspace import disk_admission, required_bytes, published_bytes, same_volume
+from .scratch import scratch_space
+from .prefetch import MetadataPrefetcher
+from .timeline import TaskTimeline, timeline_store, format_timeline, summarize
+from .metrics import engine_metrics, metrics_registry, metrics_server
+from .thumbnails import thumbnail_cache, thumbnail_server, CARD_PREVIEW_WIDTH, HISTORY_PREVIEW_WIDTH
+from .planner import DownloadPlanner, PLAN_ATTACH, PLAN_EXISTS, make_video_key
+from .canonical import url_canonicalizer
+from .cookies import browser_cookie_store, find_browser_cookie_dbs, is_auth_failure
+from .settings import settings_store, DebouncedJsonWriter, SettingsChange
 
 
 class JsApi:
     """暴露给 JavaScript 的 API 接口"""
 
-    SETTINGS_FILE = os.path.join(os.path.expanduser('~'), '.nebuladl_settings.json')
     COOKIE_MAP_FILE = os.path.join(os.path.expanduser('~'), '.nebuladl_cookies.json')
     
     def __init__(self, window: Any = None):
         self._window = window
-        self._js_lock = threading.Lock()
 
-        self._settings: dict[str, Any] = self._load_settings()
+        # 单个事件循环线程：队列/槽位/定时器/JS 事件都在这里处理
+        self._loop = Orchestrator()
+        self._events = EventFanout(self._loop, self._evaluate_js)
 
-        self._download_dir = self._settings.get(
-            'download_path',
-            os.path.join(os.path.expanduser('~'), 'Downloads'),
+        self._settings = settings_store
+
+        self._download_dir = self._settings.current.download_path or os.path.join(
+            os.path.expanduser('~'), 'Downloads'
         )
         self._current_video_info = None
 
@@ -38,18 +59,80 @@ class JsApi:
         self._task_meta: dict[str, dict[str, Any]] = {}
         self._task_state: dict[str, str] = {}
 
-        # Track whether we've downloaded the thumbnail for a given URL.
+        # Track whether we've downloaded the thumbnail for a given video key.
         # Used to avoid repeatedly downloading the same cover when user downloads
         # multiple resolutions of the same video.
         self._thumb_done: set[str] = set()
 
-        self._pending: queue.Queue[str] = queue.Queue()
-        self._cond = threading.Condition()
+        # Dedup index across requests: (video key, format) -> queued/running task
+        # or completed file on disk. Video keys are canonical (extractor, id)
+        # pairs; this map records where analysis reported a different id.
+        self._video_keys: dict[str, str] = {}
+        # 提前建立提取器分派索引，第一次规范化链接时不必等待
+        threading.Thread(target=url_canonicalizer.index_size, daemon=True).start()
+        library_index.seed(download_history.get_records(limit=download_history.MAX_RECORDS))
+        self._planner = DownloadPlanner(library_index)
+        threading.Thread(target=library_index.rescan, daemon=True).start()
+
+        # 暂存目录：启动时清理上次遗留的数据（此时没有任何任务在运行）
+        scratch_space.configure(self._settings.current.scratch_dir)
+        threading.Thread(target=scratch_space.collect_garbage, daemon=True).start()
+
+        # Tasks for the same video (e.g. several resolutions) share one
+        # extraction and one cached audio track.
+        self._sources: dict[str, SharedSource] = {}
+        self._task_sources: dict[str, SharedSource] = {}
+        self._sources_lock = threading.Lock()
+        self._syncing: set[str] = set()
+        self._analysis = AnalysisRunner(call_later=self._loop.call_later)
+        # 预解析使用独立的小线程池：批量粘贴的链接不会排在用户点击的解析前面
+        self._prefetch_analysis = AnalysisRunner(max_workers=self.PREFETCH_WORKERS, call_later=self._loop.call_later,
+                                                 name='prefetch')
+        # 解析结果缓存：粘贴后预解析的结果直接用于展示和下载
+        self._analysis_cache = AnalysisCache()
+        # 排队任务的元数据预取：槽位空出时任务直接开始传输
+        self._prefetcher = MetadataPrefetcher()
+        self._sync_lock = threading.Lock()
+
+        # 以下两个集合只在事件循环线程中修改
+        self._pending: deque[str] = deque()
         self._active: set[str] = set()
-        self._scheduler_thread = threading.Thread(target=self._scheduler_loop, daemon=True)
-        self._scheduler_thread.start()
+        self._task_started: dict[str, float] = {}
+        # 每个任务的事件时间线（跨暂停/重试共享，结束后持久化）
+        self._timelines: dict[str, TaskTimeline] = {}
+
+        # Time-window policy: slot caps / rate caps / pause by time of day.
+        self._policy = WindowPolicy.from_text(self._settings.current.schedule_windows)
+        self._limits = WindowLimits()
+        self._window_held: set[str] = set()  # tasks paused by the policy, resumed automatically
+        self._window_timer: Optional[LoopTimer] = None
+        self._disk_waiting: set[str] = set()  # 因磁盘空间不足而留在队列中的任务
+        self._disk_timer: Optional[LoopTimer] = None
+        self._loop.call_soon(self._window_tick)
 
         self._cookie_map: dict[str, str] = self._load_cookie_map()
+        self._cookie_map_writer = DebouncedJsonWriter(self.COOKIE_MAP_FILE)
+        browser_cookie_store.configure(self._settings.current.cookie_browser_db)
+
+        self._settings.subscribe(self._on_threads_changed, keys=('threads',))
+        self._settings.subscribe(self._on_cookie_db_changed, keys=('cookie_browser_db',))
+        self._settings.subscribe(self._on_schedule_changed, keys=('schedule_windows',))
+        self._settings.subscribe(self._on_bandwidth_changed, keys=('bandwidth_limit',))
+        self._settings.subscribe(self._on_scratch_changed, keys=('scratch_dir',))
+        self._settings.subscribe(self._on_metrics_port_changed, keys=('metrics_port',))
+        self._update_bandwidth()
+
+        # 调度状态类指标在采集时读取（不在热路径上维护）
+        self._queued_at: dict[str, float] = {}
+        metrics_registry.gauge('tasks', '各状态的任务数', ('state',), callback=self._task_state_counts)
+        metrics_registry.gauge('slots_active', '正在下载的任务数', callback=lambda: {(): len(self._active)})
+        metrics_registry.gauge('slots_capacity', '当前可用的下载槽位数（含时段规则）',
+                               callback=lambda: {(): self._effective_threads()})
+        metrics_registry.gauge('queue_length', '排队中的任务数', callback=lambda: {(): len(self._pending)})
+        metrics_registry.gauge('analysis_active', '进行中的解析数', callback=lambda: {(): self._analysis.active_count() + self._prefetch_analysis.active_count()})
+        metrics_registry.gauge('bandwidth_limit_bytes', '当前生效的全局限速（0 表示不限）',
+                               callback=lambda: {(): bandwidth_governor.rate or 0})
+        metrics_server.configure(self._settings.current.metrics_port)
 
     def _load_cookie_map(self) -> dict[str, str]:
         try:
@@ -67,11 +150,7 @@ class JsApi:
         return {}
 
     def _save_cookie_map(self) -> None:
-        try:
-            with open(self.COOKIE_MAP_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self._cookie_map, f, ensure_ascii=False, indent=2)
-        except Exception:
-            pass
+        self._cookie_map_writer.schedule(lambda: dict(self._cookie_map))
 
     def _extract_domain(self, url_or_domain: str) -> str:
         raw = (url_or_domain or '').strip()
@@ -99,11 +178,7 @@ class JsApi:
             host = host[4:]
         return host
 
-    def _cookiefile_for_url(self, url: str) -> Optional[str]:
-        host = self._extract_domain(url)
-        if not host:
-            return None
-
+    def _mapped_cookiefile(self, host: str) -> Optional[str]:
         # Try exact host first, then fall back by stripping leading subdomains.
         cur = host
         while cur:
@@ -115,6 +190,21 @@ class JsApi:
             cur = cur.split('.', 1)[1]
         return None
 
+    def _cookiefile_for_url(self, url: str) -> Optional[str]:
+        host = self._extract_domain(url)
+        if not host:
+            return None
+
+        # Manually imported cookies.txt wins over the browser profile cache.
+        path = self._mapped_cookiefile(host)
+        if path:
+            return path
+        return browser_cookie_store.cookiefile_for(host)
+
+    def _uses_browser_cookies(self, url: str) -> bool:
+        host = self._extract_domain(url)
+        return bool(host and browser_cookie_store.db_path and not self._mapped_cookiefile(host))
+
     def get_cookie_mappings(self) -> str:
         items = [{'domain': k, 'path': v} for k, v in sorted(self._cookie_map.items())]
         return json.dumps({'success': True, 'items': items}, ensure_ascii=False)
@@ -160,53 +250,287 @@ class JsApi:
         self._cookie_map.pop(domain, None)
         self._save_cookie_map()
         return json.dumps({'success': True, 'domain': domain}, ensure_ascii=False)
+
+    def get_browser_cookie_sources(self) -> str:
+        """列出检测到的浏览器 Cookie 数据库及当前配置"""
+        return json.dumps({
+            'success': True,
+            'current': browser_cookie_store.db_path or '',
+            'items': find_browser_cookie_dbs(),
+        }, ensure_ascii=False)
+
+    def set_browser_cookie_db(self, path: str) -> str:
+        """设置浏览器 Cookie 数据库路径（空字符串表示停用）"""
+        path = (path or '').strip()
+        if path and not os.path.isfile(path):
+            return json.dumps({'success': False, 'error': 'Cookie 数据库文件不存在'}, ensure_ascii=False)
+
+        self._settings.update(cookie_browser_db=path)
+        return json.dumps({'success': True, 'path': path}, ensure_ascii=False)
     
     def set_window(self, window: Any):
         """设置 pywebview 窗口引用"""
         self._window = window
 
-    def _load_settings(self) -> dict[str, Any]:
-        """从用户目录加载设置"""
-        try:
-            if os.path.exists(self.SETTINGS_FILE):
-                with open(self.SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if isinstance(data, dict):
-                        return data
-        except Exception:
-            pass
-        return {}
+    def _video_key_for(self, url: str) -> str:
+        key = url_canonicalizer.video_key(url)
+        return self._video_keys.get(key, key)
+
+    @staticmethod
+    def _analysis_key(url: str) -> str:
+        """解析前即可得到的视频键（youtu.be / 移动版 / 带参数的链接指向同一个键）。"""
+        return url_canonicalizer.video_key(url)
+
+    def _attach_source(self, task_id: str, video_key: str, url: str) -> SharedSource:
+        with self._sources_lock:
+            src = self._task_sources.get(task_id)
+            if src is not None:
+                return src
+            src = self._sources.get(video_key)
+            if src is None:
+                src = SharedSource(url)
+                self._sources[video_key] = src
+                cached = self._analysis_cache.get(self._analysis_key(url))
+                if cached is not None and cached.info:
+                    src.seed(cached.info)
+            src.acquire()
+            self._task_sources[task_id] = src
+            return src
+
+    def _release_source(self, task_id: str) -> None:
+        with self._sources_lock:
+            src = self._task_sources.pop(task_id, None)
+            if src is None:
+                return
+            if src.release():
+                for key, cur in list(self._sources.items()):
+                    if cur is src:
+                        self._sources.pop(key, None)
 
-    def _save_settings(self) -> None:
-        """保存设置到用户目录"""
+    def _effective_threads(self) -> int:
+        """获取实际并发数：设置中的并发数（1-16）再受当前时段规则限制（暂停时段为 0）"""
+        threads = self._settings.current.threads
+        limits = self._limits
+        if limits.paused:
+            return 0
+        if limits.max_slots is not None:
+            return min(threads, limits.max_slots)
+        return threads
+
+    def _update_bandwidth(self) -> None:
+        """全局限速取设置值与当前时段上限中较小者，运行中的任务立即生效。"""
+        rates = [r for r in (parse_rate(self._settings.current.bandwidth_limit), self._limits.rate_limit) if r]
+        bandwidth_governor.set_rate(min(rates) if rates else None)
+
+    def _on_bandwidth_changed(self, change: SettingsChange) -> None:
+        self._update_bandwidth()
+
+    def _on_scratch_changed(self, change: SettingsChange) -> None:
+        # 只影响之后启动的任务；正在下载的任务继续使用原来的暂存目录
+        scratch_space.configure(change.new.scratch_dir)
+
+    def _on_schedule_changed(self, change: SettingsChange) -> None:
+        self._policy = WindowPolicy.from_text(change.new.schedule_windows)
+        self._loop.call_soon(self._window_tick)
+
+    def _window_tick(self) -> None:
+        """（事件循环）在时段边界应用规则；有待恢复的任务时每秒检查一次。"""
+        if self._window_timer is not None:
+            self._window_timer.cancel()
         try:
-            with open(self.SETTINGS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self._settings, f, ensure_ascii=False, indent=2)
+            self._apply_window_limits()
         except Exception:
-            # 设置保存失败不应影响主流程
             pass
+        delay = 1.0 if self._window_held else self._policy.seconds_to_boundary()
+        # 至少每 5 分钟重新计算一次（系统休眠/时钟调整）
+        self._window_timer = self._loop.call_later(min(max(delay, 1.0), 300.0), self._window_tick)
+
+    def _apply_window_limits(self) -> None:
+        new = self._policy.limits()
+        old = self._limits
+        if new != old:
+            self._limits = new
+            self._update_bandwidth()
+
+            running = sorted(
+                (tid for tid in list(self._active) if self._task_state.get(tid) == 'downloading'),
+                key=lambda tid: self._task_started.get(tid, 0.0),
+            )
+            for tid in running[self._effective_threads():]:
+                self._window_held.add(tid)
+                self._pause_task(tid)
+            self._pump()
 
-    def _effective_threads(self) -> int:
-        """获取实际并发数（1-16）"""
-        try:
-            v = int(self._settings.get('threads') or 1)
-        except Exception:
-            v = 1
-        return max(1, min(16, v))
+        if new.paused:
+            return
+        for tid in list(self._window_held):
+            if tid in self._tasks:
+                continue  # 线程尚未退出
+            self._window_held.discard(tid)
+            if self._task_state.get(tid) == 'paused':
+                # 重新排队，由调度器按新的并发上限启动
+                self.resume_download(tid)
+
+    def _task_class(self, format_id: str) -> Any:
+        """直播录制使用 LiveRecordTask，其余格式使用 DownloadTask。"""
+        if format_id == 'live':
+            return functools.partial(
+                LiveRecordTask,
+                segment_minutes=self._settings.current.live_segment_minutes,
+                defer_callback=self._on_task_deferred,
+            )
+        return DownloadTask
+
+    def _on_task_deferred(self, task_id: str, until: float, status: str) -> None:
+        """首映/预约直播未开播：释放下载槽位，到点后再重新排队。"""
+        self._task_state[task_id] = 'scheduled'
+        self._timeline(task_id).phase('waiting', status=status)
+        self._emit_progress(task_id, -1, status)
+        self._on_task_done(task_id, keep_meta=True)
+
+        self._loop.call_later(max(1.0, until - time.time()), self._requeue_deferred, task_id)
+
+    def _schedule_retry(self, task_id: str, err: str) -> bool:
+        """临时故障自动重试：释放下载槽位，退避结束后重新排队。返回 False 表示应按失败处理。"""
+        meta = self._task_meta.get(task_id)
+        if meta is None or err == '已取消' or self._task_state.get(task_id) == 'cancelled':
+            return False
+        cancel_event = self._task_cancel.get(task_id)
+        if cancel_event and cancel_event.is_set():
+            return False
+
+        task = self._tasks.get(task_id)
+        raw = str(getattr(task, 'raw_error', '') or '')
+        meta['raw_error'] = raw
+        kind = classify_error(raw)
+        attempt = int(meta.get('retry_attempt') or 0) + 1
+        policy = RetryPolicy(max_attempts=self._settings.current.retry_attempts)
+        delay = policy.next_delay(attempt, kind)
+        if delay is None:
+            return False
+
+        meta['retry_attempt'] = attempt
+        self._timeline(task_id).event('retry', attempt=attempt, kind=kind, delay=round(delay, 1))
+        engine_metrics.retries.inc(kind=kind)
+        reason = '请求过于频繁' if kind == ERROR_RATE_LIMITED else '网络错误'
+        status = f'{reason}，{int(delay)} 秒后第 {attempt} 次重试'
+        self._on_task_deferred(task_id, time.time() + delay, status)
+        return True
+
+    def _requeue_deferred(self, task_id: str) -> None:
+        # 等待期间被暂停/取消的任务不再自动排队
+        if self._task_state.get(task_id) != 'scheduled' or task_id not in self._task_meta:
+            return
+        cancel_event = self._task_cancel.get(task_id)
+        if cancel_event and cancel_event.is_set():
+            return
+        self._respawn_task(task_id)
+
+    def _on_threads_changed(self, change: SettingsChange) -> None:
+        # 并发数变化：按新的槽位数启动排队中的任务
+        self._loop.call_soon(self._pump)
+
+    def _on_cookie_db_changed(self, change: SettingsChange) -> None:
+        browser_cookie_store.configure(change.new.cookie_browser_db or None)
 
-    def _emit_js(self, js: str) -> None:
-        """线程安全调用 JS。不要在持有 _cond 时调用。"""
+    def _evaluate_js(self, script: str) -> None:
+        if self._window:
+            self._window.evaluate_js(script)
+
+    def _emit_js(self, js: str, key: Optional[str] = None) -> None:
+        """线程安全地发送 JS 事件：合并到下一批次执行；相同 key 的事件只保留最新一条。"""
         if not self._window:
             return
+        self._events.post(js, key)
+
+    def _emit_progress(self, task_id: str, percent: int, status: str) -> None:
+        tid_json = json.dumps(task_id, ensure_ascii=False)
+        status_json = json.dumps(status, ensure_ascii=False)
+        self._emit_js(f"updateProgress({tid_json}, {int(percent)}, {status_json})", key=f'progress:{task_id}')
+
+    def _enqueue(self, task_id: str) -> None:
+        """把任务加入下载队列（可从任意线程调用）。"""
+        self._loop.call_soon(self._enqueue_now, task_id)
+
+    def _task_state_counts(self) -> dict[tuple[str, ...], float]:
+        counts: dict[tuple[str, ...], float] = {}
+        for state in list(self._task_state.values()):
+            counts[(state,)] = counts.get((state,), 0) + 1
+        return counts
+
+    def _on_metrics_port_changed(self, change: SettingsChange) -> None:
+        metrics_server.configure(change.new.metrics_port)
+
+    def _timeline(self, task_id: str) -> TaskTimeline:
+        timeline = self._timelines.get(task_id)
+        if timeline is None:
+            timeline = self._timelines.setdefault(task_id, TaskTimeline())
+        return timeline
+
+    def _finish_timeline(self, task_id: str, status: str, error: str = '', keep: bool = False) -> None:
+        """任务结束：保存时间线；keep 为真时保留内存中的实例（手动重试会继续记录）。"""
+        timeline = self._timelines.get(task_id) if keep else self._timelines.pop(task_id, None)
+        if timeline is None:
+            return
+        timeline.finish(status, error)
+        engine_metrics.tasks_finished.inc(status=status)
+        data = timeline.to_dict()
+        meta = self._task_meta.get(task_id) or {}
+        data['title'] = meta.get('title') or meta.get('url') or ''
+        data['format_id'] = meta.get('format_id') or ''
+        timeline_store.save(task_id, data)
+
+    def _enqueue_now(self, task_id: str) -> None:
+        self._timeline(task_id).phase('queued')
+        self._queued_at.setdefault(task_id, time.monotonic())
+        self._pending.append(task_id)
+        self._pump()
+
+    def _release_slot(self, task_id: str) -> None:
+        self._active.discard(task_id)
+        self._pump()
+
+    def _admit_disk(self, task_id: str) -> bool:
+        """按预估峰值占用向目标卷预留空间；放不下时提示一次并留在队列中。"""
+        meta = self._task_meta.get(task_id) or {}
+        need = required_bytes(int(meta.get('estimated_bytes') or 0), str(meta.get('format_id') or ''),
+                              self._settings.current.convert_mp4)
+        # 峰值占用（分片 + 合并输出）发生在暂存目录所在的卷上；暂存目录在另一卷上时，
+        # 成品移动到下载目录还需要在下载卷上放得下
+        volume_dir = scratch_space.root or self._download_dir
+        needs = [(volume_dir, need)]
+        if scratch_space.root and not same_volume(scratch_space.root, self._download_dir):
+            final = published_bytes(int(meta.get('estimated_bytes') or 0), str(meta.get('format_id') or ''))
+            needs.append((self._download_dir, final))
+        if disk_admission.try_reserve_all(task_id, needs):
+            self._disk_waiting.discard(task_id)
+            return True
+        if task_id not in self._disk_waiting:
+            self._disk_waiting.add(task_id)
+            self._timeline(task_id).event('disk_wait', need=need)
+            avail = min(max(0, disk_admission.available(path) or 0) for path, _n in needs)
+            self._emit_progress(task_id, -1, f'等待磁盘空间（需要 {_format_bytes(need)}，可用 {_format_bytes(avail)}）')
+        return False
+
+    def _cancel_queued(self, task_id: str) -> None:
         try:
-            with self._js_lock:
-                self._window.evaluate_js(js)
-        except Exception:
-            pass
-
-    def _scheduler_loop(self) -> None:
-        while True:
-            task_id = self._pending.get()
+            self._pending.remove(task_id)
+        except ValueError:
+            return
+        tid_json = json.dumps(task_id, ensure_ascii=False)
+        msg_json = json.dumps('已取消', ensure_ascii=False)
+        self._emit_js(f"onDownloadError({tid_json}, {msg_json})")
+        self._on_task_done(task_id)
+
+    def _recheck_disk(self) -> None:
+        self._disk_timer = None
+        self._pump()
+
+    def _pump(self) -> None:
+        """（事件循环）有空闲槽位时按顺序启动排队中的任务。"""
+        held: list[str] = []
+        while self._pending and len(self._active) < self._effective_threads():
+            task_id = self._pending.popleft()
             cancel_event = self._task_cancel.get(task_id)
             if cancel_event and cancel_event.is_set():
                 # 任务还未开始即被取消
@@ -218,43 +542,220 @@ class JsApi:
 
             # If user paused the task before it started, skip starting it.
             if self._task_state.get(task_id) == 'paused':
-                tid_json = json.dumps(task_id, ensure_ascii=False)
-                msg_json = json.dumps('暂停', ensure_ascii=False)
-                self._emit_js(f"updateProgress({tid_json}, -1, {msg_json})")
+                self._emit_progress(task_id, -1, '暂停')
                 continue
 
-            with self._cond:
-                while len(self._active) >= self._effective_threads():
-                    self._cond.wait(timeout=0.5)
-                self._active.add(task_id)
-
-            # 启动任务线程
             task = self._tasks.get(task_id)
             if task is None:
-                with self._cond:
-                    self._active.discard(task_id)
-                    self._cond.notify_all()
                 continue
 
-            # Re-check pause after waiting for slot.
-            if self._task_state.get(task_id) == 'paused':
-                with self._cond:
-                    self._active.discard(task_id)
-                    self._cond.notify_all()
-                tid_json = json.dumps(task_id, ensure_ascii=False)
-                msg_json = json.dumps('暂停', ensure_ascii=False)
-                self._emit_js(f"updateProgress({tid_json}, -1, {msg_json})")
+            # 空间不足的任务保持原有顺序留在队列中，后面较小的任务可以先开始
+            if not self._admit_disk(task_id):
+                held.append(task_id)
                 continue
 
-            tid_json = json.dumps(task_id, ensure_ascii=False)
-            msg_json = json.dumps('正在启动...', ensure_ascii=False)
-            self._emit_js(f"updateProgress({tid_json}, -1, {msg_json})")
+            self._active.add(task_id)
+            self._emit_progress(task_id, -1, '正在启动...')
             self._task_state[task_id] = 'downloading'
+            self._task_started[task_id] = time.monotonic()
+            queued_at = self._queued_at.pop(task_id, None)
+            if queued_at is not None:
+                engine_metrics.queue_wait.observe(self._task_started[task_id] - queued_at)
+            bandwidth_governor.set_weight(task_id, (self._task_meta.get(task_id) or {}).get('priority') or 1.0)
+            task.preallocate = self._settings.current.preallocate
+            task.scratch_dir = scratch_space.task_dir(task_id)
+            timeline = self._timeline(task_id)
+            timeline.phase('starting')
+            task.timeline = timeline
             task.start()
+
+        if held:
+            self._pending.extendleft(reversed(held))
+            # 用户可能手动清理了磁盘：定期重新检查
+            if self._disk_timer is None:
+                self._disk_timer = self._loop.call_later(30.0, self._recheck_disk)
+        self._prefetch_queued()
+
+    def _prefetch_queued(self) -> None:
+        """（事件循环）为队列前面、预计在地址过期前能开始的任务预取元数据。"""
+        slots = max(1, self._effective_threads())
+        for position, task_id in enumerate(self._pending):
+            if position >= MetadataPrefetcher.MAX_DEPTH:
+                break
+            task = self._tasks.get(task_id)
+            source = getattr(task, 'source', None)
+            if task is None or source is None or source.is_fresh():
+                continue
+            cancel_event = self._task_cancel.get(task_id)
+            if (cancel_event and cancel_event.is_set()) or self._task_state.get(task_id) == 'paused':
+                continue
+            video_key = str((self._task_meta.get(task_id) or {}).get('video_key') or '')
+            extractor = '' if video_key.startswith('url:') else video_key.split(':', 1)[0]
+            if position >= self._prefetcher.depth(extractor, slots):
+                continue
+            self._prefetcher.submit(id(source), functools.partial(source.prefetch, task.extraction_opts()))
     
+    def _analysis_work(self, url: str, progress: Optional[Any] = None) -> Any:
+        proxy = self._settings.current.proxy
+        cookiefile = self._cookiefile_for_url(url)
+        key = self._analysis_key(url)
+
+        def _work(job: AnalysisJob) -> dict:
+            # 命中缓存，或等待同一视频正在进行的（预）解析
+            while True:
+                cached = self._analysis_cache.get(key)
+                if cached is not None:
+                    cached.result['data']['url'] = url
+                    return cached.result
+                waiter = self._analysis_cache.begin(key)
+                if waiter is None:
+                    break
+                while not waiter.wait(0.5):
+                    if job.stop_event.is_set():
+                        return {'success': False}
+            try:
+                return _analyze(job)
+            finally:
+                self._analysis_cache.end(key)
+
+        def _analyze(job: AnalysisJob) -> dict:
+            info_box: list[dict] = []
+            res = VideoAnalyzer.analyze(url, proxy=proxy, cookiefile=cookiefile,
+                                        stop_event=job.stop_event, progress=progress, on_info=info_box.append)
+            # Browser cookies may simply be stale: re-extract once and retry
+            # instead of making the user re-run the whole analysis.
+            if (
+                not res.get('success')
+                and not res.get('cancelled')
+                and is_auth_failure(str(res.get('error') or ''))
+                and self._uses_browser_cookies(url)
+            ):
+                fresh = browser_cookie_store.refresh(self._extract_domain(url))
+                if fresh:
+                    info_box.clear()
+                    res = VideoAnalyzer.analyze(url, proxy=proxy, cookiefile=fresh,
+                                                stop_event=job.stop_event, progress=progress, on_info=info_box.append)
+            self._analysis_cache.put(key, res, info_box[-1] if info_box else None)
+            return res
+
+        return _work
+
+    def _remember_analysis(self, url: str, result: dict) -> None:
+        if result.get('success'):
+            data = result['data']
+            self._current_video_info = data
+            thumb = data.get('thumbnail') or ''
+            if thumb:
+                # 界面从本地缩略图服务加载缩放后的封面：同一封面只下载一次
+                thumbnail_cache.proxy = self._settings.current.proxy or None
+                data['thumbnail_preview'] = thumbnail_server.url_for(thumb, CARD_PREVIEW_WIDTH)
+                data['thumbnail_full'] = thumbnail_server.url_for(thumb)
+            self._remember_video_key(url, data)
+
+    def _remember_video_key(self, url: str, data: dict[str, Any]) -> None:
+        if data.get('extractor_key') and data.get('video_id'):
+            key = self._analysis_key(url)
+            analyzed = make_video_key(data['extractor_key'], data['video_id'])
+            # 提取器的 _match_id 与最终的视频 ID 可能不同（如 B 站 BV 号）：以解析结果为准
+            if analyzed != key:
+                self._video_keys[key] = analyzed
+
+    def analyze_video_async(self, url: str, supersede: bool = True) -> str:
+        """
+        提交解析任务，立即返回 job_id
+
+        进度通过 onAnalyzeProgress(job_id, message) 回调，结果通过
+        onAnalyzeResult(job_id, result) 回调。supersede 为真时取消之前未完成的解析。
+        """
+        url = (url or '').strip()
+        if not url:
+            return json.dumps({'success': False, 'error': '请输入有效的链接'}, ensure_ascii=False)
+
+        job_box: dict[str, str] = {}
+        last_emit = [0.0]
+
+        def _progress(msg: str) -> None:
+            now = time.monotonic()
+            if now - last_emit[0] < 0.2 or 'job_id' not in job_box:
+                return
+            last_emit[0] = now
+            jid_json = json.dumps(job_box['job_id'], ensure_ascii=False)
+            msg_json = json.dumps(msg, ensure_ascii=False)
+            self._emit_js(f"onAnalyzeProgress({jid_json}, {msg_json})")
+
+        def _done(job: AnalysisJob) -> None:
+            result = job.result or {}
+            self._remember_analysis(url, result)
+            jid_json = json.dumps(job.id, ensure_ascii=False)
+            self._emit_js(f"onAnalyzeResult({jid_json}, {json.dumps(result, ensure_ascii=False)})")
+
+        job = self._analysis.submit(url, self._analysis_work(url, _progress), on_done=_done,
+                                    group='analyze' if supersede else '')
+        job_box['job_id'] = job.id
+        return json.dumps({'success': True, 'job_id': job.id}, ensure_ascii=False)
+
+    MAX_PREFETCH_URLS = 50
+    PREFETCH_WORKERS = 2
+
+    def prefetch_analysis(self, urls: Any) -> str:
+        """
+        粘贴/批量输入后立即在后台预解析（去重、规范化，在独立的预解析线程池中执行）
+
+        结果写入解析缓存，之后的 analyze_video(_async) 与下载任务直接复用；
+        每个链接完成时回调 onPrefetchResult(url, success)。
+        """
+        if isinstance(urls, str):
+            items = [u.strip() for u in urls.splitlines()]
+        elif isinstance(urls, list):
+            items = [str(u).strip() for u in urls]
+        else:
+            items = []
+
+        accepted: list[str] = []
+        seen: set[str] = set()
+        for u in items:
+            if not u.startswith(('http://', 'https://')):
+                continue
+            key = self._analysis_key(u)
+            if key in seen:
+                continue
+            seen.add(key)
+            accepted.append(u)
+            if len(accepted) >= self.MAX_PREFETCH_URLS:
+                break
+
+        queued = 0
+        for u in accepted:
+            if self._analysis_cache.is_pending(self._analysis_key(u)):
+                continue
+
+            def _done(job: AnalysisJob, url: str = u) -> None:
+                ok = bool((job.result or {}).get('success'))
+                if ok:
+                    self._remember_video_key(url, job.result['data'])
+                self._emit_js(f"onPrefetchResult({json.dumps(url, ensure_ascii=False)}, {json.dumps(ok)})")
+
+            self._prefetch_analysis.submit(u, self._analysis_work(u), on_done=_done)
+            queued += 1
+        return json.dumps({'success': True, 'urls': accepted, 'queued': queued}, ensure_ascii=False)
+
+    def _analysis_data(self, url: str) -> Optional[dict[str, Any]]:
+        """该链接的解析数据：当前展示的结果，或解析缓存中的结果。"""
+        current = self._current_video_info
+        if current and self._analysis_key(str(current.get('url') or '')) == self._analysis_key(url):
+            return current
+        cached = self._analysis_cache.get(self._analysis_key(url))
+        return cached.result.get('data') if cached is not None else None
+
+    def cancel_analysis(self, job_id: str) -> str:
+        """取消尚未完成的解析任务"""
+        if self._analysis.cancel((job_id or '').strip()):
+            return json.dumps({'success': True}, ensure_ascii=False)
+        return json.dumps({'success': False, 'error': '解析任务不存在或已完成'}, ensure_ascii=False)
+
     def analyze_video(self, url: str) -> str:
         """
-        解析视频信息
+        解析视频信息（阻塞版本，内部同样走可取消的解析任务）
         
         Args:
             url: 视频链接
@@ -269,37 +770,10 @@ class JsApi:
             })
         
         url = url.strip()
-        proxy = self._settings.get('proxy')
-        cookiefile = self._cookiefile_for_url(url)
-
-        timeout_seconds = 180
-        box: dict[str, Any] = {}
-
-        def _worker() -> None:
-            try:
-                box['result'] = VideoAnalyzer.analyze(url, proxy=proxy, cookiefile=cookiefile)
-            except Exception as e:
-                box['result'] = {'success': False, 'error': f'发生未知错误: {str(e)}'}
-
-        t = threading.Thread(target=_worker, daemon=True)
-        t.start()
-        t.join(timeout=timeout_seconds)
-        if t.is_alive():
-            return json.dumps(
-                {
-                    'success': False,
-                    'error': '网络异常，解析超时，请检查网络连接或稍后再试',
-                },
-                ensure_ascii=False,
-            )
-
-        result = box.get('result')
-        if not isinstance(result, dict):
-            result = {'success': False, 'error': '发生未知错误: 无效的解析结果'}
-        
-        if result['success']:
-            self._current_video_info = result['data']
-        
+        job = self._analysis.submit(url, self._analysis_work(url))
+        job.done_event.wait()
+        result = job.result or {'success': False, 'error': '发生未知错误: 无效的解析结果'}
+        self._remember_analysis(url, result)
         return json.dumps(result, ensure_ascii=False)
     
     def start_download(self, url: str, format_id: str) -> str:
@@ -317,18 +791,37 @@ class JsApi:
         if not url:
             return json.dumps({'success': False, 'error': '请输入有效的链接'})
 
+        task_id = uuid.uuid4().hex
+        video_key = self._video_key_for(url)
+        decision = self._planner.plan(video_key, format_id, task_id)
+        if decision.action == PLAN_ATTACH:
+            return json.dumps({
+                'success': True,
+                'task_id': decision.task_id,
+                'duplicate': True,
+                'message': '相同任务已在队列中',
+            }, ensure_ascii=False)
+        if decision.action == PLAN_EXISTS:
+            return json.dumps({
+                'success': True,
+                'task_id': None,
+                'skipped': True,
+                'path': decision.path,
+                'message': '文件已存在，已跳过下载',
+            }, ensure_ascii=False)
+
         cookiefile = self._cookiefile_for_url(url)
 
-        write_thumbnail = url not in self._thumb_done
+        write_thumbnail = video_key not in self._thumb_done
         if write_thumbnail:
             # Mark immediately to prevent duplicate thumbnail downloads when
             # multiple resolutions are queued quickly.
-            self._thumb_done.add(url)
+            self._thumb_done.add(video_key)
 
-        task_id = uuid.uuid4().hex
-        proxy = self._settings.get('proxy')
-        create_folder = bool(self._settings.get('create_folder'))
-        convert_mp4 = bool(self._settings.get('convert_mp4'))
+        settings = self._settings.current
+        proxy = settings.proxy
+        create_folder = settings.create_folder
+        convert_mp4 = settings.convert_mp4
 
         # Try to keep total parallel fragment connections around 8.
         # Can override via env: NEBULADL_FRAGMENT_THREADS
@@ -345,86 +838,35 @@ class JsApi:
 
         cancel_event = threading.Event()
         self._task_cancel[task_id] = cancel_event
+        source = self._attach_source(task_id, video_key, url) if format_id != 'live' else None
 
         # 获取当前解析的视频标题（如果有）
         video_title = ''
-        if self._current_video_info and self._current_video_info.get('url') == url:
-            video_title = self._current_video_info.get('title', '')
+        thumbnail = ''
+        estimated_bytes = 0
+        analyzed = self._analysis_data(url)
+        if analyzed:
+            video_title = analyzed.get('title', '')
+            thumbnail = analyzed.get('thumbnail') or ''
+            for fmt in analyzed.get('formats') or []:
+                if fmt.get('id') == format_id:
+                    estimated_bytes = int(fmt.get('size_bytes') or 0)
 
         self._task_meta[task_id] = {
             'url': url,
             'format_id': format_id,
             'title': video_title,
+            'thumbnail': thumbnail,
             'fragment_downloads': fragment_downloads,
             'write_thumbnail': write_thumbnail,
             'cookiefile': cookiefile,
+            'video_key': video_key,
+            'estimated_bytes': estimated_bytes,
         }
 
         self._task_state[task_id] = 'queued'
 
-        def on_progress(tid: str, percent: int, status: str) -> None:
-            tid_json = json.dumps(tid, ensure_ascii=False)
-            status_json = json.dumps(status, ensure_ascii=False)
-            self._emit_js(f"updateProgress({tid_json}, {int(percent)}, {status_json})")
-
-        def on_complete(tid: str, final_path: Any = None) -> None:
-            tid_json = json.dumps(tid, ensure_ascii=False)
-            self._emit_js(f"onDownloadComplete({tid_json})")
-            self._task_state[tid] = 'completed'
-            # 记录下载历史
-            meta = self._task_meta.get(tid) or {}
-
-            fp = str(final_path or '').strip()
-            output_path = fp if fp else self._download_dir
-            download_history.add_record(
-                url=meta.get('url', url),
-                title=meta.get('title', ''),
-                format_id=meta.get('format_id', format_id),
-                output_path=output_path,
-                status='completed'
-            )
-            self._on_task_done(tid)
-
-        def on_error(tid: str, error: str) -> None:
-            err = str(error or '').strip()
-
-            # Pause is a controlled stop: keep metadata for resume.
-            if err == '暂停':
-                self._task_state[tid] = 'paused'
-                tid_json = json.dumps(tid, ensure_ascii=False)
-                msg_json = json.dumps('暂停', ensure_ascii=False)
-                self._emit_js(f"updateProgress({tid_json}, -1, {msg_json})")
-
-                if write_thumbnail:
-                    # Allow future tasks/resume to re-download cover if needed.
-                    self._thumb_done.discard(url)
-
-                self._on_task_done(tid, keep_meta=True)
-                return
-
-            if write_thumbnail:
-                # If the first task fails/cancels, allow a later retry to
-                # download the thumbnail.
-                self._thumb_done.discard(url)
-
-            self._task_state[tid] = 'error'
-            # 记录下载历史（失败/取消）
-            meta = self._task_meta.get(tid) or {}
-            status = 'cancelled' if err == '已取消' else 'error'
-            download_history.add_record(
-                url=meta.get('url', url),
-                title=meta.get('title', ''),
-                format_id=meta.get('format_id', format_id),
-                output_path=self._download_dir,
-                status=status,
-                error=err
-            )
-            tid_json = json.dumps(tid, ensure_ascii=False)
-            error_json = json.dumps(error, ensure_ascii=False)
-            self._emit_js(f"onDownloadError({tid_json}, {error_json})")
-            self._on_task_done(tid, keep_meta=True)
-
-        task = DownloadTask(
+        task = self._task_class(format_id)(
             task_id=task_id,
             url=url,
             format_id=format_id,
@@ -435,15 +877,98 @@ class JsApi:
             write_thumbnail=write_thumbnail,
             cookiefile=cookiefile,
             fragment_downloads=fragment_downloads,
-            progress_callback=on_progress,
-            complete_callback=on_complete,
-            error_callback=on_error,
+            source=source,
+            progress_callback=self._on_task_progress,
+            complete_callback=self._on_task_complete,
+            error_callback=self._on_task_error,
         )
         self._tasks[task_id] = task
-        self._pending.put(task_id)
+        self._enqueue(task_id)
 
         return json.dumps({'success': True, 'task_id': task_id, 'message': '下载已加入队列'})
 
+    # --- 任务回调（新任务、手动重试、自动重试/继续/延后重建的任务共用） ---
+    def _on_task_progress(self, tid: str, percent: int, status: str) -> None:
+        self._emit_progress(tid, percent, status)
+
+    def _on_task_complete(self, tid: str, final_path: Any = None) -> None:
+        tid_json = json.dumps(tid, ensure_ascii=False)
+        self._emit_js(f"onDownloadComplete({tid_json})")
+        self._task_state[tid] = 'completed'
+        # 记录下载历史
+        meta = self._task_meta.get(tid) or {}
+
+        fp = str(final_path or '').strip()
+        output_path = fp if fp else self._download_dir
+        filesize = self._planner.complete(tid, fp)
+        self._release_source(tid)
+        download_history.add_record(
+            url=meta.get('url', ''),
+            title=meta.get('title', ''),
+            format_id=meta.get('format_id', ''),
+            output_path=output_path,
+            status='completed',
+            filesize=filesize,
+            video_key=meta.get('video_key'),
+            thumbnail=meta.get('thumbnail'),
+            task_id=tid,
+        )
+        sub_ref = meta.get('subscription')
+        if sub_ref:
+            subscription_store.mark_done(*sub_ref)
+        self._on_task_done(tid)
+
+    def _on_task_error(self, tid: str, error: str) -> None:
+        err = str(error or '').strip()
+        meta = self._task_meta.get(tid) or {}
+        url = str(meta.get('url') or '')
+        write_thumbnail = bool(meta.get('write_thumbnail'))
+        thumb_key = str(meta.get('video_key') or self._video_key_for(url))
+
+        # Pause is a controlled stop: keep metadata for resume.
+        if err == '暂停':
+            self._task_state[tid] = 'paused'
+            self._emit_progress(tid, -1, '暂停')
+
+            if write_thumbnail:
+                # Allow future tasks/resume to re-download cover if needed.
+                self._thumb_done.discard(thumb_key)
+
+            self._on_task_done(tid, keep_meta=True)
+            return
+
+        if self._schedule_retry(tid, err):
+            return
+
+        if write_thumbnail:
+            # If the first task fails/cancels, allow a later retry to
+            # download the thumbnail.
+            self._thumb_done.discard(thumb_key)
+
+        if is_auth_failure(err):
+            browser_cookie_store.invalidate(self._extract_domain(url))
+
+        self._planner.release(tid)
+        self._release_source(tid)
+        self._task_state[tid] = 'error'
+        # 记录下载历史（失败/取消）
+        status = 'cancelled' if err == '已取消' else 'error'
+        download_history.add_record(
+            url=url,
+            title=meta.get('title', ''),
+            format_id=meta.get('format_id', ''),
+            output_path=self._download_dir,
+            status=status,
+            error=err,
+            video_key=meta.get('video_key'),
+            thumbnail=meta.get('thumbnail'),
+            task_id=tid,
+        )
+        tid_json = json.dumps(tid, ensure_ascii=False)
+        error_json = json.dumps(error, ensure_ascii=False)
+        self._emit_js(f"onDownloadError({tid_json}, {error_json})")
+        self._on_task_done(tid, keep_meta=True)
+
     def retry_download(self, task_id: str) -> str:
         """重试失败的下载任务（复用同一个 task_id）。"""
         tid = (task_id or '').strip()
@@ -454,6 +979,15 @@ class JsApi:
         if self._task_state.get(tid) != 'error':
             return json.dumps({'success': False, 'error': '任务未处于失败状态'}, ensure_ascii=False)
 
+        meta['retry_attempt'] = 0
+        url = str(meta.get('url') or '').strip()
+        format_id = str(meta.get('format_id') or '').strip()
+        decision = self._planner.plan(meta.get('video_key') or self._video_key_for(url), format_id, tid)
+        if decision.action == PLAN_ATTACH:
+            return json.dumps({'success': False, 'error': '相同任务已在队列中'}, ensure_ascii=False)
+        if decision.action == PLAN_EXISTS:
+            return json.dumps({'success': False, 'error': f'文件已存在：{decision.path}'}, ensure_ascii=False)
+
         cancel_event = self._task_cancel.get(tid)
         if cancel_event:
             try:
@@ -463,48 +997,20 @@ class JsApi:
         else:
             self._task_cancel[tid] = threading.Event()
 
-        url = str(meta.get('url') or '').strip()
-        format_id = str(meta.get('format_id') or '').strip()
         fragment_downloads = int(meta.get('fragment_downloads') or 1)
         write_thumbnail = bool(meta.get('write_thumbnail'))
         cookiefile = meta.get('cookiefile')
 
-        proxy = self._settings.get('proxy')
-        create_folder = bool(self._settings.get('create_folder'))
-        convert_mp4 = bool(self._settings.get('convert_mp4'))
-
-        def on_progress(tid2: str, percent: int, status: str) -> None:
-            tid_json = json.dumps(tid2, ensure_ascii=False)
-            status_json = json.dumps(status, ensure_ascii=False)
-            self._emit_js(f"updateProgress({tid_json}, {int(percent)}, {status_json})")
-
-        def on_complete(tid2: str, final_path: Any = None) -> None:
-            tid_json = json.dumps(tid2, ensure_ascii=False)
-            self._emit_js(f"onDownloadComplete({tid_json})")
-            self._task_state[tid2] = 'completed'
-            self._on_task_done(tid2)
-
-        def on_error(tid2: str, error: str) -> None:
-            err = str(error or '').strip()
-            if err == '暂停':
-                self._task_state[tid2] = 'paused'
-                tid_json = json.dumps(tid2, ensure_ascii=False)
-                msg_json = json.dumps('暂停', ensure_ascii=False)
-                self._emit_js(f"updateProgress({tid_json}, -1, {msg_json})")
-                if write_thumbnail:
-                    self._thumb_done.discard(url)
-                self._on_task_done(tid2, keep_meta=True)
-                return
+        settings = self._settings.current
+        proxy = settings.proxy
+        create_folder = settings.create_folder
+        convert_mp4 = settings.convert_mp4
 
-            if write_thumbnail:
-                self._thumb_done.discard(url)
-            self._task_state[tid2] = 'error'
-            tid_json = json.dumps(tid2, ensure_ascii=False)
-            error_json = json.dumps(error, ensure_ascii=False)
-            self._emit_js(f"onDownloadError({tid_json}, {error_json})")
-            self._on_task_done(tid2, keep_meta=True)
-
-        task = DownloadTask(
+        source = None
+        if format_id != 'live':
+            source = self._attach_source(tid, str(meta.get('video_key') or self._video_key_for(url)), url)
+
+        task = self._task_class(format_id)(
             task_id=tid,
             url=url,
             format_id=format_id,
@@ -515,27 +1021,41 @@ class JsApi:
             write_thumbnail=write_thumbnail,
             cookiefile=cookiefile,
             fragment_downloads=fragment_downloads,
-            progress_callback=on_progress,
-            complete_callback=on_complete,
-            error_callback=on_error,
+            source=source,
+            progress_callback=self._on_task_progress,
+            complete_callback=self._on_task_complete,
+            error_callback=self._on_task_error,
         )
         self._tasks[tid] = task
         self._task_state[tid] = 'queued'
-        self._pending.put(tid)
+        self._enqueue(tid)
 
         return json.dumps({'success': True, 'task_id': tid, 'message': '已加入队列'}, ensure_ascii=False)
 
     def _on_task_done(self, task_id: str, keep_meta: bool = False) -> None:
         # 清理任务
-        self._tasks.pop(task_id, None)
+        task = self._tasks.pop(task_id, None)
+        started = self._task_started.pop(task_id, None)
+        self._queued_at.pop(task_id, None)
+        state = self._task_state.get(task_id)
+        if started is not None and state == 'completed':
+            self._prefetcher.observe_task(time.monotonic() - started)
+        if not keep_meta or state == 'error':
+            # 暂停/延后（keep_meta）不是结束；失败的任务可能被手动重试，保留内存中的时间线
+            status = state if state in ('completed', 'error') else 'cancelled'
+            self._finish_timeline(task_id, status, str(getattr(task, 'raw_error', '') or ''), keep=keep_meta)
+        bandwidth_governor.forget(task_id)
+        disk_admission.release(task_id)
+        self._disk_waiting.discard(task_id)
         if not keep_meta:
+            self._planner.release(task_id)
+            self._release_source(task_id)
             self._task_cancel.pop(task_id, None)
             self._task_meta.pop(task_id, None)
+            scratch_space.discard(task_id)
             self._task_state.pop(task_id, None)
 
-        with self._cond:
-            self._active.discard(task_id)
-            self._cond.notify_all()
+        self._loop.call_soon(self._release_slot, task_id)
 
     def start_batch_download(self, urls: Any, format_id: str) -> str:
         """批量下载：urls 可为 list 或换行分隔字符串"""
@@ -551,13 +1071,138 @@ class JsApi:
             return json.dumps({'success': False, 'error': '请输入至少一个有效链接'})
 
         tasks = []
+        skipped = []
         for u in items:
             raw = json.loads(self.start_download(u, format_id))
-            if raw.get('success'):
-                tasks.append({'task_id': raw.get('task_id'), 'url': u})
+            if not raw.get('success'):
+                continue
+            if raw.get('skipped'):
+                skipped.append({'url': u, 'path': raw.get('path')})
+                continue
+            tasks.append({'task_id': raw.get('task_id'), 'url': u, 'duplicate': bool(raw.get('duplicate'))})
 
-        return json.dumps({'success': True, 'tasks': tasks}, ensure_ascii=False)
+        return json.dumps({'success': True, 'tasks': tasks, 'skipped': skipped}, ensure_ascii=False)
     
+    def start_group_download(self, url: str, format_ids: Any) -> str:
+        """同一视频一次下载多个分辨率：共享一次解析和一份音轨。"""
+        url = (url or '').strip()
+        if not url:
+            return json.dumps({'success': False, 'error': '请输入有效的链接'}, ensure_ascii=False)
+
+        if isinstance(format_ids, str):
+            ids = [f.strip() for f in format_ids.split(',')]
+        elif isinstance(format_ids, list):
+            ids = [str(f).strip() for f in format_ids]
+        else:
+            ids = []
+        ids = list(dict.fromkeys(f for f in ids if f))
+        if not ids:
+            return json.dumps({'success': False, 'error': '请至少选择一个格式'}, ensure_ascii=False)
+
+        tasks = []
+        skipped = []
+        for fid in ids:
+            raw = json.loads(self.start_download(url, fid))
+            if not raw.get('success'):
+                continue
+            if raw.get('skipped'):
+                skipped.append({'format_id': fid, 'path': raw.get('path')})
+                continue
+            tasks.append({'task_id': raw.get('task_id'), 'format_id': fid, 'duplicate': bool(raw.get('duplicate'))})
+
+        return json.dumps({'success': True, 'tasks': tasks, 'skipped': skipped}, ensure_ascii=False)
+
+    # --- Subscriptions ---
+    def _subscription_json(self, sub: Subscription) -> dict[str, Any]:
+        return {
+            'id': sub.id,
+            'url': sub.url,
+            'title': sub.title,
+            'format_id': sub.format_id,
+            'last_sync': sub.last_sync,
+            'last_new': sub.last_new,
+            'archived': subscription_store.archive_size(sub.id),
+            'syncing': sub.id in self._syncing,
+        }
+
+    def get_subscriptions(self) -> str:
+        subs = [self._subscription_json(s) for s in subscription_store.list_all()]
+        return json.dumps({'success': True, 'subscriptions': subs}, ensure_ascii=False)
+
+    def add_subscription(self, url: str, format_id: str = 'best') -> str:
+        """订阅频道/播放列表；首次同步会把现有视频加入队列。"""
+        url = (url or '').strip()
+        if not url:
+            return json.dumps({'success': False, 'error': '请输入有效的链接'}, ensure_ascii=False)
+        sub = subscription_store.add(url, format_id=(format_id or 'best').strip())
+        return json.dumps({'success': True, 'subscription': self._subscription_json(sub)}, ensure_ascii=False)
+
+    def remove_subscription(self, sub_id: str) -> str:
+        ok = subscription_store.remove((sub_id or '').strip())
+        if ok:
+            return json.dumps({'success': True}, ensure_ascii=False)
+        return json.dumps({'success': False, 'error': '订阅不存在'}, ensure_ascii=False)
+
+    def sync_subscription(self, sub_id: str) -> str:
+        """后台同步一个订阅：只枚举新条目并加入队列，结果通过 onSubscriptionSynced 回调。"""
+        sub = subscription_store.get((sub_id or '').strip())
+        if sub is None:
+            return json.dumps({'success': False, 'error': '订阅不存在'}, ensure_ascii=False)
+        with self._sync_lock:
+            if sub.id in self._syncing:
+                return json.dumps({'success': True, 'message': '正在同步'}, ensure_ascii=False)
+            self._syncing.add(sub.id)
+
+        threading.Thread(target=self._sync_worker, args=(sub,), daemon=True).start()
+        return json.dumps({'success': True, 'message': '同步已开始'}, ensure_ascii=False)
+
+    def sync_all_subscriptions(self) -> str:
+        started = 0
+        for sub in subscription_store.list_all():
+            if json.loads(self.sync_subscription(sub.id)).get('message') == '同步已开始':
+                started += 1
+        return json.dumps({'success': True, 'started': started}, ensure_ascii=False)
+
+    def _sync_worker(self, sub: Subscription) -> None:
+        result: dict[str, Any] = {'id': sub.id}
+        try:
+            title, entries = subscription_store.find_new_entries(
+                sub,
+                proxy=self._settings.current.proxy or None,
+                cookiefile=self._cookiefile_for_url(sub.url),
+            )
+            tasks = []
+            for entry in entries:
+                # 条目自带 (extractor, id)：去重无需先解析
+                entry_key = make_video_key(entry.extractor, entry.video_id)
+                if self._analysis_key(entry.url) != entry_key:
+                    self._video_keys.setdefault(self._analysis_key(entry.url), entry_key)
+                raw = json.loads(self.start_download(entry.url, sub.format_id))
+                tid = raw.get('task_id')
+                if raw.get('skipped'):
+                    # 文件已存在：直接记入存档
+                    subscription_store.mark_done(sub.id, entry.archive_key)
+                    continue
+                if not raw.get('success') or not tid:
+                    continue
+                meta = self._task_meta.get(tid)
+                if meta is not None:
+                    meta['subscription'] = (sub.id, entry.archive_key)
+                    if not meta.get('title'):
+                        meta['title'] = entry.title
+                tasks.append({'task_id': tid, 'url': entry.url, 'title': entry.title,
+                              'duplicate': bool(raw.get('duplicate'))})
+
+            subscription_store.update(sub.id, title=title or sub.title, last_sync=time.time(), last_new=len(tasks))
+            result.update({'success': True, 'tasks': tasks, 'format_id': sub.format_id})
+        except Exception as e:
+            result.update({'success': False, 'error': f'同步失败: {e}'})
+        finally:
+            with self._sync_lock:
+                self._syncing.discard(sub.id)
+
+        self._emit_js(f"onSubscriptionSynced({json.dumps(result, ensure_ascii=False)})")
+
     def cancel_download(self, task_id: str) -> str:
         """取消指定下载任务"""
         task = self._tasks.get(task_id)
@@ -566,8 +1211,8 @@ class JsApi:
             cancel_event = self._task_cancel.get(task_id)
             if cancel_event:
                 cancel_event.set()
-                # If task was paused (not in pending anymore), clean immediately.
-                if self._task_state.get(task_id) == 'paused':
+                # If task was paused/waiting for a premiere (not in pending anymore), clean immediately.
+                if self._task_state.get(task_id) in ('paused', 'scheduled'):
                     self._task_state[task_id] = 'cancelled'
                     self._on_task_done(task_id)
                 return json.dumps({'success': True, 'message': '已取消'})
@@ -581,8 +1226,26 @@ class JsApi:
         except Exception:
             task.stop()
         self._task_state[task_id] = 'cancelled'
+        if not task.is_alive():
+            # 尚在队列中（例如等待磁盘空间）：立即移出，不必等到轮到它
+            self._loop.call_soon(self._cancel_queued, task_id)
         return json.dumps({'success': True, 'message': '已取消'})
 
+    def set_task_priority(self, task_id: str, priority: float) -> str:
+        """设置任务的带宽权重（限速时按权重分配，默认 1）"""
+        tid = str(task_id or '').strip()
+        meta = self._task_meta.get(tid)
+        if meta is None:
+            return json.dumps({'success': False, 'error': '任务不存在'}, ensure_ascii=False)
+        try:
+            weight = min(max(float(priority), 0.1), 100.0)
+        except (TypeError, ValueError):
+            return json.dumps({'success': False, 'error': '无效的优先级'}, ensure_ascii=False)
+        meta['priority'] = weight
+        if tid in self._tasks:
+            bandwidth_governor.set_weight(tid, weight)
+        return json.dumps({'success': True, 'priority': weight}, ensure_ascii=False)
+
     def pause_download(self, task_id: str) -> str:
         """暂停指定下载任务（可继续）。"""
         tid = (task_id or '').strip()
@@ -592,7 +1255,14 @@ class JsApi:
         if tid not in self._task_meta:
             return json.dumps({'success': False, 'error': '任务不存在'}, ensure_ascii=False)
 
+        # 用户手动暂停：不再由时段规则自动恢复
+        self._window_held.discard(tid)
+        self._pause_task(tid)
+        return json.dumps({'success': True, 'message': '暂停'}, ensure_ascii=False)
+
+    def _pause_task(self, tid: str) -> None:
         self._task_state[tid] = 'paused'
+        self._timeline(tid).phase('paused')
 
         task = self._tasks.get(tid)
         if task:
@@ -601,10 +1271,7 @@ class JsApi:
             except Exception:
                 pass
 
-        tid_json = json.dumps(tid, ensure_ascii=False)
-        msg_json = json.dumps('暂停', ensure_ascii=False)
-        self._emit_js(f"updateProgress({tid_json}, -1, {msg_json})")
-        return json.dumps({'success': True, 'message': '暂停'}, ensure_ascii=False)
+        self._emit_progress(tid, -1, '暂停')
 
     def resume_download(self, task_id: str) -> str:
         """继续已暂停的下载任务。"""
@@ -616,6 +1283,7 @@ class JsApi:
         # Only resume paused tasks.
         if self._task_state.get(tid) != 'paused':
             return json.dumps({'success': False, 'error': '任务未处于暂停状态'}, ensure_ascii=False)
+        self._window_held.discard(tid)
 
         cancel_event = self._task_cancel.get(tid)
         if cancel_event:
@@ -626,49 +1294,26 @@ class JsApi:
         else:
             self._task_cancel[tid] = threading.Event()
 
-        # Recreate DownloadTask thread for the same task_id.
+        self._respawn_task(tid)
+
+        self._emit_progress(tid, -1, '等待中...')
+        return json.dumps({'success': True, 'task_id': tid, 'message': '已加入队列'}, ensure_ascii=False)
+
+    def _respawn_task(self, tid: str) -> None:
+        """Recreate the task thread for the same task_id and queue it."""
+        meta = self._task_meta.get(tid) or {}
         url = str(meta.get('url') or '').strip()
         format_id = str(meta.get('format_id') or '').strip()
         fragment_downloads = int(meta.get('fragment_downloads') or 1)
         write_thumbnail = bool(meta.get('write_thumbnail'))
         cookiefile = meta.get('cookiefile')
 
-        proxy = self._settings.get('proxy')
-        create_folder = bool(self._settings.get('create_folder'))
-        convert_mp4 = bool(self._settings.get('convert_mp4'))
-
-        def on_progress(tid2: str, percent: int, status: str) -> None:
-            tid_json = json.dumps(tid2, ensure_ascii=False)
-            status_json = json.dumps(status, ensure_ascii=False)
-            self._emit_js(f"updateProgress({tid_json}, {int(percent)}, {status_json})")
-
-        def on_complete(tid2: str, final_path: Any = None) -> None:
-            tid_json = json.dumps(tid2, ensure_ascii=False)
-            self._emit_js(f"onDownloadComplete({tid_json})")
-            self._task_state[tid2] = 'completed'
-            self._on_task_done(tid2)
-
-        def on_error(tid2: str, error: str) -> None:
-            err = str(error or '').strip()
-            if err == '暂停':
-                self._task_state[tid2] = 'paused'
-                tid_json = json.dumps(tid2, ensure_ascii=False)
-                msg_json = json.dumps('暂停', ensure_ascii=False)
-                self._emit_js(f"updateProgress({tid_json}, -1, {msg_json})")
-                if write_thumbnail:
-                    self._thumb_done.discard(url)
-                self._on_task_done(tid2, keep_meta=True)
-                return
+        settings = self._settings.current
+        proxy = settings.proxy
+        create_folder = settings.create_folder
+        convert_mp4 = settings.convert_mp4
 
-            if write_thumbnail:
-                self._thumb_done.discard(url)
-            self._task_state[tid2] = 'error'
-            tid_json = json.dumps(tid2, ensure_ascii=False)
-            error_json = json.dumps(error, ensure_ascii=False)
-            self._emit_js(f"onDownloadError({tid_json}, {error_json})")
-            self._on_task_done(tid2)
-
-        task = DownloadTask(
+        task = self._task_class(format_id)(
             task_id=tid,
             url=url,
             format_id=format_id,
@@ -679,18 +1324,14 @@ class JsApi:
             write_thumbnail=write_thumbnail,
             cookiefile=cookiefile,
             fragment_downloads=fragment_downloads,
-            progress_callback=on_progress,
-            complete_callback=on_complete,
-            error_callback=on_error,
+            source=self._task_sources.get(tid),
+            progress_callback=self._on_task_progress,
+            complete_callback=self._on_task_complete,
+            error_callback=self._on_task_error,
         )
         self._tasks[tid] = task
         self._task_state[tid] = 'queued'
-        self._pending.put(tid)
-
-        tid_json = json.dumps(tid, ensure_ascii=False)
-        msg_json = json.dumps('等待中...', ensure_ascii=False)
-        self._emit_js(f"updateProgress({tid_json}, -1, {msg_json})")
-        return json.dumps({'success': True, 'task_id': tid, 'message': '已加入队列'}, ensure_ascii=False)
+        self._enqueue(tid)
     
     def set_download_dir(self, path: str) -> str:
         """设置下载目录"""
@@ -731,11 +1372,8 @@ class JsApi:
 
     # --- Settings API used by templates/index.html ---
     def get_settings(self) -> str:
-        data = dict(self._settings)
+        data = self._settings.current.to_dict()
         data['download_path'] = self._download_dir
-        data['threads'] = self._effective_threads()
-        data['create_folder'] = bool(self._settings.get('create_folder'))
-        data['convert_mp4'] = bool(self._settings.get('convert_mp4'))
         return json.dumps(data, ensure_ascii=False)
 
     def save_settings(self, data: Any) -> str:
@@ -747,39 +1385,62 @@ class JsApi:
         if not isinstance(data, dict):
             return json.dumps({'success': False, 'error': '无效设置数据'})
 
+        changes: dict[str, Any] = {}
+
         download_path = data.get('download_path')
         if isinstance(download_path, str) and download_path and os.path.isdir(download_path):
             self._download_dir = download_path
-            self._settings['download_path'] = download_path
+            changes['download_path'] = download_path
 
         proxy = data.get('proxy')
         if isinstance(proxy, str):
-            self._settings['proxy'] = proxy.strip()
+            changes['proxy'] = proxy
 
-        threads = data.get('threads')
-        try:
-            if threads is not None:
-                self._settings['threads'] = int(threads)
-        except Exception:
-            pass
-
-        create_folder = data.get('create_folder')
-        if isinstance(create_folder, bool):
-            self._settings['create_folder'] = create_folder
-        elif create_folder is not None:
-            # 兼容前端传 0/1 或 "true"/"false"
-            self._settings['create_folder'] = str(create_folder).strip().lower() in ('1', 'true', 'yes', 'on')
+        for key in ('threads', 'create_folder', 'convert_mp4', 'preallocate', 'live_segment_minutes', 'retry_attempts'):
+            if data.get(key) is not None:
+                changes[key] = data[key]
 
-        convert_mp4 = data.get('convert_mp4')
-        if isinstance(convert_mp4, bool):
-            self._settings['convert_mp4'] = convert_mp4
-        elif convert_mp4 is not None:
-            self._settings['convert_mp4'] = str(convert_mp4).strip().lower() in ('1', 'true', 'yes', 'on')
-
-        self._save_settings()
-
-        with self._cond:
-            self._cond.notify_all()
+        metrics_port = data.get('metrics_port')
+        if metrics_port is not None:
+            try:
+                port = int(metrics_port)
+            except (TypeError, ValueError):
+                port = -1
+            if not 0 <= port <= 65535:
+                return json.dumps({'success': False, 'error': '指标端口必须在 0-65535 之间'}, ensure_ascii=False)
+            # 先尝试监听：端口被占用时不保存
+            if not metrics_server.configure(port):
+                return json.dumps({'success': False, 'error': f'指标端口 {port} 无法监听：{metrics_server.error}'}, ensure_ascii=False)
+            changes['metrics_port'] = port
+
+        bandwidth_limit = data.get('bandwidth_limit')
+        if isinstance(bandwidth_limit, str):
+            if bandwidth_limit.strip() and parse_rate(bandwidth_limit) is None:
+                return json.dumps({'success': False, 'error': '无法解析的带宽上限（示例：500K、2M）'}, ensure_ascii=False)
+            changes['bandwidth_limit'] = bandwidth_limit
+
+        scratch_dir = data.get('scratch_dir')
+        if isinstance(scratch_dir, str):
+            scratch_dir = scratch_dir.strip()
+            if scratch_dir:
+                if not os.path.isabs(scratch_dir):
+                    return json.dumps({'success': False, 'error': '暂存目录必须是绝对路径'}, ensure_ascii=False)
+                try:
+                    os.makedirs(scratch_dir, exist_ok=True)
+                except OSError as e:
+                    return json.dumps({'success': False, 'error': f'无法创建暂存目录: {e}'}, ensure_ascii=False)
+            changes['scratch_dir'] = scratch_dir
+
+        schedule_windows = data.get('schedule_windows')
+        if isinstance(schedule_windows, str):
+            _windows, errors = parse_windows(schedule_windows)
+            if errors:
+                return json.dumps({'success': False, 'error': '无法解析的时段规则：\n' + '\n'.join(errors)}, ensure_ascii=False)
+            changes['schedule_windows'] = schedule_windows
+
+        # 类型转换与范围校验由 Settings.from_dict 统一处理；
+        # 变更事件会通知调度线程等订阅者，写盘经过防抖合并。
+        self._settings.update(**changes)
 
         return json.dumps({'success': True})
 
@@ -849,34 +1510,149 @@ class JsApi:
         info_lines.append("[设置]")
         info_lines.append(f"下载目录: {self._download_dir}")
         info_lines.append(f"并发数: {self._effective_threads()}")
-        info_lines.append(f"代理: {'已设置' if self._settings.get('proxy') else '未设置'}")
-        info_lines.append(f"智能归档: {'开启' if self._settings.get('create_folder') else '关闭'}")
-        info_lines.append(f"自动转MP4: {'开启' if self._settings.get('convert_mp4') else '关闭'}")
+        limits = self._limits
+        if limits.window is not None:
+            rule = '暂停' if limits.paused else f"并发 {limits.max_slots or '-'} / 带宽 {limits.rate_limit or '-'} B/s"
+            info_lines.append(f"当前时段规则: {rule}")
+        rate = bandwidth_governor.rate
+        info_lines.append(f"全局限速: {f'{rate} B/s（{bandwidth_governor.active_count()} 个任务分配）' if rate else '不限'}")
+        info_lines.append(f"进行中的解析: {self._analysis.active_count()}，预解析 {self._prefetch_analysis.active_count()}"
+                          f"（缓存 {len(self._analysis_cache)} 个结果）")
+        info_lines.append(f"下载队列: 运行 {len(self._active)} / 排队 {len(self._pending)}")
+        info_lines.append(
+            f"元数据预取: 进行中 {self._prefetcher.inflight_count()}，已完成 {self._prefetcher.completed}，"
+            f"任务平均耗时 {int(self._prefetcher.task_seconds)} 秒"
+        )
+        info_lines.append(f"暂存目录: {scratch_space.root or '未启用'}")
+        avail = disk_admission.available(scratch_space.root or self._download_dir)
+        info_lines.append(
+            f"磁盘空间: 可用 {_format_bytes(max(0, avail)) if avail is not None else '未知'}"
+            f"（已预留 {_format_bytes(disk_admission.reserved_total())}，等待空间 {len(self._disk_waiting)} 个任务）"
+        )
+        settings = self._settings.current
+        info_lines.append(f"代理: {'已设置' if settings.proxy else '未设置'}")
+        info_lines.append(f"智能归档: {'开启' if settings.create_folder else '关闭'}")
+        info_lines.append(f"自动转MP4: {'开启' if settings.convert_mp4 else '关闭'}")
         info_lines.append(f"Cookie 映射数: {len(self._cookie_map)}")
+        info_lines.append(f"浏览器 Cookie: {'已配置' if browser_cookie_store.db_path else '未配置'}")
+        info_lines.append(f"文件索引: {len(library_index)} 个文件")
+        labels, unindexed = url_canonicalizer.index_size()
+        source = '从缓存加载' if url_canonicalizer.loaded_from_disk else '本次启动构建'
+        info_lines.append(f"提取器分派索引: {labels} 个域名词，{unindexed} 个提取器需逐个尝试（{source}）")
+        info_lines.append(f"指标端点: {metrics_server.url or ('启动失败：' + metrics_server.error if metrics_server.error else '未启用')}")
+        info_lines.append("")
+
+        # 耗时最长的已结束任务：阶段汇总 + 最慢任务的完整时间线
+        slowest = timeline_store.slowest(5)
+        if slowest:
+            info_lines.append("[最慢的任务]")
+            for _tid, data in slowest:
+                info_lines.append(f"- {data.get('title') or _tid} [{data.get('format_id') or ''}] {data.get('status') or ''}")
+                info_lines.append(f"  {summarize(data)}")
+            info_lines.append("")
+            info_lines.append("[最慢任务时间线]")
+            info_lines.append(format_timeline(slowest[0][1]))
 
         diagnostic_text = '\n'.join(info_lines)
         return json.dumps({'success': True, 'text': diagnostic_text}, ensure_ascii=False)
 
+    def get_metrics(self) -> str:
+        """运行指标的 JSON 快照（与 /metrics 端点的内容相同）"""
+        return json.dumps({
+            'success': True,
+            'endpoint': metrics_server.url,
+            'metrics': metrics_registry.snapshot(),
+        }, ensure_ascii=False)
+
     # --- 下载历史 API ---
-    def get_history(self, query: Optional[str] = None) -> str:
-        """获取下载历史"""
-        q = (query or '').strip() if query else None
-        records = download_history.get_records(query=q)
-        return json.dumps({'success': True, 'records': records}, ensure_ascii=False)
+    @staticmethod
+    def _with_thumbnails(records: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """为带封面的记录附加本地缩略图地址（不修改存储中的记录）"""
+        out = []
+        for r in records:
+            thumb = r.get('thumbnail')
+            if thumb:
+                r = {**r, 'thumbnail_preview': thumbnail_server.url_for(thumb, HISTORY_PREVIEW_WIDTH)}
+            out.append(r)
+        return out
+
+    def query_history(self, params: Any = None) -> str:
+        """
+        历史查询：过滤 + 排序 + 游标分页，只返回列表需要的字段
+
+        Args:
+            params: {q, status, format_id, site, since, until, sort, cursor, limit}
+        """
+        if isinstance(params, str):
+            try:
+                params = json.loads(params)
+            except Exception:
+                params = {}
+        if not isinstance(params, dict):
+            params = {}
+
+        def _s(key: str) -> str:
+            return str(params.get(key) or '').strip()
+
+        sort = _s('sort') or '-time'
+        if sort.lstrip('-') not in SORT_KEYS:
+            sort = '-time'
+        try:
+            limit = max(1, min(200, int(params.get('limit') or 50)))
+        except Exception:
+            limit = 50
+
+        flt = HistoryFilter(
+            text=_s('q'),
+            status=_s('status'),
+            format_id=_s('format_id'),
+            site=_s('site').lower(),
+            since=_s('since'),
+            until=_s('until'),
+            sort=sort,
+        )
+        page = download_history.query(flt, cursor=_s('cursor') or None, limit=limit)
+        page['records'] = self._with_thumbnails(page['records'])
+        return json.dumps({'success': True, **page}, ensure_ascii=False)
+
+    def rescan_library(self) -> str:
+        """增量重扫已下载文件索引（只检查 mtime 变化的目录）"""
+        stats = library_index.rescan()
+        return json.dumps({'success': True, **stats, 'total': len(library_index)}, ensure_ascii=False)
+
+    def get_library_duplicates(self) -> str:
+        """列出内容重复的已下载文件（每组第一个为最早下载的文件）"""
+        groups = library_index.duplicates()
+        return json.dumps({'success': True, 'groups': groups}, ensure_ascii=False)
+
+    def get_task_timeline(self, record_id: str) -> str:
+        """查看任务时间线：record_id 为历史记录 ID 或进行中任务的 task_id"""
+        rid = (record_id or '').strip()
+        record = download_history.get_record_by_id(rid) if rid else None
+        task_id = str((record or {}).get('task_id') or rid)
+        timeline = self._timelines.get(task_id)
+        data = timeline.to_dict() if timeline is not None else timeline_store.get(task_id)
+        if not data:
+            return json.dumps({'success': False, 'error': '没有该任务的时间线记录'}, ensure_ascii=False)
+        return json.dumps({'success': True, 'timeline': data, 'text': format_timeline(data)}, ensure_ascii=False)
 
     def delete_history_record(self, record_id: str) -> str:
         """删除单条历史记录"""
         rid = (record_id or '').strip()
         if not rid:
             return json.dumps({'success': False, 'error': '无效的记录ID'}, ensure_ascii=False)
+        record = download_history.get_record_by_id(rid)
         ok = download_history.delete_record(rid)
         if ok:
+            if record and record.get('task_id'):
+                timeline_store.remove(str(record['task_id']))
             return json.dumps({'success': True}, ensure_ascii=False)
         return json.dumps({'success': False, 'error': '记录不存在'}, ensure_ascii=False)
 
     def clear_history(self) -> str:
         """清空所有历史记录"""
         download_history.clear_all()
+        timeline_store.clear()
         return json.dumps({'success': True}, ensure_ascii=False)
 
     def redownload_from_history(self, record_id: str) -> str:
@@ -0,0 +1,107 @@
+"""
+NebulaDL - Bandwidth Module
+
+全局带宽限制：所有下载任务共享一个总速率，按权重公平分给最近仍在传输的任务。
+每个任务按自己的份额做令牌桶记账（允许约 1 秒的突发），在进度回调中等待；
+修改总速率会立即按比例调整所有等待中的任务，无需重启下载。
+"""
+
+import time
+import threading
+from dataclasses import dataclass
+from typing import Optional, Callable
+
+
+@dataclass
+class _Share:
+    weight: float = 1.0
+    tat: float = 0.0        # 理论到达时间：份额内的字节全部“发完”的时刻
+    last_seen: float = 0.0
+
+
+class BandwidthGovernor:
+    """全局令牌桶限速器（线程安全）"""
+
+    BURST_SECONDS = 1.0   # 允许的突发量（按份额计算的秒数）
+    IDLE_SECONDS = 2.0    # 超过该时间没有传输的任务不参与分配
+    MAX_WAIT_SLICE = 0.25  # 等待分片，便于响应暂停/取消
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._rate: Optional[int] = None
+        self._shares: dict[str, _Share] = {}
+
+    @property
+    def rate(self) -> Optional[int]:
+        return self._rate
+
+    def set_rate(self, rate: Optional[int]) -> None:
+        """设置总速率（字节每秒，None/0 表示不限）；已排队的等待按新速率缩放。"""
+        rate = int(rate) if rate and rate > 0 else None
+        with self._cond:
+            old = self._rate
+            if rate == old:
+                return
+            now = self._clock()
+            for share in self._shares.values():
+                debt = share.tat - now
+                if debt <= 0:
+                    continue
+                if rate is None or old is None:
+                    share.tat = now
+                else:
+                    share.tat = now + debt * old / rate
+            self._rate = rate
+            self._cond.notify_all()
+
+    def set_weight(self, task_id: str, weight: float) -> None:
+        with self._cond:
+            share = self._shares.setdefault(task_id, _Share())
+            share.weight = min(max(float(weight or 1.0), 0.1), 100.0)
+            self._cond.notify_all()
+
+    def forget(self, task_id: str) -> None:
+        with self._cond:
+            self._shares.pop(task_id, None)
+            self._cond.notify_all()
+
+    def _share_rate(self, share: _Share, now: float) -> float:
+        """调用方持有锁。"""
+        assert self._rate is not None
+        total = sum(
+            s.weight for s in self._shares.values()
+            if s is share or now - s.last_seen < self.IDLE_SECONDS
+        )
+        return self._rate * share.weight / max(total, share.weight)
+
+    def consume(self, task_id: str, nbytes: int, stop_event: Optional[threading.Event] = None) -> None:
+        """记账 nbytes 并在超出份额时阻塞等待；stop_event 置位时立即返回。"""
+        if nbytes <= 0:
+            return
+        with self._cond:
+            if self._rate is None:
+                return
+            now = self._clock()
+            share = self._shares.setdefault(task_id, _Share())
+            share.last_seen = now
+            # 空闲过的任务最多积攒 BURST_SECONDS 的额度
+            start = max(share.tat, now - self.BURST_SECONDS)
+            share.tat = start + nbytes / self._share_rate(share, now)
+
+            while self._rate is not None and task_id in self._shares:
+                delay = share.tat - self._clock()
+                if delay <= 0 or (stop_event is not None and stop_event.is_set()):
+                    break
+                self._cond.wait(timeout=min(delay, self.MAX_WAIT_SLICE))
+                # 等待中的任务仍算作活跃，避免其份额被其他任务占用
+                share.last_seen = self._clock()
+
+    def active_count(self) -> int:
+        now = self._clock()
+        with self._cond:
+            return sum(1 for s in self._shares.values() if now - s.last_seen < self.IDLE_SECONDS)
+
+
+# 全局单例
+bandwidth_governor = BandwidthGovernor()
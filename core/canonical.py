@@ -0,0 +1,271 @@
+"""
+NebulaDL - URL Canonicalization Module
+
+链接规范化与提取器分派：把任意形式的视频链接（短链、移动版、带时间戳/追踪参数）映射为
+(提取器, 视频 ID)。按 _VALID_URL 主机部分中的域名词预先建立分派索引，只对候选提取器
+调用 suitable/_match_id，而不是按顺序尝试全部提取器的正则。索引按 yt-dlp 版本持久化，
+启动后无需枚举（加载）全部提取器；匹配到的提取器作为 ie_key 传给 extract_info。
+无法识别的链接退回到规范化后的 URL 作为视频键。
+"""
+
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Any
+from urllib.parse import urlparse
+
+from .planner import fallback_video_key, make_video_key
+from .settings import DebouncedJsonWriter
+
+try:
+    import yt_dlp
+    from yt_dlp.extractor import gen_extractor_classes, get_info_extractor
+except Exception:  # pragma: no cover
+    yt_dlp = None
+    gen_extractor_classes = None
+    get_info_extractor = None
+
+
+GENERIC_IE = 'Generic'
+
+_CASE_PAIR_RE = re.compile(r'\[([a-z0-9])\1\]')   # [yY][oO]... 小写后为 [yy][oo]
+_CHAR_CLASS_RE = re.compile(r'\[(?:\\.|[^\]\\])*\]')
+_GROUP_NAME_RE = re.compile(r'\?P<\w+>')
+_ESCAPE_RE = re.compile(r'\\[a-z]')
+_OPTIONAL_CHAR_RE = re.compile(r'[a-z0-9]\?')          # tiktokv?\.com / xnxx3?\.com
+_TOKEN_RE = re.compile(r'[a-z0-9][a-z0-9-]*')
+
+# 查询时跳过的主机名标签（几乎所有提取器的正则中都有）
+_SKIP_LABELS = frozenset({'www', 'm', 'com', 'net', 'org', 'co'})
+# 主机名标签按前缀查询索引时的最短前缀（abc7news.com 命中 "abc"，wetv.com 命中 "we"）
+_MIN_PREFIX = 2
+
+
+@dataclass(frozen=True)
+class CanonicalId:
+    extractor: str
+    video_id: str
+
+    @property
+    def key(self) -> str:
+        return make_video_key(self.extractor, self.video_id)
+
+
+def _valid_url_patterns(ie: Any) -> list[str]:
+    pattern = getattr(ie, '_VALID_URL', None)
+    if not pattern:
+        return []
+    if isinstance(pattern, (list, tuple)):
+        return [p for p in pattern if isinstance(p, str)]
+    return [pattern] if isinstance(pattern, str) else []
+
+
+def _host_tokens(pattern: str) -> Optional[set[str]]:
+    """
+    正则中 '//' 之后的词（主机名候选）
+
+    分支中的主机名可能出现在任意 '/' 之后，因此不截断到第一个 '/'：多出来的路径词
+    只会让候选稍多，漏掉主机名词才会影响匹配结果。
+
+    Returns:
+        None 表示该正则不可能匹配 http(s) 链接（ytsearch:、rtmp:// 等）；
+        空集合表示无法从正则中取出域名（需要逐个尝试）。
+    """
+    low = pattern.lower().replace('\\/', '/')
+    start = low.find('//')
+    if start < 0 or 'http' not in low[:start]:
+        return None
+    rest = _CHAR_CLASS_RE.sub(' ', _CASE_PAIR_RE.sub(r'\1', low[start + 2:]))
+    rest = _ESCAPE_RE.sub(' ', _GROUP_NAME_RE.sub('', rest))
+    # 主机部分本身没有字面量（https?://[^/]+/Mediasite/...）：任何主机都可能匹配
+    end = rest.find('/')
+    if not _TOKEN_RE.search(rest[:end] if end >= 0 else rest):
+        return set()
+    tokens = set(_TOKEN_RE.findall(rest))
+    tokens.update(_TOKEN_RE.findall(_OPTIONAL_CHAR_RE.sub('', rest)))
+    return tokens
+
+
+def _ytdlp_version() -> str:
+    ver_mod = getattr(yt_dlp, 'version', None)
+    return str(getattr(ver_mod, '__version__', None) or getattr(yt_dlp, '__version__', None) or '')
+
+
+class UrlCanonicalizer:
+    """
+    链接 -> 提取器 / (提取器, 视频 ID)（线程安全，结果按链接缓存）
+
+    分派索引：域名词 -> 提取器在 yt-dlp 列表中的位置。候选 = 链接主机名各标签（及其前缀）
+    对应的提取器 ∪ 无法从正则中取出域名的提取器，按原顺序尝试，与 yt-dlp 的匹配优先级一致。
+    Generic 提取器匹配任意链接，不在索引中。
+    """
+
+    INDEX_FILE = os.path.join(os.path.expanduser('~'), '.nebuladl_dispatch.json')
+    MAX_CACHE = 4096
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path or self.INDEX_FILE
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._order: Optional[list[str]] = None          # 位置 -> ie_key
+        self._index: dict[str, list[int]] = {}
+        self._unindexed: list[int] = []
+        self._classes: dict[int, Any] = {}
+        self._cache: OrderedDict[str, Optional[tuple[str, str]]] = OrderedDict()
+        self._writer = DebouncedJsonWriter(self._path, delay=1.0)
+        self.loaded_from_disk = False
+
+    def _load(self, version: str) -> bool:
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or not version or data.get('version') != version:
+                return False
+            order = [str(k) for k in data['order']]
+            index = {str(t): [int(i) for i in pos] for t, pos in dict(data['index']).items()}
+            unindexed = [int(i) for i in data['unindexed']]
+        except Exception:
+            return False
+        self._index, self._unindexed, self._order = index, unindexed, order
+        return True
+
+    def _build(self, version: str) -> None:
+        index: dict[str, list[int]] = {}
+        unindexed: list[int] = []
+        order: list[str] = []
+        try:
+            all_classes = list(gen_extractor_classes()) if gen_extractor_classes is not None else []
+        except Exception:
+            all_classes = []
+        for ie in all_classes:
+            try:
+                ie_key = ie.ie_key()
+            except Exception:
+                continue
+            if ie_key == GENERIC_IE:
+                continue
+            token_sets = [_host_tokens(p) for p in _valid_url_patterns(ie)]
+            token_sets = [t for t in token_sets if t is not None]
+            if not token_sets:
+                continue  # 不接受 http(s) 链接
+            pos = len(order)
+            order.append(ie_key)
+            self._classes[pos] = ie
+            if any(not t for t in token_sets):
+                unindexed.append(pos)
+            for token in set().union(*token_sets):
+                index.setdefault(token, []).append(pos)
+        self._index, self._unindexed, self._order = index, unindexed, order
+        if version and order:
+            self._writer.schedule(lambda: {
+                'version': version,
+                'order': order,
+                'index': index,
+                'unindexed': unindexed,
+            })
+
+    def _ensure_index(self) -> list[str]:
+        order = self._order
+        if order is not None:
+            return order
+        with self._build_lock:
+            if self._order is None:
+                version = _ytdlp_version()
+                self.loaded_from_disk = self._load(version)
+                if not self.loaded_from_disk:
+                    self._build(version)
+            return self._order or []
+
+    def _class_at(self, pos: int) -> Any:
+        ie = self._classes.get(pos)
+        if ie is None and get_info_extractor is not None and self._order is not None:
+            # 从磁盘加载的索引：只在成为候选时才加载该提取器
+            try:
+                ie = get_info_extractor(self._order[pos])
+            except Exception:
+                ie = None
+            self._classes[pos] = ie
+        return ie
+
+    def _candidates(self, host: str) -> list[int]:
+        self._ensure_index()
+        positions: set[int] = set(self._unindexed)
+        for label in host.split('.'):
+            if label in _SKIP_LABELS:
+                continue
+            positions.update(self._index.get(label, ()))
+            for n in range(_MIN_PREFIX, len(label)):
+                positions.update(self._index.get(label[:n], ()))
+        return sorted(positions)
+
+    def _dispatch(self, url: str) -> Optional[tuple[str, str]]:
+        """(ie_key, 视频 ID)；视频 ID 为空表示匹配的提取器正则没有 id 分组。"""
+        try:
+            host = (urlparse(url).hostname or '').lower()
+        except ValueError:
+            return None
+        if not host:
+            return None
+        for pos in self._candidates(host):
+            ie = self._class_at(pos)
+            try:
+                if ie is None or not ie.suitable(url):
+                    continue
+            except Exception:
+                continue
+            # 与 yt-dlp 一样由第一个匹配的提取器处理
+            try:
+                video_id = str(ie._match_id(url) or '').strip()
+            except Exception:
+                video_id = ''
+            return ie.ie_key(), video_id
+        return None
+
+    def _lookup(self, url: str) -> Optional[tuple[str, str]]:
+        url = (url or '').strip()
+        if not url.startswith(('http://', 'https://')):
+            return None
+        with self._lock:
+            if url in self._cache:
+                self._cache.move_to_end(url)
+                return self._cache[url]
+        result = self._dispatch(url)
+        with self._lock:
+            self._cache[url] = result
+            while len(self._cache) > self.MAX_CACHE:
+                self._cache.popitem(last=False)
+        return result
+
+    def resolve(self, url: str) -> Optional[CanonicalId]:
+        """链接对应的 (提取器, 视频 ID)；无法识别时返回 None。"""
+        found = self._lookup(url)
+        if found is None or not found[1]:
+            return None
+        return CanonicalId(*found)
+
+    def ie_key(self, url: str) -> Optional[str]:
+        """
+        传给 extract_info 的 ie_key：索引中第一个匹配的专用提取器
+
+        没有匹配时返回 None 而不是 Generic：索引从正则中取域名词是启发式的，个别提取器
+        可能漏掉，交给 yt-dlp 按原顺序遍历，结果与不使用索引时相同。
+        """
+        found = self._lookup(url)
+        return found[0] if found is not None else None
+
+    def video_key(self, url: str) -> str:
+        """去重/缓存使用的视频键：'提取器:ID'，无法识别时为规范化后的 URL。"""
+        cid = self.resolve(url)
+        return cid.key if cid is not None else fallback_video_key(url)
+
+    def index_size(self) -> tuple[int, int]:
+        """(已索引的域名词数, 需要逐个尝试的提取器数)"""
+        self._ensure_index()
+        return len(self._index), len(self._unindexed)
+
+
+# 全局单例
+url_canonicalizer = UrlCanonicalizer()
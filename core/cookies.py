@@ -0,0 +1,422 @@
+"""
+NebulaDL - Browser Cookie Store Module
+
+从本地浏览器配置目录中的 Cookie 数据库（Chrome/Edge 的 Cookies、Firefox 的 cookies.sqlite）
+提取 Cookie，按域名缓存为 Netscape 格式的 cookies.txt，供 yt-dlp 直接使用。
+Chromium 系浏览器的 Cookie 值是加密的（Windows 上为 DPAPI/AES-GCM），由 yt-dlp 的 Cookie 模块解密。
+整个浏览器配置的 Cookie 每个 TTL 只提取（解密）一次，各域名的 cookies.txt 由这份快照切分；
+提取总在后台进行（选择数据库时预热），解析/下载请求不会等待整个配置的解密。
+缓存过期（TTL）或站点返回 401/403 后在后台刷新，任务之间复用同一份缓存，不会每次都重新提取。
+"""
+
+import os
+import re
+import time
+import shutil
+import sqlite3
+import tempfile
+import threading
+from typing import Optional, Callable, Any
+
+try:
+    from yt_dlp.cookies import extract_cookies_from_browser
+except Exception:  # pragma: no cover
+    extract_cookies_from_browser = None
+
+
+# Chromium 的 expires_utc 以 1601-01-01 为纪元（微秒）
+_CHROMIUM_EPOCH_OFFSET = 11644473600
+
+_AUTH_FAILURE_RE = re.compile(r'\b(401|403)\b|fresh cookies|unauthorized|forbidden|新鲜')
+
+
+def is_auth_failure(message: str) -> bool:
+    """判断错误信息是否属于 Cookie 失效一类（401/403/需要新鲜 Cookie）。
+
+    同时兼容 yt-dlp 原始错误和 `_friendly_yt_dlp_error` 生成的提示文本。
+    """
+    return bool(_AUTH_FAILURE_RE.search((message or '').lower()))
+
+
+def find_browser_cookie_dbs() -> list[dict[str, str]]:
+    """列出本机常见浏览器配置目录中存在的 Cookie 数据库。"""
+    home = os.path.expanduser('~')
+    local = os.environ.get('LOCALAPPDATA') or os.path.join(home, 'AppData', 'Local')
+    roaming = os.environ.get('APPDATA') or os.path.join(home, 'AppData', 'Roaming')
+
+    chromium_roots = {
+        'Chrome': [
+            os.path.join(local, 'Google', 'Chrome', 'User Data'),
+            os.path.join(home, 'Library', 'Application Support', 'Google', 'Chrome'),
+            os.path.join(home, '.config', 'google-chrome'),
+        ],
+        'Edge': [
+            os.path.join(local, 'Microsoft', 'Edge', 'User Data'),
+            os.path.join(home, 'Library', 'Application Support', 'Microsoft Edge'),
+            os.path.join(home, '.config', 'microsoft-edge'),
+        ],
+        'Chromium': [
+            os.path.join(home, '.config', 'chromium'),
+        ],
+    }
+    firefox_roots = [
+        os.path.join(roaming, 'Mozilla', 'Firefox', 'Profiles'),
+        os.path.join(home, 'Library', 'Application Support', 'Firefox', 'Profiles'),
+        os.path.join(home, '.mozilla', 'firefox'),
+    ]
+
+    found: list[dict[str, str]] = []
+    for browser, roots in chromium_roots.items():
+        for root in roots:
+            if not os.path.isdir(root):
+                continue
+            for profile in sorted(os.listdir(root)):
+                for rel in (('Network', 'Cookies'), ('Cookies',)):
+                    path = os.path.join(root, profile, *rel)
+                    if os.path.isfile(path):
+                        found.append({'browser': browser, 'profile': profile, 'path': path})
+                        break
+
+    for root in firefox_roots:
+        if not os.path.isdir(root):
+            continue
+        for profile in sorted(os.listdir(root)):
+            path = os.path.join(root, profile, 'cookies.sqlite')
+            if os.path.isfile(path):
+                found.append({'browser': 'Firefox', 'profile': profile, 'path': path})
+
+    return found
+
+
+class BrowserCookieStore:
+    """浏览器 Cookie 缓存（按域名生成 Netscape cookies.txt）"""
+
+    CACHE_DIR = os.path.join(os.path.expanduser('~'), '.nebuladl_cookie_cache')
+    DEFAULT_TTL = 6 * 3600  # 缓存有效期（秒）
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        ttl: float = DEFAULT_TTL,
+        cache_dir: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._db_path = (db_path or '').strip() or None
+        self._ttl = float(ttl)
+        self._cache_dir = cache_dir or self.CACHE_DIR
+        self._clock = clock
+        self._lock = threading.Lock()
+        # domain -> (jar path or None when no cookies, extracted_at)
+        self._jars: dict[str, tuple[Optional[str], float]] = {}
+        self._refreshing: set[str] = set()
+        # 整个配置的 Cookie 快照 (rows, extracted_at)；_generation 在每次提取后递增
+        self._snapshot: Optional[tuple[list[tuple[Any, ...]], float]] = None
+        self._generation = 0
+        self._extract_lock = threading.Lock()  # 同一时间只提取一次
+
+    @property
+    def db_path(self) -> Optional[str]:
+        return self._db_path
+
+    def configure(self, db_path: Optional[str]) -> None:
+        """切换浏览器 Cookie 数据库；旧数据库的缓存全部作废。"""
+        path = (db_path or '').strip() or None
+        with self._lock:
+            if path == self._db_path:
+                return
+            self._db_path = path
+            self._jars.clear()
+            self._snapshot = None
+        if path:
+            # 预热：第一次解析前完成整个配置的提取
+            threading.Thread(target=self._profile_cookies, args=(path, False), daemon=True).start()
+
+    def cookiefile_for(self, domain: str) -> Optional[str]:
+        """返回域名对应的缓存 cookies.txt 路径。
+
+        首次使用时从配置快照切分（很快）；快照尚未就绪时在后台提取，本次返回 None。
+        缓存过期时先返回旧文件并在后台刷新，避免阻塞任务。
+        """
+        domain = _normalize_domain(domain)
+        if not domain or not self._db_path:
+            return None
+
+        with self._lock:
+            entry = self._jars.get(domain)
+            snapshot = self._snapshot
+
+        if entry is None:
+            if snapshot is not None and self._clock() - snapshot[1] < self._ttl:
+                return self._update(domain, force=False)
+            self._refresh_in_background(domain)
+            return None
+
+        path, extracted_at = entry
+        if self._clock() - extracted_at >= self._ttl:
+            self._refresh_in_background(domain)
+        if path and os.path.isfile(path):
+            return path
+        return None
+
+    def invalidate(self, domain: str) -> None:
+        """标记域名缓存失效（如遇到 401/403），并在后台重新提取。"""
+        domain = _normalize_domain(domain)
+        if not domain or not self._db_path:
+            return
+        with self._lock:
+            entry = self._jars.get(domain)
+            if entry is not None:
+                self._jars[domain] = (entry[0], 0.0)
+            # 浏览器中的 Cookie 已经变化：下一次需要重新提取整个配置
+            self._snapshot = None
+        self._refresh_in_background(domain)
+
+    def refresh(self, domain: str) -> Optional[str]:
+        """同步重新提取 Cookie，返回该域名的 cookies.txt 路径（无 Cookie 时返回 None）。"""
+        return self._update(_normalize_domain(domain), force=True)
+
+    def _profile_cookies(self, db_path: str, force: bool) -> Optional[tuple[list[tuple[Any, ...]], float]]:
+        """
+        整个配置的 Cookie 快照 (rows, extracted_at)
+
+        未过期且不强制时直接复用；等待提取锁期间已有其它线程完成提取时也复用其结果。
+        读取失败返回 None。
+        """
+        with self._lock:
+            generation = self._generation
+        with self._extract_lock:
+            with self._lock:
+                if db_path != self._db_path:
+                    return None
+                snapshot = self._snapshot
+                reuse = snapshot is not None and (
+                    self._generation != generation
+                    or (not force and self._clock() - snapshot[1] < self._ttl)
+                )
+            if reuse:
+                return snapshot
+
+            try:
+                raw = _read_profile_cookies(db_path)
+            except Exception:
+                raw = None
+            if raw is None:
+                return None
+
+            snapshot = (raw, self._clock())
+            with self._lock:
+                if db_path == self._db_path:
+                    self._snapshot = snapshot
+                    self._generation += 1
+            return snapshot
+
+    def _update(self, domain: str, force: bool) -> Optional[str]:
+        """从配置快照切分出该域名的 cookies.txt（必要时先提取），返回路径。"""
+        db_path = self._db_path
+        if not domain or not db_path:
+            return None
+
+        snapshot = self._profile_cookies(db_path, force)
+        if snapshot is None:
+            # 读取失败：保留旧缓存，稍后再试
+            with self._lock:
+                entry = self._jars.get(domain)
+                if entry is not None:
+                    return entry[0]
+            return None
+
+        raw, extracted_at = snapshot
+        rows = _cookies_for_domain(raw, domain)
+        path: Optional[str] = None
+        if rows:
+            path = os.path.join(self._cache_dir, f'{domain}.txt')
+            try:
+                _write_netscape_jar(path, rows)
+            except Exception:
+                path = None
+
+        with self._lock:
+            if db_path == self._db_path:
+                # 与快照同时过期：各域名的刷新共用下一次提取
+                self._jars[domain] = (path, extracted_at)
+        return path
+
+    def _refresh_in_background(self, domain: str) -> None:
+        with self._lock:
+            if domain in self._refreshing:
+                return
+            self._refreshing.add(domain)
+
+        def _worker() -> None:
+            try:
+                self._update(domain, force=False)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(domain)
+
+        threading.Thread(target=_worker, daemon=True).start()
+
+
+def _normalize_domain(domain: str) -> str:
+    d = (domain or '').strip().lower().strip('.')
+    if d.startswith('www.'):
+        d = d[4:]
+    return d
+
+
+def _host_matches(cookie_host: str, domain: str) -> bool:
+    """Cookie 对该域名（或其子域名）的请求可能生效。"""
+    host = (cookie_host or '').strip().lower().lstrip('.')
+    if not host or '.' not in host:
+        return False
+    return host == domain or domain.endswith('.' + host) or host.endswith('.' + domain)
+
+
+def _read_cookie_rows(db_path: str, domain: str) -> Optional[list[tuple[Any, ...]]]:
+    """从浏览器数据库读取与域名相关的 Cookie（格式见 _cookies_for_domain）；读取失败返回 None。"""
+    raw = _read_profile_cookies(db_path)
+    return _cookies_for_domain(raw, domain) if raw is not None else None
+
+
+def _read_profile_cookies(db_path: str) -> Optional[list[tuple[Any, ...]]]:
+    """从浏览器数据库读取全部 Cookie。
+
+    浏览器运行时数据库处于锁定/WAL 状态，因此先复制到临时目录再只读打开。
+    Chromium 的 Cookie 值保存在加密的 encrypted_value 中，交给 yt-dlp 解密；
+    yt-dlp 不可用时只能读取未加密的 value。
+
+    Returns:
+        [(host, name, value, path, expires, secure), ...]（expires 为 Unix 秒）；读取失败返回 None
+    """
+    if not os.path.isfile(db_path):
+        return None
+
+    tmp_dir = tempfile.mkdtemp(prefix='nebuladl-cookies-')
+    try:
+        tmp_db = os.path.join(tmp_dir, 'cookies.db')
+        shutil.copy2(db_path, tmp_db)
+        for suffix in ('-wal', '-shm'):
+            if os.path.isfile(db_path + suffix):
+                shutil.copy2(db_path + suffix, tmp_db + suffix)
+
+        conn = sqlite3.connect(tmp_db)
+        try:
+            tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            if 'moz_cookies' in tables:
+                query = 'SELECT host, name, value, path, expiry, isSecure FROM moz_cookies'
+                raw = conn.execute(query).fetchall()
+                expiry_of: Callable[[Any], int] = lambda v: int(v or 0)
+            elif 'cookies' in tables and extract_cookies_from_browser is not None:
+                raw = None
+            elif 'cookies' in tables:
+                query = 'SELECT host_key, name, value, path, expires_utc, is_secure FROM cookies'
+                raw = conn.execute(query).fetchall()
+                expiry_of = _chromium_expiry
+            else:
+                return None
+        finally:
+            conn.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if raw is None:
+        raw = _read_chromium_cookies(db_path)
+        expiry_of = _chromium_expiry
+
+    return [
+        (str(host or ''), str(name), value, path, expiry_of(expires), secure)
+        for host, name, value, path, expires, secure in raw
+        if name and value and isinstance(value, str)
+    ]
+
+
+def _cookies_for_domain(raw: list[tuple[Any, ...]], domain: str) -> list[tuple[Any, ...]]:
+    """
+    筛选与域名相关且未过期的 Cookie
+
+    Returns:
+        [(host, include_subdomains, path, secure, expires, name, value), ...]
+    """
+    now = int(time.time())
+    rows: list[tuple[Any, ...]] = []
+    for host, name, value, path, exp, secure in raw:
+        if not _host_matches(host, domain):
+            continue
+        if exp and exp < now:
+            continue
+        rows.append((
+            host,
+            host.startswith('.'),
+            str(path or '/'),
+            bool(secure),
+            exp,
+            str(name),
+            value,
+        ))
+    return rows
+
+
+def _chromium_expiry(value: Any) -> int:
+    """Chromium 的 expires_utc（yt-dlp 原样保留）转为 Unix 秒；0 表示会话 Cookie。"""
+    v = int(value or 0)
+    if v > 10 ** 12:
+        return max(0, v // 1_000_000 - _CHROMIUM_EPOCH_OFFSET)
+    return v
+
+
+def _chromium_browser_name(db_path: str) -> str:
+    """yt-dlp 的浏览器名（决定 Linux keyring 名称和 macOS 钥匙串条目）。"""
+    low = db_path.replace('\\', '/').lower()
+    if '/edge' in low or 'microsoft-edge' in low or 'microsoft edge' in low:
+        return 'edge'
+    if '/chromium' in low:
+        return 'chromium'
+    return 'chrome'
+
+
+def _read_chromium_cookies(db_path: str) -> list[tuple[Any, ...]]:
+    """
+    用 yt-dlp 解密读取 Chromium 配置目录中的 Cookie
+
+    配置目录是数据库所在目录（新版在 Network/ 下）；解密密钥（Local State）在其上一级。
+
+    Returns:
+        [(host, name, value, path, expires, secure), ...]
+    """
+    profile_dir = os.path.dirname(os.path.abspath(db_path))
+    if os.path.basename(profile_dir) == 'Network':
+        profile_dir = os.path.dirname(profile_dir)
+    jar: Any = extract_cookies_from_browser(_chromium_browser_name(db_path), profile_dir)  # type: ignore[misc]
+    return [(c.domain, c.name, c.value, c.path, c.expires, c.secure) for c in jar]
+
+
+def _write_netscape_jar(path: str, rows: list[tuple[Any, ...]]) -> None:
+    """原子写入 Netscape cookies.txt（任务可能同时在读取旧文件）。"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lines = ['# Netscape HTTP Cookie File', '# Generated by NebulaDL from browser profile', '']
+    for host, include_sub, cpath, secure, expires, name, value in rows:
+        lines.append('\t'.join([
+            host,
+            'TRUE' if include_sub else 'FALSE',
+            cpath,
+            'TRUE' if secure else 'FALSE',
+            str(int(expires or 0)),
+            name,
+            value,
+        ]))
+
+    fd, tmp = tempfile.mkstemp(prefix='.jar-', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8', newline='\n') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+        raise
+
+
+# 全局单例
+browser_cookie_store = BrowserCookieStore()
@@ -0,0 +1,192 @@
+"""
+NebulaDL - Disk Space Module
+
+磁盘空间准入控制：任务启动前按预估大小（视频 + 音频 + 合并/转码的临时副本）
+向目标卷预留空间，放不下的任务留在队列中等待，而不是下载到一半才失败。
+可选地在 Linux 上为大文件预分配磁盘块（不改变文件长度，不影响 yt-dlp 断点续传），减少碎片。
+"""
+
+import os
+import shutil
+import ctypes
+import ctypes.util
+import platform
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+
+MIN_FREE_BYTES = 256 * 1024 * 1024        # 始终为系统保留的余量
+PREALLOCATE_MIN_BYTES = 64 * 1024 * 1024  # 小于该大小的文件不预分配
+
+
+def required_bytes(estimated: int, format_id: str, convert_mp4: bool = False) -> int:
+    """
+    任务在磁盘上的峰值占用
+
+    分离的视频/音频流下载完成后合并：合并期间分片和输出同时存在（约 2 倍）；
+    转为 MP4 再多一份副本；FLAC 音频由有损音轨解码而来，体积约为原音轨的 6 倍。
+    """
+    est = max(0, int(estimated or 0))
+    if not est:
+        return 0
+    if format_id == 'audio':
+        return est * 7
+    factor = 2
+    if convert_mp4:
+        factor += 1
+    return est * factor
+
+
+def published_bytes(estimated: int, format_id: str) -> int:
+    """任务完成后留在下载目录中的文件大小（暂存目录在另一卷上时需要在下载目录所在卷预留）。"""
+    est = max(0, int(estimated or 0))
+    return est * 6 if format_id == 'audio' else est
+
+
+def same_volume(a: str, b: str) -> bool:
+    va, vb = _volume_id(a), _volume_id(b)
+    return va != -1 and va == vb
+
+
+def _volume_root(path: str) -> str:
+    """目标目录可能尚未创建：向上找到第一个存在的目录。"""
+    cur = os.path.abspath(path or '.')
+    while not os.path.exists(cur):
+        parent = os.path.dirname(cur)
+        if parent == cur:
+            break
+        cur = parent
+    return cur
+
+
+def _volume_id(path: str) -> int:
+    try:
+        return os.stat(_volume_root(path)).st_dev
+    except OSError:
+        return -1
+
+
+@dataclass
+class _Reservation:
+    volume: int
+    nbytes: int
+    written: int = 0
+
+    @property
+    def outstanding(self) -> int:
+        # 已写入的部分已经反映在可用空间中
+        return max(0, self.nbytes - self.written)
+
+
+class DiskSpaceAdmission:
+    """按卷记账的空间预留（线程安全）"""
+
+    def __init__(self, min_free: int = MIN_FREE_BYTES):
+        self._min_free = min_free
+        self._lock = threading.Lock()
+        # task_id -> 各卷上的预留（第一项为写入发生的卷，consume 记在它上面）
+        self._reservations: dict[str, list[_Reservation]] = {}
+
+    def _reserved_on(self, volume: int) -> int:
+        """调用方持有 _lock。"""
+        return sum(r.outstanding for rs in self._reservations.values() for r in rs if r.volume == volume)
+
+    def free_bytes(self, path: str) -> Optional[int]:
+        try:
+            return int(shutil.disk_usage(_volume_root(path)).free)
+        except OSError:
+            return None
+
+    def available(self, path: str) -> Optional[int]:
+        """扣除其它任务尚未写入的预留量和系统余量后的可用空间；无法获取时返回 None。"""
+        free = self.free_bytes(path)
+        if free is None:
+            return None
+        volume = _volume_id(path)
+        with self._lock:
+            reserved = self._reserved_on(volume)
+        return free - reserved - self._min_free
+
+    def try_reserve(self, task_id: str, path: str, nbytes: int) -> bool:
+        """空间足够时为任务预留 nbytes；无法获取磁盘信息时放行。"""
+        return self.try_reserve_all(task_id, [(path, nbytes)])
+
+    def try_reserve_all(self, task_id: str, needs: list[tuple[str, int]]) -> bool:
+        """
+        在多个卷上同时预留（例如暂存卷上的峰值占用和下载卷上的成品），全部放得下才预留
+
+        同一卷上的多项需求合并计算；第一项为写入发生的卷。
+        """
+        merged: dict[int, tuple[str, int]] = {}
+        for path, nbytes in needs:
+            volume = _volume_id(path)
+            prev = merged.get(volume)
+            merged[volume] = (path, (prev[1] if prev else 0) + max(0, nbytes))
+        free_of = {volume: self.free_bytes(path) for volume, (path, _n) in merged.items()}
+        with self._lock:
+            self._reservations.pop(task_id, None)
+            for volume, (_path, nbytes) in merged.items():
+                free = free_of[volume]
+                if free is not None and free - self._reserved_on(volume) - self._min_free < nbytes:
+                    return False
+            self._reservations[task_id] = [_Reservation(volume=v, nbytes=n) for v, (_p, n) in merged.items()]
+            return True
+
+    def consume(self, task_id: str, nbytes: int) -> None:
+        """任务写入了 nbytes：相应减少其未兑现的预留。"""
+        if nbytes <= 0:
+            return
+        with self._lock:
+            rs = self._reservations.get(task_id)
+            if rs:
+                rs[0].written += nbytes
+
+    def release(self, task_id: str) -> None:
+        with self._lock:
+            self._reservations.pop(task_id, None)
+
+    def reserved_total(self) -> int:
+        with self._lock:
+            return sum(r.outstanding for rs in self._reservations.values() for r in rs)
+
+
+def _linux_fallocate(fd: int, size: int) -> bool:
+    libc_name = ctypes.util.find_library('c')
+    if not libc_name:
+        return False
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    fallocate = libc.fallocate
+    fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong]
+    fallocate.restype = ctypes.c_int
+    FALLOC_FL_KEEP_SIZE = 0x01
+    return fallocate(fd, FALLOC_FL_KEEP_SIZE, 0, size) == 0
+
+
+def preallocate(path: str, size: int) -> bool:
+    """
+    为已存在的文件预分配 size 字节的磁盘块，不改变文件长度
+
+    yt-dlp 根据 .part 的长度决定续传位置，因此不能用 posix_fallocate/truncate
+    （会把文件撑大）。
+
+    仅支持 Linux（fallocate + FALLOC_FL_KEEP_SIZE）。Windows 上超出文件末尾的分配
+    会在句柄关闭时被 NTFS 回收，而一直持有句柄又会阻止 yt-dlp 把 .part 重命名为
+    最终文件，因此不做预分配。不支持的平台/文件系统返回 False。
+    """
+    if size < PREALLOCATE_MIN_BYTES or platform.system() != 'Linux':
+        return False
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except OSError:
+        return False
+    try:
+        return _linux_fallocate(fd, size)
+    except Exception:
+        return False
+    finally:
+        os.close(fd)
+
+
+# 全局单例
+disk_admission = DiskSpaceAdmission()
@@ -4,41 +4,115 @@ NebulaDL - yt-dlp Download Wrapper Module
 
 import threading
 import os
+import re
+import copy
+import time
 import uuid
+import shutil
+import tempfile
 import platform
 import subprocess
+import urllib.parse
 from typing import Optional, Callable, Any, cast
 
 import yt_dlp
 
+from .bandwidth import bandwidth_governor
+from .diskspace import disk_admission, preallocate
+from .scratch import publish
+from .thumbnails import thumbnail_cache
+from .prefetch import info_expiry
+from .timeline import TaskTimeline
+from .progress import ProgressModel, MERGE_WEIGHT, CONVERT_WEIGHT, EXTRACT_AUDIO_WEIGHT
+from .metrics import engine_metrics
+from .canonical import url_canonicalizer
+from .inforecord import VideoRecord, PlaylistRecord
+
 try:
     from yt_dlp.utils import DownloadError as YtDlpDownloadError
+    from yt_dlp.utils import ExtractorError as YtDlpExtractorError
 except Exception:  # pragma: no cover
     YtDlpDownloadError = Exception
+    YtDlpExtractorError = Exception
+
+
+# 记入任务时间线的 yt-dlp 调试输出：后处理步骤和分片/请求重试
+_TIMELINE_DEBUG_RE = re.compile(r'^\[(Merger|ExtractAudio|Fixup\w*|VideoConvertor|VideoRemuxer|MoveFiles)\]|Retrying|Got error')
+
+
+class AnalysisCancelled(Exception):
+    """解析被取消（被新的解析取代、用户取消或超时）"""
+
+    def __init__(self, reason: str = 'cancel'):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _AnalysisLogger:
+    """yt-dlp 每次发起请求前都会输出一行日志：借此检查取消标记并上报进度。"""
+
+    def __init__(self, stop_event: threading.Event, progress: Optional[Callable[[str], None]] = None):
+        self._stop_event = stop_event
+        self._progress = progress
+
+    def _check(self) -> None:
+        if self._stop_event.is_set():
+            raise AnalysisCancelled()
+
+    def debug(self, msg):
+        self._check()
+        if self._progress and isinstance(msg, str) and msg.startswith('[') and not msg.startswith('[debug]'):
+            try:
+                self._progress(msg)
+            except Exception:
+                pass
+
+    def warning(self, msg):
+        self._check()
+
+    def error(self, msg):
+        self._check()
 
 
 class VideoAnalyzer:
     """视频信息解析器"""
     
     @staticmethod
-    def analyze(url: str, proxy: Optional[str] = None, cookiefile: Optional[str] = None) -> dict:
+    def analyze(
+        url: str,
+        proxy: Optional[str] = None,
+        cookiefile: Optional[str] = None,
+        stop_event: Optional[threading.Event] = None,
+        progress: Optional[Callable[[str], None]] = None,
+        on_info: Optional[Callable[[dict], None]] = None,
+    ) -> dict:
         """
         解析视频信息
         
         Args:
             url: 视频链接（任何 yt-dlp 支持的网站）
+            stop_event: 置位后在下一次网络请求前中止解析
+            progress: 接收 yt-dlp 的进度日志行（如 "[youtube] xxx: Downloading webpage"）
+            on_info: 接收 sanitize 后的完整提取信息（缓存后供下载任务复用，免去再次解析）
             
         Returns:
-            dict: 包含视频标题、缩略图、时长、来源站点、可用格式等信息
+            dict: 包含视频标题、缩略图、时长、来源站点、可用格式等信息；
+            播放列表返回 success=False 和 playlist（条目链接），由界面转入批量下载
         """
         ydl_opts: dict[str, Any] = {
             'quiet': True,
             'no_warnings': True,
-            'extract_flat': False,
-            # Keep individual network operations bounded.
-            # Overall timeout is enforced by JsApi.analyze_video.
+            # 播放列表条目不逐个解析：只读取列表页中的链接，按需翻页
+            'extract_flat': 'in_playlist',
+            'lazy_playlist': True,
+            # Keep individual network operations bounded; the overall timeout
+            # is enforced by AnalysisRunner through stop_event.
             'socket_timeout': 30,
+            # 首映/预约直播尚无格式，仍需拿到 live_status / release_timestamp。
+            'ignore_no_formats_error': True,
         }
+        if stop_event is not None:
+            ydl_opts['logger'] = _AnalysisLogger(stop_event, progress)
 
         if proxy:
             ydl_opts['proxy'] = proxy
@@ -49,25 +123,27 @@ class VideoAnalyzer:
         try:
             ydl_opts_any: Any = ydl_opts
             with yt_dlp.YoutubeDL(ydl_opts_any) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
+                # 分派索引直接给出提取器，免去按顺序尝试全部提取器的正则。
+                # process=False：播放列表的 entries 保持惰性，不会一次性展开
+                info = ydl.extract_info(url, download=False, process=False, ie_key=url_canonicalizer.ie_key(url)) or {}
+                if info.get('_type') != 'playlist':
+                    info = ydl.process_ie_result(info, download=False) or {}
+                if info.get('_type') == 'playlist':
+                    return _playlist_result(PlaylistRecord.from_info(info))
+
+                if on_info is not None and info:
+                    on_info(cast(dict, ydl.sanitize_info(info)))
+                # 只保留需要的字段，完整的 info 不再引用
+                record = VideoRecord.from_info(info)
+                del info
+
                 # 解析可用格式
                 formats = []
-                all_formats = list(info.get('formats') or [])
-                available_heights: set[int] = set()
-                has_audio = False
-                
-                for f in all_formats:
-                    height = f.get('height')
-                    if height:
-                        try:
-                            available_heights.add(int(height))
-                        except Exception:
-                            pass
-                    if f.get('acodec') != 'none' and f.get('vcodec') == 'none':
-                        has_audio = True
-                
-                duration = int(info.get('duration') or 0)
+                all_formats: list[Any] = list(record.formats)
+                available_heights = {f.height for f in all_formats if f.height}
+                has_audio = any(f.acodec != 'none' and f.vcodec == 'none' for f in all_formats)
+
+                duration = record.duration
 
                 # 构建格式列表：展示实际识别到的分辨率（<=1080 也全部展示）
                 afmt = _pick_best_audio_format(all_formats)
@@ -83,6 +159,7 @@ class VideoAnalyzer:
                         'label': f'{h}P',
                         'ext': 'MP4' if h <= 1080 else 'MKV',
                         'size': size_str,
+                        'size_bytes': int(total_bytes or 0),
                         'is_pro': False,
                     })
 
@@ -92,6 +169,23 @@ class VideoAnalyzer:
                         continue
                     add_height_option(h)
 
+                live_status = record.live_status
+                if live_status in ('is_live', 'is_upcoming'):
+                    # 直播/首映：录制模式放在首位（由 LiveRecordTask 处理）。
+                    formats.insert(0, {
+                        'id': 'live',
+                        'label': '直播录制' if live_status == 'is_live' else '开播后录制',
+                        'ext': 'TS',
+                        'size': '不定',
+                        'is_pro': False,
+                    })
+
+                if not all_formats and live_status != 'is_upcoming':
+                    return {
+                        'success': False,
+                        'error': '解析失败：未找到可下载的格式',
+                    }
+
                 if has_audio:
                     bytes_audio = _estimate_filesize_bytes(afmt, duration)
                     formats.append({
@@ -99,6 +193,7 @@ class VideoAnalyzer:
                         'label': 'Audio Only',
                         'ext': 'FLAC',
                         'size': _format_bytes(bytes_audio) if bytes_audio else '未知',
+                        'size_bytes': int(bytes_audio or 0),
                         'is_pro': False,
                     })
                 
@@ -112,33 +207,35 @@ class VideoAnalyzer:
                         'is_pro': False
                     })
                 
-                view_count = int(info.get('view_count') or 0)
-
-                site = (
-                    info.get('extractor_key')
-                    or info.get('extractor')
-                    or info.get('ie_key')
-                    or info.get('webpage_url_domain')
-                    or ''
-                )
-                site = str(site or '').strip()
-
                 return {
                     'success': True,
                     'data': {
-                        'title': info.get('title', '未知标题'),
-                        'thumbnail': info.get('thumbnail', ''),
+                        'title': record.title,
+                        'thumbnail': record.thumbnail,
                         'duration': duration,
                         'duration_str': _format_duration(duration),
-                        'view_count': _format_views(view_count),
-                        'uploader': info.get('uploader', '未知频道'),
-                        'site': site,
+                        'view_count': _format_views(record.view_count),
+                        'uploader': record.uploader,
+                        'site': record.site,
+                        'extractor_key': record.extractor_key,
+                        'video_id': record.video_id,
+                        'live_status': live_status,
+                        'release_timestamp': record.release_timestamp,
                         'formats': formats,
                         'url': url
                     }
                 }
                  
-        except YtDlpDownloadError as e:
+        except AnalysisCancelled:
+            return {
+                'success': False,
+                'cancelled': True,
+                'error': '解析已取消',
+            }
+        except (YtDlpDownloadError, YtDlpExtractorError) as e:
+            # 格式处理在 extract_info 之外进行，其中的错误不会被包装为 DownloadError
+            if stop_event is not None and stop_event.is_set():
+                return {'success': False, 'cancelled': True, 'error': '解析已取消'}
             friendly = _friendly_yt_dlp_error('解析', str(e))
             return {
                 'success': False,
@@ -151,6 +248,24 @@ class VideoAnalyzer:
             }
 
 
+def _playlist_result(playlist: PlaylistRecord) -> dict[str, Any]:
+    """播放列表的解析结果：不展示单个视频，条目链接交给批量下载。"""
+    count = len(playlist.urls)
+    if not count:
+        return {'success': False, 'error': '解析失败：播放列表中没有可下载的视频'}
+    more = '（仅读取前 {} 个）'.format(count) if playlist.truncated else ''
+    return {
+        'success': False,
+        'error': f'该链接是播放列表「{playlist.title}」，共 {count} 个视频{more}，请使用批量下载',
+        'playlist': {
+            'title': playlist.title,
+            'uploader': playlist.uploader,
+            'urls': list(playlist.urls),
+            'truncated': playlist.truncated,
+        },
+    }
+
+
 def _friendly_yt_dlp_error(action: str, raw_error: str) -> str:
     msg = (raw_error or '').strip()
     low = msg.lower()
@@ -232,6 +347,15 @@ def _estimate_filesize_bytes(fmt: Optional[dict], duration: int) -> int:
     return 0
 
 
+def _stream_key(fmt: dict) -> str:
+    """进度模型中的流标识：DASH 的视频流/音频流各一个，单文件格式为 'main'。"""
+    if (fmt.get('vcodec') or '') == 'none':
+        return 'audio'
+    if (fmt.get('acodec') or '') == 'none':
+        return 'video'
+    return 'main'
+
+
 def _estimate_merged_filesize_bytes(vfmt: Optional[dict], afmt: Optional[dict], duration: int) -> int:
     v = _estimate_filesize_bytes(vfmt, duration)
     a = _estimate_filesize_bytes(afmt, duration)
@@ -291,6 +415,191 @@ def _pick_best_audio_format(formats: list[dict]) -> Optional[dict]:
     return max(candidates, key=score)
 
 
+class SharedSource:
+    """同一视频的多个分辨率任务共享的解析结果与音轨缓存。
+
+    第一个任务负责 extract_info 和下载最佳音轨，其余任务等待并复用结果；
+    每个分辨率只下载自己的视频流，再与本地音轨合并。
+
+    _lock 只保护引用计数和状态，持有期间不做网络请求；解析由 _extract_lock 串行化，
+    acquire/release 不会等待正在进行的解析。
+    """
+
+    INFO_MAX_AGE = 1800  # 签名地址可能过期，解析结果最多复用 30 分钟
+    EXPIRY_MARGIN = 120  # 离地址过期不足该秒数时重新解析
+    SOCKET_TIMEOUT = 30
+
+    def __init__(self, url: str, cache_root: Optional[str] = None):
+        self.url = url
+        self._lock = threading.Lock()
+        self._extract_lock = threading.Lock()
+        # 最后一个引用释放时置位：中止进行中的预取
+        self._released = threading.Event()
+        self._audio_lock = threading.Lock()
+        self._info: Optional[dict] = None
+        self._info_at = 0.0
+        self._fresh_until = 0.0
+        self._url_lifetime: Optional[float] = None
+        self._audio_path: Optional[str] = None
+        self._refs = 0
+        self._cache_root = cache_root or os.path.join(tempfile.gettempdir(), 'nebuladl-audio')
+        self._cache_dir: Optional[str] = None
+
+    def acquire(self) -> None:
+        with self._lock:
+            self._refs += 1
+            self._released.clear()
+
+    def release(self) -> bool:
+        """释放引用；最后一个引用释放时清理音轨缓存并返回 True。"""
+        with self._lock:
+            self._refs = max(0, self._refs - 1)
+            if self._refs > 0:
+                return False
+            cache_dir = self._cache_dir
+            self._cache_dir = None
+            self._audio_path = None
+            self._info = None
+            self._released.set()
+        if cache_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        return True
+
+    def _extract(self, ydl: Any) -> dict:
+        """
+        解析并记录结果，返回记录的 info（不复制）
+
+        调用方持有 _extract_lock（不持有 _lock）：同一时间只有一次解析，后来者等待并复用。
+        """
+        with self._lock:
+            if self.is_fresh():
+                return cast(dict, self._info)
+        info = cast(dict, ydl.sanitize_info(ydl.extract_info(self.url, download=False, ie_key=url_canonicalizer.ie_key(self.url))))
+        with self._lock:
+            self._set_info(info)
+        return info
+
+    def _set_info(self, info: dict) -> None:
+        """记录解析结果的可复用期限：30 分钟与最早过期的签名地址两者取先。调用方持有 _lock。"""
+        now = time.time()
+        expires = info_expiry(info)
+        self._info = info
+        self._info_at = now
+        self._url_lifetime = (expires - now) if expires is not None else None
+        self._fresh_until = now + self.INFO_MAX_AGE
+        if expires is not None:
+            self._fresh_until = min(self._fresh_until, expires - self.EXPIRY_MARGIN)
+        self._audio_path = None
+
+    def seed(self, info: dict) -> None:
+        """使用已有的提取信息（例如粘贴链接后的预解析结果），任务开始时不再解析。"""
+        with self._lock:
+            if not self.is_fresh():
+                self._set_info(info)
+
+    def is_fresh(self) -> bool:
+        """是否已有未过期的解析结果（不等待正在进行的解析）。"""
+        return self._info is not None and time.time() < self._fresh_until
+
+    def get_info(self, ydl: Any) -> dict:
+        """返回解析结果的副本（只在首次或过期时真正解析）。"""
+        with self._lock:
+            info = self._info if self.is_fresh() else None
+        if info is None:
+            with self._extract_lock:
+                info = self._extract(ydl)
+        # 记录的 info 只会被整体替换、不会被修改，复制不需要持有锁
+        return copy.deepcopy(info)
+
+    def prefetch(
+        self,
+        base_opts: dict[str, Any],
+        stop_event: Optional[threading.Event] = None,
+    ) -> Optional[tuple[str, Optional[float]]]:
+        """
+        预取解析结果（排队期间在后台调用）
+
+        正在预取时开始的任务会在 get_info 中等待这次解析，而不是重复解析。
+        stop_event（默认为来源被全部释放）置位后在下一次网络请求前中止。
+
+        Returns:
+            (提取器, 地址有效秒数)；来源已被释放或预取被中止时返回 None
+        """
+        stop = stop_event or self._released
+        # 等待其他解析时也检查中止标记
+        while not self._extract_lock.acquire(timeout=0.5):
+            if stop.is_set():
+                return None
+        try:
+            with self._lock:
+                if self._refs <= 0 or stop.is_set():
+                    return None
+            opts = dict(base_opts)
+            opts.update({'quiet': True, 'no_warnings': True, 'skip_download': True})
+            opts.setdefault('socket_timeout', self.SOCKET_TIMEOUT)
+            opts['logger'] = _AnalysisLogger(stop)
+            opts_any: Any = opts
+            try:
+                with yt_dlp.YoutubeDL(opts_any) as ydl:
+                    info = self._extract(ydl)
+            except AnalysisCancelled:
+                return None
+        finally:
+            self._extract_lock.release()
+        with self._lock:
+            lifetime = self._url_lifetime
+        return str(info.get('extractor_key') or ''), lifetime
+
+    def get_audio(self, info: dict, base_opts: dict[str, Any]) -> Optional[str]:
+        """下载（或复用）最佳音轨到本地缓存，返回文件路径；没有独立音轨时返回 None。"""
+        with self._audio_lock:
+            if self._audio_path and os.path.isfile(self._audio_path):
+                return self._audio_path
+
+            if _pick_best_audio_format(list(info.get('formats') or [])) is None:
+                return None
+
+            with self._lock:
+                if not self._cache_dir:
+                    self._cache_dir = tempfile.mkdtemp(prefix='src-', dir=_ensure_dir(self._cache_root))
+                cache_dir = self._cache_dir
+
+            opts = dict(base_opts)
+            opts.update({
+                'format': 'bestaudio',
+                'outtmpl': os.path.join(cache_dir, 'audio.%(ext)s'),
+                'writethumbnail': False,
+                'postprocessors': [],
+            })
+            opts_any: Any = opts
+            with yt_dlp.YoutubeDL(opts_any) as ydl:
+                result = ydl.process_ie_result(copy.deepcopy(info), download=True)
+
+            path = None
+            for d in (result or {}).get('requested_downloads') or []:
+                path = d.get('filepath') or d.get('_filename')
+            if not path:
+                path = (result or {}).get('filepath') or (result or {}).get('_filename')
+            if not path or not os.path.isfile(path):
+                return None
+            self._audio_path = path
+            return path
+
+
+def _metrics_host(url: str) -> str:
+    """指标中的站点标签：去掉 www. 的主机名。"""
+    try:
+        host = (urllib.parse.urlparse(url or '').hostname or '').lower()
+    except ValueError:
+        host = ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def _ensure_dir(path: str) -> str:
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
 class DownloadTask(threading.Thread):
     """下载任务线程"""
     
@@ -306,6 +615,7 @@ class DownloadTask(threading.Thread):
         write_thumbnail: bool = True,
         cookiefile: Optional[str] = None,
         fragment_downloads: int = 1,
+        source: Optional[SharedSource] = None,
         progress_callback: Optional[Callable] = None,
         complete_callback: Optional[Callable] = None,
         error_callback: Optional[Callable] = None
@@ -313,6 +623,7 @@ class DownloadTask(threading.Thread):
         super().__init__(daemon=True)
         self.task_id = task_id or uuid.uuid4().hex
         self.url = url
+        self.host = _metrics_host(url)
         self.format_id = format_id
         self.output_dir = output_dir
         self.proxy = proxy
@@ -321,12 +632,33 @@ class DownloadTask(threading.Thread):
         self.write_thumbnail = bool(write_thumbnail)
         self.cookiefile = cookiefile
         self.fragment_downloads = max(1, int(fragment_downloads or 1))
+        # 全局限速记账：每个文件已计入的字节数（分片线程会并发回调）
+        self._metered: dict[str, int] = {}
+        self._meter_lock = threading.Lock()
+        # 由调度器在启动前按设置打开
+        self.preallocate = False
+        # 暂存目录：设置后下载/合并/转码都在这里进行，完成后移动到 output_dir
+        self.scratch_dir: Optional[str] = None
+        self.source = source
         self.progress_callback = progress_callback
         self.complete_callback = complete_callback
         self.error_callback = error_callback
+        # 最近一次失败的原始错误信息（供重试策略分类）
+        self.raw_error = ''
         self._stop_event = threading.Event()
         self._stop_reason = 'cancel'
         self._final_filepath: Optional[str] = None
+        # 结构化事件时间线（由调度器在启动前替换为该任务跨重试共享的实例）
+        self.timeline = TaskTimeline()
+        self._pp_started: dict[str, float] = {}
+        # 整个任务的进度（下载流按大小加权，后处理占固定份额）
+        if self.format_id == 'audio':
+            pp_weight = EXTRACT_AUDIO_WEIGHT
+        else:
+            pp_weight = CONVERT_WEIGHT if self.convert_mp4 else 0.0
+        self.progress = ProgressModel(pp_weight)
+        # 解析结果中的封面地址：完成后从共享缓存导出封面文件
+        self._thumbnail_url = ''
 
     class DownloadStopped(Exception):
         """User initiated stop (cancel/pause)."""
@@ -336,24 +668,46 @@ class DownloadTask(threading.Thread):
             self.reason = reason
 
     class _CancellationLogger:
-        """Check stop flag during yt-dlp logging"""
-
-        def __init__(self, stop_event: threading.Event, stop_reason_getter: Callable[[], str]):
+        """Check stop flag during yt-dlp logging; keep warnings/errors and notable debug lines in the timeline"""
+
+        def __init__(
+            self,
+            stop_event: threading.Event,
+            stop_reason_getter: Callable[[], str],
+            timeline: Optional[TaskTimeline] = None,
+        ):
             self._stop_event = stop_event
             self._stop_reason_getter = stop_reason_getter
+            self._timeline = timeline
 
-        def debug(self, msg):
+        def _check(self):
             if self._stop_event.is_set():
                 raise DownloadTask.DownloadStopped(self._stop_reason_getter())
 
+        def debug(self, msg):
+            self._check()
+            if self._timeline is not None and _TIMELINE_DEBUG_RE.search(str(msg or '')):
+                self._timeline.log('debug', msg)
+
         def warning(self, msg):
-            if self._stop_event.is_set():
-                raise DownloadTask.DownloadStopped(self._stop_reason_getter())
+            self._check()
+            if self._timeline is not None:
+                self._timeline.log('warning', msg)
 
         def error(self, msg):
-            if self._stop_event.is_set():
-                raise DownloadTask.DownloadStopped(self._stop_reason_getter())
+            self._check()
+            if self._timeline is not None:
+                self._timeline.log('error', msg)
     
+    def extraction_opts(self) -> dict[str, Any]:
+        """只解析元数据时使用的 yt-dlp 选项（排队期间预取）。"""
+        opts: dict[str, Any] = {}
+        if self.proxy:
+            opts['proxy'] = self.proxy
+        if self.cookiefile:
+            opts['cookiefile'] = self.cookiefile
+        return opts
+
     def stop(self, reason: str = 'cancel'):
         """请求停止下载。
 
@@ -369,6 +723,7 @@ class DownloadTask(threading.Thread):
     def run(self):
         """执行下载任务"""
         try:
+            self.timeline.phase('extract')
             # 根据格式选择 yt-dlp 选项
             requested_h: Optional[int] = None
             if self.format_id == '4k':
@@ -400,34 +755,26 @@ class DownloadTask(threading.Thread):
             else:
                 format_spec = 'best'
             
+            work_dir = self.scratch_dir or self.output_dir
             if self.create_folder:
-                outtmpl = os.path.join(self.output_dir, '%(title)s', f'%(title)s [{name_tag}].%(ext)s')
+                outtmpl = os.path.join(work_dir, '%(title)s', f'%(title)s [{name_tag}].%(ext)s')
             else:
-                outtmpl = os.path.join(self.output_dir, f'%(title)s [{name_tag}].%(ext)s')
+                outtmpl = os.path.join(work_dir, f'%(title)s [{name_tag}].%(ext)s')
 
             ydl_opts: dict[str, Any] = {
                 'format': format_spec,
                 'outtmpl': outtmpl,
                 'progress_hooks': [self._progress_hook],
                 'postprocessor_hooks': [self._postprocessor_hook],
-                'logger': self._CancellationLogger(self._stop_event, lambda: self._stop_reason),
+                'logger': self._CancellationLogger(self._stop_event, lambda: self._stop_reason, self.timeline),
                 'quiet': True,
                 'no_warnings': True,
                 'windowsfilenames': True,
                 'restrictfilenames': False,
-                'writethumbnail': self.write_thumbnail,
+                # 封面不经 yt-dlp 下载/FFmpeg 转换：完成后从共享缓存导出 JPG
+                'writethumbnail': False,
             }
 
-            # Ensure cover thumbnails are saved as JPG when possible.
-            # Uses FFmpeg (same dependency as audio extraction).
-            if self.write_thumbnail:
-                ydl_opts['postprocessors'] = [
-                    {
-                        'key': 'FFmpegThumbnailsConvertor',
-                        'format': 'jpg',
-                    }
-                ]
-
             if self.fragment_downloads > 1:
                 # Enable multi-connection fragment downloads for DASH/HLS streams.
                 ydl_opts['concurrent_fragment_downloads'] = int(self.fragment_downloads)
@@ -440,19 +787,23 @@ class DownloadTask(threading.Thread):
             
             # 音频格式特殊处理
             if self.format_id == 'audio':
-                pp = [
+                ydl_opts['postprocessors'] = [
                     {
                         'key': 'FFmpegExtractAudio',
                         'preferredcodec': 'flac',
                     }
                 ]
-                if self.write_thumbnail:
-                    pp.append({'key': 'FFmpegThumbnailsConvertor', 'format': 'jpg'})
-                ydl_opts['postprocessors'] = pp
             
             ydl_opts_any: Any = ydl_opts
             with yt_dlp.YoutubeDL(ydl_opts_any) as ydl:
-                ydl.download([self.url])
+                if self.source is None:
+                    ydl.extract_info(self.url, download=True, ie_key=url_canonicalizer.ie_key(self.url))
+                else:
+                    info = self.source.get_info(ydl)
+                    if not (requested_h and self._download_rendition(info, ydl_opts, requested_h)):
+                        # Progressive-only sources / audio / best: reuse the shared
+                        # extraction and let yt-dlp handle format selection.
+                        ydl.process_ie_result(info, download=True)
 
             if self.convert_mp4 and self.format_id != 'audio':
                 if self._stop_event.is_set():
@@ -463,15 +814,32 @@ class DownloadTask(threading.Thread):
                     raise RuntimeError('下载完成，但无法定位输出文件路径，无法转为 MP4')
 
                 if not src.lower().endswith('.mp4'):
-                    if self.progress_callback:
-                        self.progress_callback(self.task_id, 100, '下载完成，转为 MP4 中...')
+                    self._report_phase('下载完成，转为 MP4 中...')
+                    self.timeline.phase('convert')
+                    t0 = time.monotonic()
                     try:
                         dst = self._convert_to_mp4(src)
                         self._final_filepath = dst
+                        self._ffmpeg_done('convert', t0)
+                        self.progress.finish_step(CONVERT_WEIGHT)
                     except Exception as e:
+                        self._ffmpeg_done('convert', t0, ok=False)
+                        self.timeline.log('error', str(e))
+                        # 未转换的文件仍是完整的下载结果：先移动到下载目录再报告失败
+                        self._publish_scratch()
                         if self.error_callback:
                             self.error_callback(self.task_id, f'下载完成，但转为 MP4 失败：{e}')
                         return
+
+            if self.write_thumbnail and self._thumbnail_url and self._final_filepath:
+                # 与 yt-dlp writethumbnail 相同的命名：主文件同名 .jpg（封面失败不影响下载结果）
+                self.timeline.phase('thumbnail')
+                thumbnail_cache.export(self._thumbnail_url, os.path.splitext(self._final_filepath)[0] + '.jpg')
+
+            if self.scratch_dir:
+                if self._stop_event.is_set():
+                    raise DownloadTask.DownloadStopped(self._stop_reason)
+                self._publish_scratch()
             
             if self.complete_callback:
                 self.complete_callback(self.task_id, self._final_filepath)
@@ -483,58 +851,227 @@ class DownloadTask(threading.Thread):
                 else:
                     self.error_callback(self.task_id, '已取消')
         except Exception as e:
+            self.raw_error = str(e)
+            self.timeline.log('error', str(e))
             if self.error_callback:
                 self.error_callback(self.task_id, _friendly_yt_dlp_error('下载', str(e)))
     
+    def _publish_scratch(self) -> None:
+        """把暂存目录中已完成的文件移动到下载目录（未使用暂存目录时不做任何事）。"""
+        if not self.scratch_dir:
+            return
+        self._report_phase('移动到下载目录...')
+        self.timeline.phase('publish')
+        self._final_filepath = publish(self.scratch_dir, self.output_dir, self._final_filepath)
+
+    def _download_rendition(self, info: dict, ydl_opts: dict[str, Any], height: int) -> bool:
+        """共享源模式：只下载该分辨率的视频流，与缓存音轨合并。
+
+        Returns:
+            False 表示该视频没有独立的视频/音频流，调用方应回退到普通下载。
+        """
+        source = self.source
+        if source is None:
+            return False
+
+        formats = list(info.get('formats') or [])
+        vfmt = _pick_best_video_format(formats, max_height=height)
+        if vfmt is None or (vfmt.get('acodec') or 'none') != 'none':
+            return False
+
+        duration = int(info.get('duration') or 0)
+        self.progress.plan([
+            ('video', _estimate_filesize_bytes(vfmt, duration)),
+            ('audio', _estimate_filesize_bytes(_pick_best_audio_format(formats), duration)),
+        ])
+        if self.progress_callback:
+            self.progress_callback(self.task_id, -1, '获取共享音轨...')
+        self.timeline.phase('audio')
+        audio_path = source.get_audio(info, {
+            k: v for k, v in ydl_opts.items()
+            if k not in ('format', 'outtmpl', 'postprocessors', 'writethumbnail')
+        })
+        if not audio_path:
+            return False
+        # 音轨可能由其它任务下载（缓存命中时本任务不会收到它的进度回调）
+        self.progress.finish_stream('audio')
+
+        if self._stop_event.is_set():
+            raise DownloadTask.DownloadStopped(self._stop_reason)
+
+        # 视频流单独落盘（带 .fvideo 后缀），合并后去掉后缀。
+        outtmpl = cast(str, ydl_opts['outtmpl'])
+        root, ext_tmpl = os.path.splitext(outtmpl)
+        opts = dict(ydl_opts)
+        opts['format'] = f'bestvideo[height={height}]/bestvideo[height<={height}]'
+        opts['outtmpl'] = f'{root}.fvideo{ext_tmpl}'
+        opts_any: Any = opts
+        with yt_dlp.YoutubeDL(opts_any) as ydl:
+            result = ydl.process_ie_result(info, download=True)
+
+        video_path = None
+        for d in (result or {}).get('requested_downloads') or []:
+            video_path = d.get('filepath') or d.get('_filename')
+        if not video_path or not os.path.isfile(video_path):
+            raise RuntimeError('视频流下载完成，但无法定位文件')
+
+        if self._stop_event.is_set():
+            raise DownloadTask.DownloadStopped(self._stop_reason)
+
+        vroot, vext = os.path.splitext(video_path)
+        if vroot.endswith('.fvideo'):
+            vroot = vroot[:-len('.fvideo')]
+        aext = os.path.splitext(audio_path)[1].lstrip('.')
+        dst = f'{vroot}.{_merged_ext(vext.lstrip("."), aext)}'
+
+        self._report_phase('合并音视频中...')
+        self.timeline.phase('merge')
+        t0 = time.monotonic()
+        proc = _run_ffmpeg([
+            'ffmpeg',
+            '-y',
+            '-i', video_path,
+            '-i', audio_path,
+            '-map', '0:v:0',
+            '-map', '1:a:0',
+            '-c', 'copy',
+            dst,
+        ])
+        merged = proc.returncode == 0 and os.path.isfile(dst)
+        self._ffmpeg_done('merge', t0, ok=merged)
+        if not merged:
+            err = (proc.stderr or proc.stdout or '').strip()
+            err_tail = '\n'.join(err.splitlines()[-12:]) if err else '未知错误'
+            raise RuntimeError(f'FFmpeg 合并失败:\n{err_tail}')
+
+        self.progress.finish_step(MERGE_WEIGHT)
+        try:
+            os.remove(video_path)
+        except Exception:
+            pass
+        self._final_filepath = dst
+        return True
+
+    def _remember_thumbnail(self, info: Any) -> None:
+        if not self._thumbnail_url and isinstance(info, dict):
+            thumb = info.get('thumbnail')
+            if isinstance(thumb, str) and thumb.startswith(('http://', 'https://')):
+                self._thumbnail_url = thumb
+
     def _progress_hook(self, d: dict):
-        """进度回调钩子"""
+        """进度回调钩子（每个数据块调用一次：只更新数值，按间隔才生成状态文本）"""
         if self._stop_event.is_set():
             raise DownloadTask.DownloadStopped(self._stop_reason)
-        
+        info = d.get('info_dict')
+        self._remember_thumbnail(info)
+        key = self._plan_progress(info) or str(d.get('filename') or '')
+
         if d['status'] == 'downloading':
-            total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-            downloaded = d.get('downloaded_bytes', 0)
-            
-            if total > 0:
-                percent = int(downloaded / total * 100)
-                speed = d.get('speed', 0)
-                speed_str = _format_speed(speed) if speed else '计算中...'
+            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            downloaded = d.get('downloaded_bytes') or 0
+            self.timeline.phase('download')
+            self.timeline.sample(downloaded, total, d.get('speed'),
+                                 d.get('fragment_index'), d.get('fragment_count'))
+            # 只按确切大小预分配：估算值偏大会在文件末尾留下多余的已分配块
+            self._throttle(str(d.get('filename') or ''), downloaded, d.get('tmpfilename'), d.get('total_bytes'))
 
-                eta_str = ''
-                try:
-                    if speed and downloaded is not None and total and total > downloaded:
-                        remaining = float(total - downloaded)
-                        eta_seconds = int(remaining / float(speed)) if float(speed) > 0 else 0
-                        if eta_seconds > 0:
-                            eta_str = _format_duration(eta_seconds)
-                except Exception:
-                    eta_str = ''
+            if self.progress.update(key, downloaded, total, d.get('fragment_index'), d.get('fragment_count')):
+                self._report_download()
 
-                status = f'下载中 {speed_str}'
-                if eta_str:
-                    status = f'{status} 剩余 {eta_str}'
-                 
-                if self.progress_callback:
-                    self.progress_callback(self.task_id, percent, status)
-        
         elif d['status'] == 'finished':
+            self.timeline.event(
+                'file',
+                name=os.path.basename(str(d.get('filename') or '')),
+                bytes=int(d.get('total_bytes') or d.get('downloaded_bytes') or 0),
+                seconds=round(float(d.get('elapsed') or 0), 2),
+            )
             try:
                 fn = d.get('filename')
                 if isinstance(fn, str) and fn.strip():
                     self._final_filepath = fn
             except Exception:
                 pass
-            if self.progress_callback:
-                self.progress_callback(self.task_id, 100, '下载完成')
+            self.progress.finish_stream(key)
+            # DASH 视频流下载完还有音频流：不提前显示“下载完成”
+            if self.progress.all_done:
+                self._report_phase('下载完成')
+
+    def _plan_progress(self, info: Any) -> str:
+        """第一次回调时按解析结果登记所有流，返回当前回调所属的流。"""
+        if not isinstance(info, dict):
+            return ''
+        if not self.progress.planned:
+            duration = int(info.get('duration') or 0)
+            formats = [f for f in (info.get('requested_formats') or []) if isinstance(f, dict)] or [info]
+            self.progress.plan([(_stream_key(f), _estimate_filesize_bytes(f, duration)) for f in formats])
+        return _stream_key(info)
+
+    def _report_download(self) -> None:
+        if not self.progress_callback:
+            return
+        snap = self.progress.snapshot()
+        speed_str = _format_speed(snap.speed) if snap.speed else '计算中...'
+        status = f'下载中 {speed_str}'
+        if snap.percent < 0:
+            # 大小未知（直播/无长度的流）：只显示已下载量
+            status = f'{status} 已下载 {_format_bytes(snap.downloaded)}'
+        elif snap.eta:
+            status = f'{status} 剩余 {_format_duration(snap.eta)}'
+        self.progress_callback(self.task_id, snap.percent, status)
+
+    def _report_phase(self, status: str) -> None:
+        """阶段状态：进度条保持在模型的（单调）百分比。"""
+        if self.progress_callback:
+            self.progress_callback(self.task_id, self.progress.snapshot().percent, status)
+
+    def _throttle(self, filename: str, downloaded: int, tmpfilename: Any = None, total: Any = 0) -> None:
+        """把新下载的字节计入全局限速器和磁盘预留，超出份额时在下载线程中等待。"""
+        with self._meter_lock:
+            last = self._metered.get(filename)
+            if last is None:
+                # 第一次回调只建立基线：续传时 downloaded 包含磁盘上已有的部分
+                delta = 0
+                if self.preallocate and tmpfilename and total:
+                    preallocate(str(tmpfilename), int(total))
+            elif downloaded >= last:
+                delta = downloaded - last
+            else:
+                # 文件重新开始下载
+                delta = downloaded
+            self._metered[filename] = downloaded
+        disk_admission.consume(self.task_id, delta)
+        if delta:
+            engine_metrics.downloaded_bytes.inc(delta, host=self.host)
+        bandwidth_governor.consume(self.task_id, delta, self._stop_event)
+        if self._stop_event.is_set():
+            raise DownloadTask.DownloadStopped(self._stop_reason)
+
+    def _ffmpeg_done(self, step: str, started: float, ok: bool = True) -> None:
+        """记录一个 FFmpeg 步骤的耗时（时间线 + 指标）。"""
+        seconds = time.monotonic() - started
+        self.timeline.event('ffmpeg', step=step, seconds=round(seconds, 2), ok=ok)
+        engine_metrics.ffmpeg_seconds.observe(seconds, step=step)
 
     def _postprocessor_hook(self, d: dict):
         """后处理阶段钩子"""
         if self._stop_event.is_set():
             raise DownloadTask.DownloadStopped(self._stop_reason)
 
+        name = str(d.get('postprocessor') or '')
+        if d.get('status') == 'started':
+            self._pp_started[name] = time.monotonic()
+            self.timeline.phase('postprocess', step=name)
+        elif d.get('status') == 'finished' and name in self._pp_started:
+            self._ffmpeg_done(name, self._pp_started.pop(name))
+            if name == 'Merger':
+                self.progress.finish_step(MERGE_WEIGHT)
+            elif name == 'ExtractAudio':
+                self.progress.finish_step(EXTRACT_AUDIO_WEIGHT)
+
         try:
             if d.get('status') == 'finished':
                 info = d.get('info_dict')
+                self._remember_thumbnail(info)
                 if isinstance(info, dict):
                     fp = info.get('filepath') or info.get('_filename')
                     if isinstance(fp, str) and fp.strip():
@@ -563,20 +1100,6 @@ class DownloadTask(threading.Thread):
                     break
                 i += 1
 
-        creationflags = subprocess.CREATE_NO_WINDOW if platform.system() == 'Windows' else 0
-
-        def run_ffmpeg(args: list[str]) -> subprocess.CompletedProcess[str]:
-            try:
-                return subprocess.run(
-                    args,
-                    capture_output=True,
-                    text=True,
-                    timeout=None,
-                    creationflags=creationflags,
-                )
-            except FileNotFoundError:
-                raise RuntimeError('未检测到 FFmpeg，请先安装并加入 PATH')
-
         # 1) Prefer lossless remux (stream copy).
         remux_cmd = [
             'ffmpeg',
@@ -590,7 +1113,7 @@ class DownloadTask(threading.Thread):
             '-movflags', '+faststart',
             dst,
         ]
-        proc = run_ffmpeg(remux_cmd)
+        proc = _run_ffmpeg(remux_cmd)
 
         # 2) Fallback: transcode to H.264/AAC for broad MP4 compatibility.
         if proc.returncode != 0:
@@ -616,9 +1139,15 @@ class DownloadTask(threading.Thread):
                 '-movflags', '+faststart',
                 dst,
             ]
-            proc = run_ffmpeg(transcode_cmd)
+            proc = _run_ffmpeg(transcode_cmd)
 
         if proc.returncode != 0 or not os.path.isfile(dst):
+            # 不留下不完整的输出文件（暂存目录中的文件会被移动到下载目录）
+            if os.path.exists(dst):
+                try:
+                    os.remove(dst)
+                except Exception:
+                    pass
             err = (proc.stderr or proc.stdout or '').strip()
             err_tail = '\n'.join(err.splitlines()[-12:]) if err else '未知错误'
             raise RuntimeError(f'FFmpeg 转换失败:\n{err_tail}')
@@ -632,6 +1161,31 @@ class DownloadTask(threading.Thread):
         return dst
 
 
+def _run_ffmpeg(args: list[str]) -> subprocess.CompletedProcess[str]:
+    creationflags = subprocess.CREATE_NO_WINDOW if platform.system() == 'Windows' else 0
+    try:
+        return subprocess.run(
+            args,
+            capture_output=True,
+            text=True,
+            timeout=None,
+            creationflags=creationflags,
+        )
+    except FileNotFoundError:
+        raise RuntimeError('未检测到 FFmpeg，请先安装并加入 PATH')
+
+
+def _merged_ext(video_ext: str, audio_ext: str) -> str:
+    """与 yt-dlp 默认合并规则一致：兼容时用 mp4/webm，否则用 mkv。"""
+    v = (video_ext or '').lower()
+    a = (audio_ext or '').lower()
+    if v == 'mp4' and a in ('m4a', 'mp4', 'aac'):
+        return 'mp4'
+    if v == 'webm' and a in ('webm', 'opus'):
+        return 'webm'
+    return 'mkv'
+
+
 def _format_duration(seconds: int) -> str:
     """格式化时长"""
     if not seconds:
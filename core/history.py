@@ -2,13 +2,68 @@
 NebulaDL - Download History Module
 
 持久化记录下载历史，支持搜索和一键重下。
+查询接口支持过滤、排序和游标分页；结果集按查询前缀缓存，输入搜索词时在上一次的结果中继续收窄。
 """
 
 import os
 import json
 import uuid
-from typing import Optional, Any
+import base64
+import bisect
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Any, Iterable
 from datetime import datetime
+from urllib.parse import urlparse
+
+
+# 历史列表需要的字段（查询默认只返回这些）
+LIST_FIELDS = ('id', 'title', 'url', 'format_id', 'status', 'timestamp', 'output_path', 'filesize', 'thumbnail', 'task_id')
+
+SORT_KEYS = ('time', 'title', 'size', 'status')
+
+
+@dataclass(frozen=True)
+class HistoryFilter:
+    """历史查询条件（不含分页）"""
+
+    text: str = ''
+    status: str = ''
+    format_id: str = ''
+    site: str = ''
+    since: str = ''   # ISO 日期/时间，含
+    until: str = ''   # ISO 日期/时间，含（按前缀比较，'2024-05-01' 包含当天）
+    sort: str = '-time'
+
+    def base(self) -> tuple:
+        """除搜索词以外的条件，用作前缀缓存的分组键。"""
+        return (self.status, self.format_id, self.site, self.since, self.until, self.sort)
+
+
+def record_site(record: dict[str, Any]) -> str:
+    """记录来源站点：优先 video_key 中的提取器名，否则使用链接域名。"""
+    vkey = str(record.get('video_key') or '')
+    if vkey and not vkey.startswith('url:') and ':' in vkey:
+        return vkey.split(':', 1)[0]
+    try:
+        host = (urlparse(str(record.get('url') or '')).hostname or '').lower()
+    except Exception:
+        host = ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def _encode_cursor(key: tuple) -> str:
+    raw = json.dumps(list(key)).encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> Optional[tuple]:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return tuple(data) if isinstance(data, list) and len(data) == 2 else None
+    except Exception:
+        return None
 
 
 class DownloadHistory:
@@ -16,9 +71,14 @@ class DownloadHistory:
 
     HISTORY_FILE = os.path.join(os.path.expanduser('~'), '.nebuladl_history.json')
     MAX_RECORDS = 500  # 最多保存的记录数
+    QUERY_CACHE_SIZE = 32  # 缓存的查询结果集数量
 
     def __init__(self):
         self._records: list[dict[str, Any]] = []
+        self._lock = threading.RLock()
+        # (条件分组, 搜索词) -> 已排序的结果集；任何写入都会清空
+        self._query_cache: OrderedDict[tuple, list[dict[str, Any]]] = OrderedDict()
+        self._haystacks: dict[str, str] = {}
         self._load()
 
     def _load(self) -> None:
@@ -47,7 +107,11 @@ class DownloadHistory:
         format_id: str,
         output_path: str,
         status: str,
-        error: Optional[str] = None
+        error: Optional[str] = None,
+        filesize: Optional[int] = None,
+        video_key: Optional[str] = None,
+        thumbnail: Optional[str] = None,
+        task_id: Optional[str] = None,
     ) -> str:
         """
         添加一条下载记录
@@ -59,6 +123,10 @@ class DownloadHistory:
             output_path: 保存路径
             status: 状态 ('completed', 'error', 'cancelled')
             error: 错误信息（可选）
+            filesize: 完成文件的字节数（可选，用于去重校验）
+            video_key: 视频键 "extractor:id"（可选，用于去重）
+            thumbnail: 远程封面地址（可选，列表通过本地缩略图服务显示）
+            task_id: 下载任务 ID（可选，用于查看该任务的事件时间线）
 
         Returns:
             记录 ID
@@ -72,13 +140,19 @@ class DownloadHistory:
             'output_path': output_path,
             'status': status,
             'error': error,
+            'filesize': filesize,
+            'video_key': video_key,
+            'thumbnail': thumbnail,
+            'task_id': task_id,
             'timestamp': datetime.now().isoformat(),
         }
-        self._records.insert(0, record)
+        with self._lock:
+            self._records.insert(0, record)
 
-        # 限制记录数量
-        if len(self._records) > self.MAX_RECORDS:
-            self._records = self._records[:self.MAX_RECORDS]
+            # 限制记录数量
+            if len(self._records) > self.MAX_RECORDS:
+                self._records = self._records[:self.MAX_RECORDS]
+            self._invalidate()
 
         self._save()
         return record_id
@@ -108,6 +182,129 @@ class DownloadHistory:
                     break
         return results
 
+    def query(
+        self,
+        flt: HistoryFilter,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        fields: Iterable[str] = LIST_FIELDS,
+    ) -> dict[str, Any]:
+        """
+        过滤 + 排序 + 游标分页查询
+
+        Args:
+            flt: 查询条件
+            cursor: 上一页返回的 next_cursor（为空表示第一页）
+            limit: 每页数量
+            fields: 返回的字段（投影）
+
+        Returns:
+            {'records', 'next_cursor', 'total'}
+        """
+        with self._lock:
+            results = self._matching(flt)
+
+        keys = [self._sort_key(r, flt.sort) for r in results]
+        start = 0
+        if cursor:
+            after = _decode_cursor(cursor)
+            if after is not None:
+                # 游标是上一页最后一条的排序键：页间插入/删除记录不会导致重复或遗漏
+                try:
+                    start = bisect.bisect_right(keys, after)
+                except TypeError:
+                    start = 0
+
+        page = results[start:start + limit]
+        next_cursor = None
+        if start + limit < len(results) and page:
+            next_cursor = _encode_cursor(keys[start + len(page) - 1])
+
+        wanted = tuple(fields)
+        return {
+            'records': [{k: r.get(k) for k in wanted} for r in page],
+            'next_cursor': next_cursor,
+            'total': len(results),
+        }
+
+    def _matching(self, flt: HistoryFilter) -> list[dict[str, Any]]:
+        """返回满足条件的已排序结果集（带前缀缓存）。调用方持有 _lock。"""
+        text = flt.text.strip().lower()
+        group = flt.base()
+        cache_key = (group, text)
+
+        hit = self._query_cache.get(cache_key)
+        if hit is not None:
+            self._query_cache.move_to_end(cache_key)
+            return hit
+
+        # 包含更长搜索词的记录一定包含其前缀：从最长的已缓存前缀结果中收窄
+        source: Optional[list[dict[str, Any]]] = None
+        for n in range(len(text) - 1, -1, -1):
+            source = self._query_cache.get((group, text[:n]))
+            if source is not None:
+                break
+
+        if source is None:
+            source = sorted(
+                (r for r in self._records if self._passes(r, flt)),
+                key=lambda r: self._sort_key(r, flt.sort),
+            )
+            self._query_cache[(group, '')] = source
+
+        results = [r for r in source if self._haystack(r).find(text) >= 0] if text else source
+
+        self._query_cache[cache_key] = results
+        while len(self._query_cache) > self.QUERY_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+        return results
+
+    def _haystack(self, r: dict[str, Any]) -> str:
+        rid = str(r.get('id') or '')
+        hay = self._haystacks.get(rid)
+        if hay is None:
+            hay = f"{r.get('title') or ''}\n{r.get('url') or ''}".lower()
+            self._haystacks[rid] = hay
+        return hay
+
+    @staticmethod
+    def _passes(r: dict[str, Any], flt: HistoryFilter) -> bool:
+        if flt.status and r.get('status') != flt.status:
+            return False
+        if flt.format_id and r.get('format_id') != flt.format_id:
+            return False
+        ts = str(r.get('timestamp') or '')
+        if flt.since and ts < flt.since:
+            return False
+        if flt.until and ts[:len(flt.until)] > flt.until:
+            return False
+        if flt.site and flt.site.lower() not in record_site(r):
+            return False
+        return True
+
+    @staticmethod
+    def _sort_key(r: dict[str, Any], sort: str) -> tuple:
+        """排序键 (值, id)；降序时数值取负、字符串按反向排序位比较。"""
+        desc = sort.startswith('-')
+        name = sort.lstrip('-')
+        rid = str(r.get('id') or '')
+        if name == 'size':
+            v: Any = int(r.get('filesize') or 0)
+            return (-v if desc else v, rid)
+        if name == 'title':
+            v = str(r.get('title') or '').lower()
+        elif name == 'status':
+            v = str(r.get('status') or '')
+        else:
+            v = str(r.get('timestamp') or '')
+        if desc:
+            # 字符串降序：逐字符取反码并加结束符（保证 "abc" 排在 "ab" 前），保持单一升序比较
+            v = ''.join(chr(0x10FFFF - ord(c)) for c in v) + chr(0x10FFFF)
+        return (v, rid)
+
+    def _invalidate(self) -> None:
+        self._query_cache.clear()
+
     def get_record_by_id(self, record_id: str) -> Optional[dict[str, Any]]:
         """根据 ID 获取单条记录"""
         for r in self._records:
@@ -117,16 +314,24 @@ class DownloadHistory:
 
     def delete_record(self, record_id: str) -> bool:
         """删除单条记录"""
-        for i, r in enumerate(self._records):
-            if r.get('id') == record_id:
-                self._records.pop(i)
-                self._save()
-                return True
-        return False
+        with self._lock:
+            for i, r in enumerate(self._records):
+                if r.get('id') == record_id:
+                    self._records.pop(i)
+                    self._haystacks.pop(str(record_id), None)
+                    self._invalidate()
+                    break
+            else:
+                return False
+        self._save()
+        return True
 
     def clear_all(self) -> None:
         """清空所有历史记录"""
-        self._records = []
+        with self._lock:
+            self._records = []
+            self._haystacks.clear()
+            self._invalidate()
         self._save()
 
 
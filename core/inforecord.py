@@ -0,0 +1,155 @@
+"""
+NebulaDL - Info Record Module
+
+yt-dlp 提取信息的精简表示：解析只需要少数字段，完整的 info（每个格式的地址、请求头、
+分片列表等）在生成摘要后即可释放。记录使用 __slots__，播放列表条目逐个流式读取、
+只保留链接，大列表的内存占用与条目数近似线性且很小。
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Any, Iterable
+
+
+# 播放列表最多展开的条目数：超过后停止翻页
+MAX_PLAYLIST_ENTRIES = 10000
+
+
+def _int(value: Any) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _float(value: Any) -> float:
+    try:
+        return float(value or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _str(value: Any) -> str:
+    return str(value or '').strip()
+
+
+@dataclass(frozen=True, slots=True)
+class FormatRecord:
+    """
+    格式选择/大小估算需要的字段
+
+    提供与 dict 相同的 get()，可以直接传给 _pick_best_*_format 等按 dict 读取的函数。
+    vcodec/acodec 保留 None（未知），与 'none'（没有该流）区分。
+    """
+
+    format_id: str = ''
+    ext: str = ''
+    height: int = 0
+    vcodec: Optional[str] = None
+    acodec: Optional[str] = None
+    tbr: float = 0.0
+    abr: float = 0.0
+    filesize: int = 0
+    filesize_approx: int = 0
+
+    @classmethod
+    def from_info(cls, f: dict[str, Any]) -> 'FormatRecord':
+        return cls(
+            format_id=_str(f.get('format_id')),
+            ext=_str(f.get('ext')),
+            height=_int(f.get('height')),
+            vcodec=f.get('vcodec'),
+            acodec=f.get('acodec'),
+            tbr=_float(f.get('tbr')),
+            abr=_float(f.get('abr')),
+            filesize=_int(f.get('filesize')),
+            filesize_approx=_int(f.get('filesize_approx')),
+        )
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.__slots__ else default
+
+
+@dataclass(frozen=True, slots=True)
+class VideoRecord:
+    """解析结果需要的视频字段"""
+
+    video_id: str
+    title: str
+    thumbnail: str
+    uploader: str
+    duration: int
+    view_count: int
+    site: str
+    extractor_key: str
+    live_status: str
+    release_timestamp: int
+    formats: tuple[FormatRecord, ...]
+
+    @classmethod
+    def from_info(cls, info: dict[str, Any]) -> 'VideoRecord':
+        live_status = _str(info.get('live_status'))
+        if info.get('is_live'):
+            live_status = 'is_live'
+        site = (
+            info.get('extractor_key')
+            or info.get('extractor')
+            or info.get('ie_key')
+            or info.get('webpage_url_domain')
+        )
+        return cls(
+            video_id=_str(info.get('id')),
+            title=_str(info.get('title')) or '未知标题',
+            thumbnail=_str(info.get('thumbnail')),
+            uploader=_str(info.get('uploader')) or '未知频道',
+            duration=_int(info.get('duration')),
+            view_count=_int(info.get('view_count')),
+            site=_str(site),
+            extractor_key=_str(info.get('extractor_key') or info.get('extractor')),
+            live_status=live_status,
+            release_timestamp=_int(info.get('release_timestamp')),
+            formats=tuple(FormatRecord.from_info(f) for f in info.get('formats') or () if isinstance(f, dict)),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class PlaylistRecord:
+    """播放列表摘要：条目只保留链接"""
+
+    title: str
+    uploader: str
+    urls: tuple[str, ...]
+    truncated: bool      # 达到 MAX_PLAYLIST_ENTRIES，后面的条目未读取
+
+    @classmethod
+    def from_info(cls, info: dict[str, Any], limit: int = MAX_PLAYLIST_ENTRIES) -> 'PlaylistRecord':
+        urls: list[str] = []
+        seen: set[str] = set()
+        truncated = False
+        for url in iter_entry_urls(info.get('entries') or ()):
+            if url in seen:
+                continue
+            if len(urls) >= limit:
+                truncated = True
+                break
+            seen.add(url)
+            urls.append(url)
+        return cls(
+            title=_str(info.get('title')) or '未知播放列表',
+            uploader=_str(info.get('uploader') or info.get('channel')),
+            urls=tuple(urls),
+            truncated=truncated,
+        )
+
+
+def iter_entry_urls(entries: Iterable[Any]) -> Iterable[str]:
+    """
+    逐个读取播放列表条目（惰性列表按需翻页），产出条目的网页链接
+
+    条目字典读取后即丢弃；嵌套的子列表（频道首页的视频/短视频标签页等）不展开。
+    """
+    for entry in entries:
+        if not isinstance(entry, dict) or entry.get('_type') == 'playlist':
+            continue
+        url = _str(entry.get('webpage_url') or entry.get('url'))
+        if url.startswith(('http://', 'https://')):
+            yield url
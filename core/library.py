@@ -0,0 +1,341 @@
+"""
+NebulaDL - Library Index Module
+
+已下载文件索引：记录每个完成下载的最终路径、字节数、时长、编码和抽样内容哈希。
+按 (视频键, 格式) 做 O(1) 查找用于去重；按目录 mtime 增量重扫，
+只检查内容发生变化的目录；相同哈希 + 大小的文件视为重复。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+import subprocess
+import platform
+from dataclasses import dataclass, asdict, fields
+from typing import Optional, Any, Iterable
+
+from .settings import DebouncedJsonWriter
+
+try:
+    import xxhash  # type: ignore
+except Exception:  # pragma: no cover
+    xxhash = None
+
+
+SAMPLE_BYTES = 64 * 1024  # 每个采样块的大小
+
+
+def sampled_hash(path: str, size: Optional[int] = None) -> str:
+    """抽样哈希：文件大小 + 头/中/尾各 64KB。大文件也只读 192KB。"""
+    if size is None:
+        size = os.path.getsize(path)
+    h: Any = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    h.update(str(size).encode('ascii'))
+    with open(path, 'rb') as f:
+        if size <= SAMPLE_BYTES * 3:
+            h.update(f.read())
+        else:
+            for offset in (0, size // 2 - SAMPLE_BYTES // 2, size - SAMPLE_BYTES):
+                f.seek(offset)
+                h.update(f.read(SAMPLE_BYTES))
+    return h.hexdigest()
+
+
+def probe_media(path: str) -> dict[str, Any]:
+    """用 ffprobe 读取时长和编码（失败时返回空字典）。"""
+    creationflags = subprocess.CREATE_NO_WINDOW if platform.system() == 'Windows' else 0
+    try:
+        proc = subprocess.run(
+            ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+            capture_output=True,
+            text=True,
+            timeout=30,
+            creationflags=creationflags,
+        )
+        data = json.loads(proc.stdout or '{}')
+    except Exception:
+        return {}
+
+    result: dict[str, Any] = {}
+    try:
+        result['duration'] = float((data.get('format') or {}).get('duration') or 0) or None
+    except Exception:
+        pass
+    for st in data.get('streams') or []:
+        kind = st.get('codec_type')
+        if kind == 'video' and 'vcodec' not in result and st.get('disposition', {}).get('attached_pic') != 1:
+            result['vcodec'] = st.get('codec_name')
+        elif kind == 'audio' and 'acodec' not in result:
+            result['acodec'] = st.get('codec_name')
+    return result
+
+
+@dataclass
+class LibraryEntry:
+    path: str
+    size: int
+    mtime: float
+    hash: str = ''
+    video_key: str = ''
+    format_id: str = ''
+    duration: Optional[float] = None
+    vcodec: Optional[str] = None
+    acodec: Optional[str] = None
+    added: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Optional['LibraryEntry']:
+        known = {f.name for f in fields(cls)}
+        try:
+            entry = cls(**{k: v for k, v in data.items() if k in known})
+        except TypeError:
+            return None
+        return entry if entry.path else None
+
+
+class LibraryIndex:
+    """已下载文件索引（线程安全）"""
+
+    LIBRARY_FILE = os.path.join(os.path.expanduser('~'), '.nebuladl_library.json')
+
+    def __init__(self, path: Optional[str] = None, probe: bool = True):
+        self._path = path or self.LIBRARY_FILE
+        self._probe = probe
+        self._lock = threading.RLock()
+        self._by_path: dict[str, LibraryEntry] = {}
+        self._by_key: dict[tuple[str, str], str] = {}
+        self._dir_mtimes: dict[str, float] = {}
+        self._writer = DebouncedJsonWriter(self._path, delay=1.0)
+        self._load()
+
+    # --- 持久化 ---
+    def _load(self) -> None:
+        try:
+            if os.path.exists(self._path):
+                with open(self._path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    for raw in data.get('entries') or []:
+                        entry = LibraryEntry.from_dict(raw) if isinstance(raw, dict) else None
+                        if entry is not None:
+                            self._put(entry)
+                    dirs = data.get('dirs') or {}
+                    if isinstance(dirs, dict):
+                        self._dir_mtimes = {str(k): float(v) for k, v in dirs.items()}
+        except Exception:
+            self._by_path.clear()
+            self._by_key.clear()
+            self._dir_mtimes.clear()
+
+    def _snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': [asdict(e) for e in self._by_path.values()],
+                'dirs': dict(self._dir_mtimes),
+            }
+
+    def _save(self) -> None:
+        self._writer.schedule(self._snapshot)
+
+    def flush(self) -> None:
+        self._writer.flush()
+
+    # --- 索引维护（调用方持有 _lock） ---
+    @staticmethod
+    def _norm(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def _put(self, entry: LibraryEntry) -> None:
+        key_path = self._norm(entry.path)
+        self._drop(key_path)
+        self._by_path[key_path] = entry
+        if entry.video_key:
+            self._by_key[(entry.video_key, entry.format_id)] = key_path
+
+    def _drop(self, key_path: str) -> Optional[LibraryEntry]:
+        entry = self._by_path.pop(key_path, None)
+        if entry is not None and entry.video_key:
+            k = (entry.video_key, entry.format_id)
+            if self._by_key.get(k) == key_path:
+                self._by_key.pop(k, None)
+        return entry
+
+    def _touch_dir(self, directory: str) -> None:
+        try:
+            self._dir_mtimes[self._norm(directory)] = os.stat(directory).st_mtime
+        except OSError:
+            pass
+
+    # --- 公共接口 ---
+    def __len__(self) -> int:
+        return len(self._by_path)
+
+    def add(
+        self,
+        path: str,
+        video_key: str = '',
+        format_id: str = '',
+        duration: Optional[float] = None,
+    ) -> Optional[LibraryEntry]:
+        """登记一个已完成的文件（同步计算抽样哈希，时长/编码在后台用 ffprobe 补全）。路径不是文件时返回 None。"""
+        path = (path or '').strip()
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            digest = sampled_hash(path, st.st_size)
+        except OSError:
+            digest = ''
+
+        entry = LibraryEntry(
+            path=os.path.abspath(path),
+            size=int(st.st_size),
+            mtime=float(st.st_mtime),
+            hash=digest,
+            video_key=video_key or '',
+            format_id=format_id or '',
+            duration=duration,
+            added=time.time(),
+        )
+        with self._lock:
+            self._put(entry)
+            self._touch_dir(os.path.dirname(entry.path))
+        self._save()
+
+        if self._probe:
+            threading.Thread(target=self._probe_entry, args=(entry,), daemon=True).start()
+        return entry
+
+    def _probe_entry(self, entry: LibraryEntry) -> None:
+        meta = probe_media(entry.path)
+        if not meta:
+            return
+        with self._lock:
+            entry.duration = meta.get('duration') or entry.duration
+            entry.vcodec = meta.get('vcodec')
+            entry.acodec = meta.get('acodec')
+        self._save()
+
+    def seed(self, records: Iterable[dict[str, Any]]) -> None:
+        """导入历史记录中已完成、带大小的下载（只做登记，哈希在重扫时补全）。"""
+        changed = False
+        with self._lock:
+            for r in records:
+                if r.get('status') != 'completed':
+                    continue
+                vkey = str(r.get('video_key') or '')
+                path = str(r.get('output_path') or '')
+                size = r.get('filesize')
+                if not vkey or not path or not size:
+                    continue
+                k = (vkey, str(r.get('format_id') or ''))
+                if k in self._by_key or self._norm(path) in self._by_path:
+                    continue
+                self._put(LibraryEntry(path=os.path.abspath(path), size=int(size), mtime=0.0,
+                                       video_key=k[0], format_id=k[1], added=time.time()))
+                changed = True
+        if changed:
+            self._save()
+
+    def lookup(self, video_key: str, format_id: str) -> Optional[LibraryEntry]:
+        """O(1) 查找已下载文件；文件被删除或大小改变时作废该条目。"""
+        with self._lock:
+            key_path = self._by_key.get((video_key, format_id or ''))
+            entry = self._by_path.get(key_path) if key_path else None
+        if entry is None:
+            return None
+        try:
+            ok = os.path.getsize(entry.path) == entry.size
+        except OSError:
+            ok = False
+        if not ok:
+            with self._lock:
+                self._drop(self._norm(entry.path))
+            self._save()
+            return None
+        return entry
+
+    def rescan(self) -> dict[str, int]:
+        """增量重扫：目录 mtime 未变的跳过；变化的目录逐个核对已登记文件。"""
+        with self._lock:
+            by_dir: dict[str, list[str]] = {}
+            for key_path, entry in self._by_path.items():
+                by_dir.setdefault(self._norm(os.path.dirname(entry.path)), []).append(key_path)
+            known_dirs = dict(self._dir_mtimes)
+
+        stats = {'dirs': len(by_dir), 'scanned': 0, 'removed': 0, 'rehashed': 0}
+        for directory, key_paths in by_dir.items():
+            try:
+                mtime = os.stat(directory).st_mtime
+            except OSError:
+                mtime = None
+
+            # 未补全哈希的条目（来自历史导入）也需要检查
+            with self._lock:
+                pending = [kp for kp in key_paths if kp in self._by_path and not self._by_path[kp].hash]
+            if mtime is not None and known_dirs.get(directory) == mtime and not pending:
+                continue
+
+            stats['scanned'] += 1
+            for kp in key_paths:
+                with self._lock:
+                    entry = self._by_path.get(kp)
+                if entry is None:
+                    continue
+                try:
+                    st = os.stat(entry.path)
+                except OSError:
+                    with self._lock:
+                        self._drop(kp)
+                    stats['removed'] += 1
+                    continue
+                if entry.hash and st.st_size == entry.size and st.st_mtime == entry.mtime:
+                    continue
+                try:
+                    digest = sampled_hash(entry.path, st.st_size)
+                except OSError:
+                    continue
+                with self._lock:
+                    entry.size, entry.mtime, entry.hash = int(st.st_size), float(st.st_mtime), digest
+                stats['rehashed'] += 1
+
+            with self._lock:
+                if mtime is None:
+                    self._dir_mtimes.pop(directory, None)
+                else:
+                    self._dir_mtimes[directory] = mtime
+
+        if stats['scanned']:
+            self._save()
+        return stats
+
+    def duplicates(self) -> list[list[dict[str, Any]]]:
+        """内容相同（大小 + 抽样哈希一致）的文件分组，每组按登记时间排序。"""
+        groups: dict[tuple[int, str], list[LibraryEntry]] = {}
+        with self._lock:
+            for entry in self._by_path.values():
+                if entry.hash:
+                    groups.setdefault((entry.size, entry.hash), []).append(entry)
+        return [
+            [asdict(e) for e in sorted(g, key=lambda e: e.added)]
+            for g in groups.values()
+            if len(g) > 1
+        ]
+
+    def forget(self, path: str) -> bool:
+        """从索引中移除一个文件（不删除文件本身）。"""
+        with self._lock:
+            removed = self._drop(self._norm(path)) is not None
+        if removed:
+            self._save()
+        return removed
+
+
+# 全局单例
+library_index = LibraryIndex()
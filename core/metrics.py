@@ -0,0 +1,298 @@
+"""
+NebulaDL - Metrics Module
+
+下载引擎的运行指标：计数器、仪表和直方图，以 Prometheus 文本格式在本机端口上提供
+（/metrics），同时可以通过 JsApi 获取 JSON 快照。不依赖任何外部服务或第三方库。
+"""
+
+import math
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Callable, Any, Iterable
+
+
+# 耗时直方图的默认分桶（秒）：覆盖从毫秒级的事件到小时级的排队
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _fmt_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels_text(names: tuple[str, ...], values: LabelValues, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    """单调递增的计数器"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if amount < 0:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> list[tuple[LabelValues, float]]:
+        with self._lock:
+            return sorted(self._values.items())
+
+    def render(self) -> list[str]:
+        return self.header() + [f'{self.name}{_labels_text(self.labelnames, k)} {_fmt_value(v)}' for k, v in self.samples()]
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return [{'labels': dict(zip(self.labelnames, k)), 'value': v} for k, v in self.samples()]
+
+
+class Gauge(Counter):
+    """可增可减的仪表；传入 callback 时每次采集都调用它取当前值"""
+
+    kind = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Iterable[str] = (),
+        callback: Optional[Callable[[], dict[LabelValues, float]]] = None,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self._callback = callback
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def samples(self) -> list[tuple[LabelValues, float]]:
+        if self._callback is not None:
+            try:
+                return sorted((tuple(k), float(v)) for k, v in self._callback().items())
+            except Exception:
+                return []
+        return super().samples()
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets)) + (math.inf,)
+        # key -> (每个分桶的计数, 总和, 总数)
+        self._values: dict[LabelValues, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        value = max(0.0, float(value))
+        key = self._key(labels)
+        with self._lock:
+            counts, total, n = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, n + 1)
+
+    def _samples(self) -> list[tuple[LabelValues, list[int], float, int]]:
+        with self._lock:
+            return sorted((k, list(c), s, n) for k, (c, s, n) in self._values.items())
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for key, counts, total, n in self._samples():
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = 'le="' + _fmt_value(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels_text(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels_text(self.labelnames, key)} {_fmt_value(total)}')
+            lines.append(f'{self.name}_count{_labels_text(self.labelnames, key)} {n}')
+        return lines
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        out = []
+        for key, counts, total, n in self._samples():
+            cumulative = 0
+            buckets: dict[str, int] = {}
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                buckets[_fmt_value(bound)] = cumulative
+            out.append({
+                'labels': dict(zip(self.labelnames, key)),
+                'count': n,
+                'sum': round(total, 3),
+                'avg': round(total / n, 3) if n else 0.0,
+                'buckets': buckets,
+            })
+        return out
+
+
+class MetricsRegistry:
+    """指标注册表（线程安全）"""
+
+    def __init__(self, namespace: str = 'nebuladl'):
+        self._namespace = namespace
+        self._lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def _name(self, name: str) -> str:
+        return f'{self._namespace}_{name}' if self._namespace else name
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(self._name(name), help_text, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Iterable[str] = (),
+        callback: Optional[Callable[[], dict[LabelValues, float]]] = None,
+    ) -> Gauge:
+        return self._register(Gauge(self._name(name), help_text, labelnames, callback))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(self._name(name), help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = []
+        for m in metrics:
+            lines.extend(m.render())  # type: ignore[attr-defined]
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            m.name: {'type': m.kind, 'help': m.help, 'samples': m.snapshot()}  # type: ignore[attr-defined]
+            for m in metrics
+        }
+
+
+class EngineMetrics:
+    """下载引擎的标准指标（由各模块直接更新；需要读取调度状态的仪表由 JsApi 注册回调）"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+        self.tasks_finished = registry.counter('tasks_finished_total', '已结束的任务数（按结果）', ('status',))
+        self.downloaded_bytes = registry.counter('downloaded_bytes_total', '已下载的字节数（按站点）', ('host',))
+        self.retries = registry.counter('retries_total', '自动重试次数（按错误类型）', ('kind',))
+        self.queue_wait = registry.histogram('queue_wait_seconds', '任务从入队到开始下载的等待时间')
+        self.analyze_seconds = registry.histogram('analyze_seconds', '解析耗时（按结果）', ('result',))
+        self.ffmpeg_seconds = registry.histogram('ffmpeg_seconds', 'FFmpeg 步骤耗时（合并/转码/后处理）', ('step',))
+        self.bridge_events = registry.counter('bridge_events_total', '发送到界面的 JS 事件数（合并前）')
+        self.bridge_batches = registry.counter('bridge_batches_total', '实际执行的 evaluate_js 批次数')
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class MetricsServer:
+    """只监听 127.0.0.1 的 /metrics 端点（端口为 0 时关闭）"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self.error = ''
+
+    @property
+    def port(self) -> int:
+        server = self._server
+        return int(server.server_address[1]) if server is not None else 0
+
+    @property
+    def url(self) -> str:
+        port = self.port
+        return f'http://127.0.0.1:{port}/metrics' if port else ''
+
+    def configure(self, port: int) -> bool:
+        """按端口（重新）启动；新端口无法监听时保留原来的服务，返回 False 并记录原因。"""
+        with self._lock:
+            old = self._server
+            if old is not None and int(old.server_address[1]) == port:
+                return True
+            server: Optional[ThreadingHTTPServer] = None
+            if port > 0:
+                handler = type('MetricsHandler', (_MetricsHandler,), {'registry': self._registry})
+                try:
+                    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+                except OSError as e:
+                    self.error = str(e)
+                    return False
+                server.daemon_threads = True
+                threading.Thread(target=server.serve_forever, name='nebuladl-metrics', daemon=True).start()
+            self.error = ''
+            self._server = server
+            if old is not None:
+                old.shutdown()
+                old.server_close()
+            return True
+
+
+# 全局单例
+metrics_registry = MetricsRegistry()
+engine_metrics = EngineMetrics(metrics_registry)
+metrics_server = MetricsServer(metrics_registry)
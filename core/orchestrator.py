@@ -0,0 +1,112 @@
+"""
+NebulaDL - Orchestrator Module
+
+编排核心：一个 asyncio 事件循环线程负责下载队列、槽位分配、定时器（重试/延后/时段）
+以及 JS 事件分发。阻塞的 yt-dlp/FFmpeg 工作仍在各自的工作线程或执行器中运行，
+事件循环本身只做轻量的状态变更，排队中的任务不占用任何线程。
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Any, Hashable
+
+from .metrics import engine_metrics
+
+
+class LoopTimer:
+    """call_later 的线程安全句柄（可在任意线程取消）"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._cancelled = False
+
+    def _bind(self, handle: asyncio.TimerHandle) -> None:
+        self._handle = handle
+        if self._cancelled:
+            handle.cancel()
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        handle = self._handle
+        if handle is not None:
+            self._loop.call_soon_threadsafe(handle.cancel)
+
+
+class Orchestrator:
+    """在后台线程中运行的事件循环"""
+
+    def __init__(self, name: str = 'nebuladl-loop'):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def call_soon(self, fn: Callable[..., Any], *args: Any) -> None:
+        """在事件循环线程中执行 fn（可从任意线程调用）。"""
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def call_later(self, delay: float, fn: Callable[..., Any], *args: Any) -> LoopTimer:
+        """delay 秒后在事件循环线程中执行 fn；返回可取消的句柄。"""
+        timer = LoopTimer(self.loop)
+
+        def _arm() -> None:
+            timer._bind(self.loop.call_later(max(0.0, delay), fn, *args))
+
+        self.loop.call_soon_threadsafe(_arm)
+        return timer
+
+
+class EventFanout:
+    """
+    JS 事件合并与分发
+
+    事件先在事件循环中排队，每 FLUSH_SECONDS 合并成一段脚本执行一次。带 key 的事件
+    （如某个任务的进度）在同一批次内只保留最新一条，按最后一次发送的顺序执行。
+    脚本在单线程执行器中调用 evaluate_js，保证顺序且不阻塞事件循环。
+    """
+
+    FLUSH_SECONDS = 0.05
+
+    def __init__(self, orchestrator: Orchestrator, sink: Callable[[str], None]):
+        self._orc = orchestrator
+        self._sink = sink
+        self._pending: 'OrderedDict[Hashable, str]' = OrderedDict()
+        self._seq = 0
+        self._flush_scheduled = False
+        self._dispatcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nebuladl-js')
+
+    def post(self, js: str, key: Optional[Hashable] = None) -> None:
+        self._orc.call_soon(self._enqueue, js, key)
+
+    def _enqueue(self, js: str, key: Optional[Hashable]) -> None:
+        engine_metrics.bridge_events.inc()
+        if key is None:
+            self._seq += 1
+            key = ('_seq', self._seq)
+        self._pending.pop(key, None)
+        self._pending[key] = js
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self._orc.loop.call_later(self.FLUSH_SECONDS, self._flush)
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        if not self._pending:
+            return
+        # 每条事件单独 try：一个回调出错不影响同批次的其它事件
+        script = '\n'.join(f'try {{ {js} }} catch (e) {{ console.error(e); }}' for js in self._pending.values())
+        self._pending.clear()
+        engine_metrics.bridge_batches.inc()
+        self._dispatcher.submit(self._dispatch, script)
+
+    def _dispatch(self, script: str) -> None:
+        try:
+            self._sink(script)
+        except Exception:
+            pass
@@ -0,0 +1,101 @@
+"""
+NebulaDL - Download Planner Module
+
+下载去重索引：以 (视频键, 格式) 为键，记录排队/下载中的任务；已完成的文件由 LibraryIndex 登记。
+重复请求直接附加到已有任务的进度上；目标文件已存在且大小一致时直接跳过，
+避免粘贴重叠的批量链接时重复下载相同的数据。
+"""
+
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse, urlunparse
+
+from .library import LibraryIndex
+
+
+# 规划结果
+PLAN_NEW = 'new'          # 需要新建任务
+PLAN_ATTACH = 'attach'    # 相同任务已在队列/下载中
+PLAN_EXISTS = 'exists'    # 文件已下载且完整
+
+
+def fallback_video_key(url: str) -> str:
+    """未解析过的链接使用规范化后的 URL 作为视频键。"""
+    raw = (url or '').strip()
+    try:
+        u = urlparse(raw)
+        host = (u.hostname or '').lower()
+        if host.startswith('www.'):
+            host = host[4:]
+        if u.port:
+            host = f'{host}:{u.port}'
+        return 'url:' + urlunparse(('', host, u.path.rstrip('/'), '', u.query, ''))
+    except Exception:
+        return 'url:' + raw
+
+
+def make_video_key(extractor: str, video_id: str) -> str:
+    return f'{(extractor or "").strip().lower()}:{(video_id or "").strip()}'
+
+
+@dataclass(frozen=True)
+class PlanDecision:
+    action: str
+    task_id: Optional[str] = None
+    path: Optional[str] = None
+
+
+class DownloadPlanner:
+    """跨请求的下载去重规划器（线程安全）"""
+
+    def __init__(self, library: LibraryIndex):
+        self._lock = threading.Lock()
+        self._inflight: dict[tuple[str, str], str] = {}
+        self._task_keys: dict[str, tuple[str, str]] = {}
+        self._library = library
+
+    def plan(self, video_key: str, format_id: str, task_id: str) -> PlanDecision:
+        """为新请求做规划；返回 PLAN_NEW 时 task_id 已登记为该键的下载任务。"""
+        key = (video_key, format_id or '')
+        with self._lock:
+            existing = self._inflight.get(key)
+            if existing and existing != task_id:
+                return PlanDecision(PLAN_ATTACH, task_id=existing)
+
+            # 文件被删除/改动时 lookup 会作废该条目，重新下载
+            done = self._library.lookup(*key)
+            if done is not None:
+                return PlanDecision(PLAN_EXISTS, path=done.path)
+
+            self._inflight[key] = task_id
+            self._task_keys[task_id] = key
+            return PlanDecision(PLAN_NEW, task_id=task_id)
+
+    def release(self, task_id: str) -> None:
+        """任务失败/取消：释放其占用的键，后续请求可重新下载。"""
+        with self._lock:
+            key = self._task_keys.pop(task_id, None)
+            if key is not None and self._inflight.get(key) == task_id:
+                self._inflight.pop(key, None)
+
+    def complete(self, task_id: str, final_path: Optional[str]) -> Optional[int]:
+        """任务完成：把最终文件登记到文件索引，返回文件字节数（无法定位文件时为 None）。"""
+        path = (final_path or '').strip()
+
+        with self._lock:
+            key = self._task_keys.pop(task_id, None)
+            if key is not None and self._inflight.get(key) == task_id:
+                self._inflight.pop(key, None)
+
+        if not path or not os.path.isfile(path):
+            return None
+        if key is not None:
+            entry = self._library.add(path, video_key=key[0], format_id=key[1])
+            if entry is not None:
+                return entry.size
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return None
@@ -0,0 +1,176 @@
+"""
+NebulaDL - Metadata Prefetch Module
+
+排队任务的元数据预取：在后台提前为队列前面的任务解析页面与格式地址，
+槽位空出后任务可以直接开始传输数据。签名地址会过期，因此预取深度按各提取器
+观测到的地址有效期和任务平均耗时动态调整，只预取在过期前能够开始的任务。
+"""
+
+import re
+import time
+import calendar
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Any, Hashable
+
+
+# 签名地址中常见的过期时间参数（Unix 时间戳）
+_EXPIRY_PARAMS = ('expire', 'expires', 'expiry', 'exp', 'deadline', 'validto', 'x-expires')
+# 路径形式：/expire/1700000000/（YouTube 清单）或 token 中的 exp=1700000000
+_PATH_EXPIRY_RE = re.compile(r'/expires?/(\d{9,11})(?:/|$)')
+_TOKEN_EXPIRY_RE = re.compile(r'(?:^|[~&;])exp=(\d{9,11})')
+
+# 合理的时间戳范围：排除把其它数字参数误认为过期时间
+_MIN_TS = 1_000_000_000
+_MAX_TS = 4_000_000_000
+
+
+def _as_ts(value: str) -> Optional[float]:
+    try:
+        ts = float(value)
+    except (TypeError, ValueError):
+        return None
+    return ts if _MIN_TS <= ts <= _MAX_TS else None
+
+
+def url_expiry(url: str) -> Optional[float]:
+    """签名地址的过期时间（Unix 时间戳）；无法识别时返回 None。"""
+    if not url or not isinstance(url, str):
+        return None
+    try:
+        parsed = urllib.parse.urlparse(url)
+        query = urllib.parse.parse_qs(parsed.query)
+    except ValueError:
+        return None
+    found: list[float] = []
+    lowered = {k.lower(): v for k, v in query.items()}
+    for name in _EXPIRY_PARAMS:
+        for v in lowered.get(name) or []:
+            ts = _as_ts(v)
+            if ts is not None:
+                found.append(ts)
+    # AWS SigV4：签名时间 + 有效秒数
+    amz_date = (lowered.get('x-amz-date') or [''])[0]
+    amz_expires = (lowered.get('x-amz-expires') or [''])[0]
+    if amz_date and amz_expires.isdigit():
+        try:
+            signed = calendar.timegm(time.strptime(amz_date, '%Y%m%dT%H%M%SZ'))
+            found.append(signed + int(amz_expires))
+        except ValueError:
+            pass
+    for token_name in ('hdnts', '__token__', 'hdnea'):
+        for v in lowered.get(token_name) or []:
+            m = _TOKEN_EXPIRY_RE.search(v)
+            if m and _as_ts(m.group(1)) is not None:
+                found.append(float(m.group(1)))
+    m = _PATH_EXPIRY_RE.search(parsed.path)
+    if m and _as_ts(m.group(1)) is not None:
+        found.append(float(m.group(1)))
+    return min(found) if found else None
+
+
+def info_expiry(info: dict[str, Any]) -> Optional[float]:
+    """解析结果中最早过期的格式地址的过期时间；都无法识别时返回 None。"""
+    found: list[float] = []
+    for fmt in [info, *(info.get('formats') or [])]:
+        if not isinstance(fmt, dict):
+            continue
+        for key in ('url', 'manifest_url', 'fragment_base_url'):
+            ts = url_expiry(str(fmt.get(key) or ''))
+            if ts is not None:
+                found.append(ts)
+    return min(found) if found else None
+
+
+class MetadataPrefetcher:
+    """
+    有界线程池中的预取任务，以及预取深度的估计（线程安全）
+
+    深度 = 在地址有效期（打折后）内能开始的排队任务数
+         ≈ 有效期 × 安全系数 / 任务平均耗时 × 并发槽位数
+    """
+
+    MAX_WORKERS = 2
+    MAX_DEPTH = 8
+    DEFAULT_LIFETIME = 1800.0   # 地址中没有可识别的过期时间时
+    DEFAULT_TASK_SECONDS = 120.0
+    SAFETY = 0.5                # 只使用一半的有效期，留出排队时间估计误差
+    EMA_ALPHA = 0.3
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='nebuladl-prefetch')
+        self._lock = threading.Lock()
+        self._inflight: set[Hashable] = set()
+        self._lifetimes: dict[str, float] = {}
+        self._task_seconds = self.DEFAULT_TASK_SECONDS
+        self.completed = 0
+
+    def _ema(self, old: float, new: float) -> float:
+        return old + self.EMA_ALPHA * (new - old)
+
+    def observe_lifetime(self, extractor: str, seconds: Optional[float]) -> None:
+        """记录一次解析得到的地址有效期（None 表示地址不过期或无法识别）。"""
+        extractor = (extractor or '').lower()
+        if not extractor:
+            return
+        lifetime = self.DEFAULT_LIFETIME if seconds is None else max(0.0, float(seconds))
+        with self._lock:
+            old = self._lifetimes.get(extractor)
+            self._lifetimes[extractor] = lifetime if old is None else self._ema(old, lifetime)
+
+    def observe_task(self, seconds: float) -> None:
+        """记录一个已完成任务从开始到结束的耗时。"""
+        if seconds <= 0:
+            return
+        with self._lock:
+            self._task_seconds = self._ema(self._task_seconds, float(seconds))
+
+    def lifetime(self, extractor: str) -> float:
+        with self._lock:
+            return self._lifetimes.get((extractor or '').lower(), self.DEFAULT_LIFETIME)
+
+    def depth(self, extractor: str, slots: int) -> int:
+        """该提取器的任务在队列中最多预取到第几个位置（0 表示不预取）。"""
+        if slots <= 0:
+            return 0
+        with self._lock:
+            lifetime = self._lifetimes.get((extractor or '').lower(), self.DEFAULT_LIFETIME)
+            task_seconds = max(1.0, self._task_seconds)
+        return max(0, min(self.MAX_DEPTH, int(lifetime * self.SAFETY / task_seconds * slots)))
+
+    @property
+    def task_seconds(self) -> float:
+        with self._lock:
+            return self._task_seconds
+
+    def inflight_count(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+    def submit(self, key: Hashable, work: Callable[[], Optional[tuple[str, Optional[float]]]]) -> bool:
+        """
+        提交预取；同一 key 已在进行中时忽略
+
+        work 返回 (提取器, 地址有效秒数) 用于调整深度；返回 None 或抛出异常表示预取失败
+        （任务启动时会自行解析）。
+        """
+        with self._lock:
+            if key in self._inflight:
+                return False
+            self._inflight.add(key)
+        self._pool.submit(self._run, key, work)
+        return True
+
+    def _run(self, key: Hashable, work: Callable[[], Optional[tuple[str, Optional[float]]]]) -> None:
+        try:
+            observed = work()
+        except Exception:
+            observed = None
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
+        if observed is not None:
+            self.observe_lifetime(*observed)
+            with self._lock:
+                self.completed += 1
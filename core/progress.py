@@ -0,0 +1,195 @@
+"""
+NebulaDL - Progress Model Module
+
+整个任务的进度模型：视频流、音频流按预估大小加权，合并/转码等后处理占固定份额，
+HLS 按分片计数计算进度。吞吐量和进度速率用指数滑动平均平滑，得到单调不减的百分比
+和稳定的剩余时间。下载线程中的每次回调只做数值更新，按固定间隔才生成状态文本。
+"""
+
+import math
+import time
+import threading
+from dataclasses import dataclass
+from typing import Optional, Callable, Iterable
+
+
+REPORT_INTERVAL = 0.5   # 下载中状态的最短上报间隔（秒）
+RATE_WINDOW = 0.5       # 速率采样的最短时间窗口（秒）
+SPEED_TAU = 5.0         # 吞吐量 EMA 的时间常数（秒）
+ETA_TAU = 10.0          # 进度速率 EMA 的时间常数（秒），更长以稳定剩余时间
+
+# 后处理在整个任务中占的份额
+MERGE_WEIGHT = 0.03     # 音视频合并（流复制，很快）
+CONVERT_WEIGHT = 0.10   # 转为 MP4（可能重新编码）
+EXTRACT_AUDIO_WEIGHT = 0.05
+
+
+@dataclass
+class _Stream:
+    weight: float = 0.0        # 预估/实际字节数，0 表示未知
+    downloaded: int = 0
+    fraction: Optional[float] = None
+    seen: bool = False
+    done: bool = False
+
+
+@dataclass(frozen=True)
+class ProgressSnapshot:
+    percent: int               # -1 表示无法计算
+    speed: Optional[float]     # 字节/秒（平滑后）
+    eta: Optional[int]         # 剩余秒数
+    downloaded: int
+
+
+def _ema(old: Optional[float], new: float, dt: float, tau: float) -> float:
+    if old is None:
+        return new
+    alpha = 1.0 - math.exp(-dt / tau)
+    return old + alpha * (new - old)
+
+
+def stable_eta(seconds: float) -> int:
+    """按量级取整，避免剩余时间逐秒跳动。"""
+    s = max(0.0, seconds)
+    if s < 60:
+        return int(math.ceil(s))
+    if s < 600:
+        return int(math.ceil(s / 5) * 5)
+    if s < 3600:
+        return int(math.ceil(s / 30) * 30)
+    return int(math.ceil(s / 300) * 300)
+
+
+class ProgressModel:
+    """
+    单个任务的进度模型（线程安全：分片下载线程会并发回调）
+
+    流可以预先登记（plan），也可以在第一次回调时动态加入；未知大小的流按已知流的
+    平均大小计权。后处理份额在对应步骤完成（finish_step）前不计入，
+    全部完成前百分比最多为 99。
+    """
+
+    def __init__(self, postprocess_weight: float = 0.0, clock: Callable[[], float] = time.monotonic):
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._streams: dict[str, _Stream] = {}
+        self._base_pp = max(0.0, min(0.5, postprocess_weight))
+        self._pp_weight = self._base_pp
+        self.planned = False
+        self._bytes = 0
+        self._last_percent = -1
+        self._last_report = -REPORT_INTERVAL
+        self._rate_at: Optional[float] = None
+        self._rate_bytes = 0
+        self._rate_fraction = 0.0
+        self._speed: Optional[float] = None
+        self._fraction_rate: Optional[float] = None
+
+    def plan(self, streams: Iterable[tuple[str, int]]) -> None:
+        """登记任务包含的流：(key, 预估字节数)。多个流时加上合并的份额。"""
+        with self._lock:
+            for key, est in streams:
+                s = self._streams.setdefault(key, _Stream())
+                if est and est > 0:
+                    s.weight = float(est)
+            self.planned = True
+            self._pp_weight = self._base_pp + (MERGE_WEIGHT if len(self._streams) > 1 else 0.0)
+
+    def update(
+        self,
+        key: str,
+        downloaded: int,
+        total: int = 0,
+        fragment_index: Optional[int] = None,
+        fragment_count: Optional[int] = None,
+    ) -> bool:
+        """记录一次下载回调；返回 True 表示到了上报时间。"""
+        now = self._clock()
+        downloaded = max(0, int(downloaded or 0))
+        with self._lock:
+            s = self._streams.get(key)
+            if s is None:
+                s = self._streams[key] = _Stream()
+                if len(self._streams) > 1:
+                    self._pp_weight = self._base_pp + MERGE_WEIGHT
+            if s.seen:
+                # 重新开始下载时 downloaded 变小：只重建基线
+                if downloaded > s.downloaded:
+                    self._bytes += downloaded - s.downloaded
+            s.seen = True
+            s.downloaded = downloaded
+            if total and total > 0:
+                if not s.weight or not self.planned:
+                    s.weight = float(total)
+            # HLS/DASH 分片：分片计数比不断变化的字节估计更可靠
+            if fragment_count and fragment_index is not None and fragment_count > 0:
+                s.fraction = min(1.0, max(0.0, fragment_index / fragment_count))
+            elif total and total > 0:
+                s.fraction = min(1.0, downloaded / total)
+
+            self._sample_rates(now)
+            if now - self._last_report < REPORT_INTERVAL:
+                return False
+            self._last_report = now
+            return True
+
+    def finish_stream(self, key: str) -> None:
+        with self._lock:
+            s = self._streams.setdefault(key, _Stream())
+            s.done = True
+            s.fraction = 1.0
+
+    def finish_step(self, weight: float) -> None:
+        """一个后处理步骤完成：把它的份额计入进度。"""
+        with self._lock:
+            self._pp_weight = max(0.0, self._pp_weight - weight)
+
+    @property
+    def all_done(self) -> bool:
+        with self._lock:
+            return bool(self._streams) and all(s.done for s in self._streams.values())
+
+    def _download_fraction(self) -> Optional[float]:
+        """调用方持有 _lock。"""
+        streams = list(self._streams.values())
+        if not streams or all(s.fraction is None for s in streams):
+            return None
+        known = [s.weight for s in streams if s.weight > 0]
+        default = (sum(known) / len(known)) if known else 1.0
+        total_w = sum(s.weight or default for s in streams)
+        done_w = sum((s.weight or default) * (s.fraction or 0.0) for s in streams)
+        return done_w / total_w if total_w > 0 else None
+
+    def _overall(self) -> Optional[float]:
+        frac = self._download_fraction()
+        return None if frac is None else (1.0 - self._pp_weight) * frac
+
+    def _sample_rates(self, now: float) -> None:
+        """按时间窗口更新吞吐量和进度速率的 EMA。调用方持有 _lock。"""
+        overall = self._overall() or 0.0
+        if self._rate_at is None:
+            self._rate_at, self._rate_bytes, self._rate_fraction = now, self._bytes, overall
+            return
+        dt = now - self._rate_at
+        if dt < RATE_WINDOW:
+            return
+        self._speed = _ema(self._speed, (self._bytes - self._rate_bytes) / dt, dt, SPEED_TAU)
+        self._fraction_rate = _ema(self._fraction_rate, max(0.0, overall - self._rate_fraction) / dt, dt, ETA_TAU)
+        self._rate_at, self._rate_bytes, self._rate_fraction = now, self._bytes, overall
+
+    def snapshot(self) -> ProgressSnapshot:
+        with self._lock:
+            overall = self._overall()
+            if overall is not None:
+                finished = overall >= 1.0 and all(s.done for s in self._streams.values())
+                percent = 100 if finished else min(99, int(overall * 100))
+                self._last_percent = max(self._last_percent, percent)
+            eta = None
+            if overall is not None and self._fraction_rate and self._fraction_rate > 0:
+                eta = stable_eta((1.0 - overall) / self._fraction_rate)
+            return ProgressSnapshot(
+                percent=self._last_percent,
+                speed=self._speed,
+                eta=eta,
+                downloaded=self._bytes,
+            )
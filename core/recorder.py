@@ -0,0 +1,285 @@
+"""
+NebulaDL - Live Stream Recorder Module
+
+直播/首映录制：按时间显示进度，按 N 分钟切分输出文件（每段写完即可使用），
+FFmpeg 输出只保留在有界缓冲区中；尚未开播的首映/预约直播不占用下载槽位，
+到点后再重新排队。
+"""
+
+import os
+import time
+import threading
+import subprocess
+import platform
+from collections import deque
+from datetime import datetime
+from typing import Optional, Callable, Any
+
+import yt_dlp
+
+from .downloader import (
+    DownloadTask,
+    _friendly_yt_dlp_error,
+    _format_bytes,
+    _format_duration,
+)
+from .metrics import engine_metrics
+from .canonical import url_canonicalizer
+
+
+class LiveRecordTask(DownloadTask):
+    """直播录制任务（format_id == 'live'）"""
+
+    POLL_UPCOMING_SECONDS = 60   # 未知开播时间时的重新检查间隔
+    EARLY_START_SECONDS = 30     # 提前多久重新排队
+    LOG_TAIL_LINES = 200         # FFmpeg 日志缓冲上限
+
+    def __init__(self, *args: Any, segment_minutes: int = 30, defer_callback: Optional[Callable] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.segment_minutes = max(0, int(segment_minutes or 0))
+        self.defer_callback = defer_callback
+        self._log_tail: deque[str] = deque(maxlen=self.LOG_TAIL_LINES)
+
+    def run(self):
+        """解析直播状态：未开播则延后排队，已结束则按普通下载处理，直播中则分段录制。"""
+        try:
+            self.timeline.phase('extract')
+            ydl_opts: dict[str, Any] = {
+                'quiet': True,
+                'no_warnings': True,
+                'logger': self._CancellationLogger(self._stop_event, lambda: self._stop_reason, self.timeline),
+                'format': 'best[protocol^=m3u8]/best',
+                # Premieres raise "will begin in ..." unless we opt in to the info.
+                'ignore_no_formats_error': True,
+            }
+            if self.proxy:
+                ydl_opts['proxy'] = self.proxy
+            if self.cookiefile:
+                ydl_opts['cookiefile'] = self.cookiefile
+
+            ydl_opts_any: Any = ydl_opts
+            with yt_dlp.YoutubeDL(ydl_opts_any) as ydl:
+                info = ydl.extract_info(self.url, download=False, ie_key=url_canonicalizer.ie_key(self.url))
+
+            live_status = str(info.get('live_status') or '')
+            if live_status == 'is_upcoming':
+                self._defer_until_start(info)
+                return
+            if live_status != 'is_live' and not info.get('is_live'):
+                # 已结束的直播/首映：回放是普通的有限文件。
+                self.format_id = 'best'
+                super().run()
+                return
+
+            stream_url = info.get('url')
+            if not stream_url:
+                raise RuntimeError('未找到可录制的直播流')
+
+            self._record(info, str(stream_url))
+
+        except DownloadTask.DownloadStopped as e:
+            if self.error_callback:
+                if getattr(e, 'reason', 'cancel') == 'pause':
+                    self.error_callback(self.task_id, '暂停')
+                else:
+                    self.error_callback(self.task_id, '已取消')
+        except Exception as e:
+            self.raw_error = str(e)
+            self.timeline.log('error', str(e))
+            if self.error_callback:
+                self.error_callback(self.task_id, _friendly_yt_dlp_error('录制', str(e)))
+
+    def _defer_until_start(self, info: dict) -> None:
+        now = time.time()
+        try:
+            start = float(info.get('release_timestamp') or 0)
+        except Exception:
+            start = 0.0
+
+        if start > now + self.EARLY_START_SECONDS:
+            until = start - self.EARLY_START_SECONDS
+            when = datetime.fromtimestamp(start).strftime('%m-%d %H:%M')
+            status = f'等待开播 {when}'
+        else:
+            until = now + self.POLL_UPCOMING_SECONDS
+            status = '等待开播...'
+
+        if self.defer_callback:
+            self.defer_callback(self.task_id, until, status)
+        elif self.error_callback:
+            self.error_callback(self.task_id, '直播尚未开始')
+
+    def _output_pattern(self, info: dict) -> str:
+        title = str(info.get('title') or info.get('id') or 'live')
+        # Same character policy as yt-dlp's windowsfilenames.
+        safe = ''.join('_' if c in '<>:"/\\|?*' or ord(c) < 32 else c for c in title).strip(' .') or 'live'
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        folder = os.path.join(self.output_dir, safe) if self.create_folder else self.output_dir
+        os.makedirs(folder, exist_ok=True)
+        if self.segment_minutes > 0:
+            return os.path.join(folder, f'{safe} [live {stamp}] %03d.ts')
+        return os.path.join(folder, f'{safe} [live {stamp}].ts')
+
+    def _record(self, info: dict, stream_url: str) -> None:
+        pattern = self._output_pattern(info)
+        # 只有分段录制才有分段列表；不分段时输出文件本身就是录像
+        segment_list = pattern.replace(' %03d.ts', '.segments.txt') if self.segment_minutes > 0 else None
+
+        cmd = ['ffmpeg', '-hide_banner', '-nostats', '-loglevel', 'warning', '-progress', 'pipe:1']
+        headers = info.get('http_headers') or {}
+        if headers:
+            cmd += ['-headers', ''.join(f'{k}: {v}\r\n' for k, v in headers.items())]
+        cmd += ['-i', stream_url, '-map', '0', '-c', 'copy']
+        if segment_list:
+            cmd += [
+                '-f', 'segment',
+                '-segment_time', str(self.segment_minutes * 60),
+                '-segment_format', 'mpegts',
+                '-segment_list', segment_list,
+                '-segment_list_type', 'flat',
+                '-reset_timestamps', '1',
+            ]
+        else:
+            cmd += ['-f', 'mpegts']
+        cmd.append(pattern)
+
+        creationflags = subprocess.CREATE_NO_WINDOW if platform.system() == 'Windows' else 0
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                creationflags=creationflags,
+            )
+        except FileNotFoundError:
+            raise RuntimeError('未检测到 FFmpeg，请先安装并加入 PATH')
+
+        def _drain_stderr() -> None:
+            assert proc.stderr is not None
+            for line in proc.stderr:
+                line = line.rstrip()
+                if line:
+                    self._log_tail.append(line)
+
+        threading.Thread(target=_drain_stderr, daemon=True).start()
+
+        stopper = threading.Thread(target=self._stop_when_requested, args=(proc,), daemon=True)
+        stopper.start()
+
+        segments_done: list[str] = []
+        try:
+            self._read_progress(proc, segment_list, segments_done)
+        finally:
+            # 读取进度出错时不能让 FFmpeg 在后台继续录制
+            if proc.poll() is None and not self._stop_event.is_set():
+                self._stop_process(proc)
+        proc.wait()
+
+        if segment_list:
+            self._collect_segments(segment_list, segments_done)
+        elif os.path.isfile(pattern):
+            self._finish_segment(pattern, segments_done)
+
+        if self._stop_event.is_set():
+            raise DownloadTask.DownloadStopped(self._stop_reason)
+
+        if proc.returncode != 0 and not segments_done:
+            err_tail = '\n'.join(list(self._log_tail)[-12:]) or '未知错误'
+            raise RuntimeError(f'FFmpeg 录制失败:\n{err_tail}')
+
+        # 直播结束：最后一段在 FFmpeg 退出时才写入列表。
+        self._final_filepath = segments_done[-1] if segments_done else None
+        if self.complete_callback:
+            self.complete_callback(self.task_id, self._final_filepath)
+
+    def _stop_when_requested(self, proc: subprocess.Popen) -> None:
+        while proc.poll() is None:
+            if self._stop_event.wait(timeout=0.5):
+                self._stop_process(proc)
+                return
+
+    @staticmethod
+    def _stop_process(proc: subprocess.Popen) -> None:
+        # 'q' 让 FFmpeg 正常收尾当前分段；超时再强制结束。
+        try:
+            assert proc.stdin is not None
+            proc.stdin.write('q\n')
+            proc.stdin.flush()
+        except Exception:
+            pass
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    def _read_progress(self, proc: subprocess.Popen, segment_list: Optional[str], segments_done: list[str]) -> None:
+        assert proc.stdout is not None
+        seg_seconds = self.segment_minutes * 60
+        started = time.time()
+        last_report = 0.0
+        size = 0
+        metered = 0
+        elapsed = 0.0
+
+        for line in proc.stdout:
+            key, _, value = line.strip().partition('=')
+            if key == 'total_size':
+                try:
+                    size = int(value)
+                except ValueError:
+                    pass
+            elif key in ('out_time_us', 'out_time_ms'):
+                # Both keys are microseconds in current FFmpeg builds.
+                try:
+                    elapsed = max(elapsed, int(value) / 1_000_000)
+                except ValueError:
+                    pass
+            elif key != 'progress' or value == 'end':
+                continue
+
+            now = time.time()
+            if key != 'progress' or now - last_report < 1.0:
+                continue
+            last_report = now
+
+            if segment_list:
+                self._collect_segments(segment_list, segments_done)
+
+            recorded = elapsed or (now - started)
+            if seg_seconds > 0:
+                percent = int((recorded % seg_seconds) / seg_seconds * 100)
+                status = f'录制中 {_format_duration(int(recorded))} · 第 {len(segments_done) + 1} 段 · {_format_bytes(size)}'
+            else:
+                percent = -1
+                status = f'录制中 {_format_duration(int(recorded))} · {_format_bytes(size)}'
+            self.timeline.phase('download')
+            self.timeline.sample(size)
+            if size < metered:
+                metered = 0  # 新分段重新计数
+            if size > metered:
+                engine_metrics.downloaded_bytes.inc(size - metered, host=self.host)
+                metered = size
+            if self.progress_callback:
+                self.progress_callback(self.task_id, percent, status)
+
+    def _collect_segments(self, segment_list: str, segments_done: list[str]) -> None:
+        """读取 FFmpeg 分段列表，处理新写完的分段。"""
+        try:
+            with open(segment_list, 'r', encoding='utf-8') as f:
+                names = [n.strip() for n in f if n.strip()]
+        except OSError:
+            return
+
+        folder = os.path.dirname(segment_list)
+        for name in names[len(segments_done):]:
+            self._finish_segment(os.path.join(folder, name), segments_done)
+
+    def _finish_segment(self, path: str, segments_done: list[str]) -> None:
+        if self.convert_mp4 and os.path.isfile(path):
+            try:
+                path = self._convert_to_mp4(path)
+            except Exception as e:
+                self._log_tail.append(f'转为 MP4 失败: {e}')
+        segments_done.append(path)
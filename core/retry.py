@@ -0,0 +1,117 @@
+"""
+NebulaDL - Retry Module
+
+失败任务的自动重试策略：按 yt-dlp 原始错误信息判断是临时故障（超时、5xx、连接重置、
+限流）还是永久错误（不支持的链接、403/404、需要登录），临时故障按带抖动的指数退避
+重新排队，永久错误立即呈现给用户。
+"""
+
+import re
+import random
+from dataclasses import dataclass
+from typing import Optional
+
+
+ERROR_TRANSIENT = 'transient'
+ERROR_RATE_LIMITED = 'rate_limited'
+ERROR_PERMANENT = 'permanent'
+ERROR_UNKNOWN = 'unknown'
+
+
+_PERMANENT_PATTERNS = [
+    r'unsupported url',
+    r'is not a valid url',
+    r'http error 40[0134]\b',
+    r'\b40[134] (?:forbidden|not found|unauthorized)',
+    r'status code: 40[134]\b',
+    r'http error 410\b',
+    r'private video',
+    r'video unavailable',
+    r'this video (?:is|has been) (?:removed|deleted|unavailable)',
+    r'copyright',
+    r'not available in your country',
+    r'geo.?restrict',
+    r'\bdrm\b',
+    r'login required',
+    r'sign in',
+    r'fresh cookies',
+    r'requested format is not available',
+    r'no video formats found',
+    r'no space left on device',
+    r'permission denied',
+    r'转为 mp4',  # 下载后转换失败：重下也无济于事
+]
+
+_RATE_LIMIT_PATTERNS = [
+    r'http error 429\b',
+    r'too many requests',
+    r'rate.?limit',
+]
+
+_TRANSIENT_PATTERNS = [
+    r'timed? ?out',
+    r'temporary failure',
+    r'temporarily unavailable',
+    r'connection (?:reset|refused|aborted|broken)',
+    r'remote end closed',
+    r'network is unreachable',
+    r'name or service not known',
+    r'getaddrinfo failed',
+    r'incompleteread',
+    r'incomplete read',
+    r'unable to download (?:video data|webpage|json)',
+    r'http error 5\d\d\b',
+    r'status code: 5\d\d\b',
+    r'\b5\d\d (?:internal server error|bad gateway|service unavailable|gateway time-?out)',
+    r'ssl: (?:unexpected_eof|decryption_failed)',
+    r'eof occurred in violation of protocol',
+    r'giving up after \d+ retries',
+    r'fragment \d+ not found',
+]
+
+_PERMANENT_RE = re.compile('|'.join(_PERMANENT_PATTERNS))
+_RATE_LIMIT_RE = re.compile('|'.join(_RATE_LIMIT_PATTERNS))
+_TRANSIENT_RE = re.compile('|'.join(_TRANSIENT_PATTERNS))
+
+
+def classify_error(raw_error: str) -> str:
+    """按原始错误信息分类；永久错误优先于临时错误匹配。"""
+    low = (raw_error or '').strip().lower()
+    if not low:
+        return ERROR_PERMANENT
+    if _PERMANENT_RE.search(low):
+        return ERROR_PERMANENT
+    if _RATE_LIMIT_RE.search(low):
+        return ERROR_RATE_LIMITED
+    if _TRANSIENT_RE.search(low):
+        return ERROR_TRANSIENT
+    return ERROR_UNKNOWN
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """指数退避：第 n 次重试等待 base * 2^(n-1)（上限 cap），取其一半再加随机抖动。"""
+
+    max_attempts: int = 3
+    base_delay: float = 5.0
+    max_delay: float = 300.0
+    rate_limit_factor: float = 4.0   # 被限流时退避更久
+    unknown_attempts: int = 1        # 无法判断的错误只重试一次
+
+    def next_delay(self, attempt: int, kind: str, rng: Optional[random.Random] = None) -> Optional[float]:
+        """
+        第 attempt 次重试前的等待秒数（attempt 从 1 开始）；不应重试时返回 None。
+        """
+        if kind == ERROR_PERMANENT:
+            return None
+        limit = self.unknown_attempts if kind == ERROR_UNKNOWN else self.max_attempts
+        if attempt < 1 or attempt > min(limit, self.max_attempts):
+            return None
+
+        delay = self.base_delay * (2 ** (attempt - 1))
+        if kind == ERROR_RATE_LIMITED:
+            delay *= self.rate_limit_factor
+        delay = min(delay, self.max_delay)
+        # "equal jitter"：避免大量任务在同一时刻重新请求
+        r = rng.random() if rng is not None else random.random()
+        return delay / 2 + r * delay / 2
@@ -0,0 +1,153 @@
+"""
+NebulaDL - Download Schedule Module
+
+按时段限制下载：每条规则指定一天中的时间段（可选星期），以及该时段内的并发上限、
+带宽上限或暂停。调度器在时段边界自动应用规则；时钟可注入，便于模拟测试。
+
+规则文本每行一条，第一条匹配的规则生效：
+    01:00-07:00 slots=16
+    09:00-18:00 days=1-5 slots=2 rate=2M
+    12:00-13:00 pause
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Callable
+
+
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_rate(text: str) -> Optional[int]:
+    """'500K' / '2M' / '1.5M' -> 字节每秒；无法解析时返回 None。"""
+    m = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?(?:/s)?\s*', text or '', re.IGNORECASE)
+    if not m:
+        return None
+    return int(float(m.group(1)) * _SIZE_UNITS[m.group(2).upper()])
+
+
+def _parse_clock(text: str) -> int:
+    h, _, m = text.partition(':')
+    hh, mm = int(h), int(m or 0)
+    if not (0 <= hh <= 24 and 0 <= mm < 60) or hh * 60 + mm > 24 * 60:
+        raise ValueError(text)
+    return hh * 60 + mm
+
+
+def _parse_days(text: str) -> frozenset[int]:
+    """'1-5' / '6,7' -> 星期集合（1=周一 ... 7=周日）"""
+    days: set[int] = set()
+    for part in text.split(','):
+        a, _, b = part.partition('-')
+        lo, hi = int(a), int(b or a)
+        days.update(range(lo, hi + 1))
+    if not days or min(days) < 1 or max(days) > 7:
+        raise ValueError(text)
+    return frozenset(days)
+
+
+@dataclass(frozen=True)
+class TimeWindow:
+    """一条时段规则。start/end 为当天分钟数，end <= start 表示跨越午夜。"""
+
+    start: int
+    end: int
+    days: frozenset[int] = frozenset()
+    max_slots: Optional[int] = None
+    rate_limit: Optional[int] = None  # 字节每秒（全部任务合计）
+    paused: bool = False
+
+    def contains(self, when: datetime) -> bool:
+        minute = when.hour * 60 + when.minute
+        if self.start < self.end:
+            inside = self.start <= minute < self.end
+            day = when.isoweekday()
+        else:
+            # 跨午夜：午夜之后的部分属于前一天开始的时段
+            inside = minute >= self.start or minute < self.end
+            day = when.isoweekday() if minute >= self.start else (when - timedelta(days=1)).isoweekday()
+        return inside and (not self.days or day in self.days)
+
+
+@dataclass(frozen=True)
+class WindowLimits:
+    """当前生效的限制；window 为 None 表示不受时段限制。"""
+
+    window: Optional[TimeWindow] = None
+    max_slots: Optional[int] = None
+    rate_limit: Optional[int] = None
+    paused: bool = False
+
+
+def parse_windows(text: str) -> tuple[list[TimeWindow], list[str]]:
+    """解析规则文本，返回 (规则列表, 错误行列表)。"""
+    windows: list[TimeWindow] = []
+    errors: list[str] = []
+    for raw in (text or '').splitlines():
+        line = raw.split('#', 1)[0].strip()
+        if not line:
+            continue
+        try:
+            span, *opts = line.split()
+            a, _, b = span.partition('-')
+            kwargs: dict = {'start': _parse_clock(a) % (24 * 60), 'end': _parse_clock(b) % (24 * 60)}
+            for opt in opts:
+                key, _, value = opt.partition('=')
+                key = key.lower()
+                if key == 'pause':
+                    kwargs['paused'] = True
+                elif key == 'slots':
+                    kwargs['max_slots'] = max(0, int(value))
+                elif key == 'rate':
+                    rate = parse_rate(value)
+                    if rate is None:
+                        raise ValueError(value)
+                    kwargs['rate_limit'] = rate
+                elif key == 'days':
+                    kwargs['days'] = _parse_days(value)
+                else:
+                    raise ValueError(opt)
+            windows.append(TimeWindow(**kwargs))
+        except Exception:
+            errors.append(raw.strip())
+    return windows, errors
+
+
+class WindowPolicy:
+    """时段策略：按（可注入的）时钟求出当前限制和下一个边界。"""
+
+    def __init__(self, windows: list[TimeWindow], clock: Callable[[], float] = time.time):
+        self.windows = list(windows)
+        self.clock = clock
+
+    @classmethod
+    def from_text(cls, text: str, clock: Callable[[], float] = time.time) -> 'WindowPolicy':
+        windows, _errors = parse_windows(text)
+        return cls(windows, clock=clock)
+
+    def _now(self, now: Optional[float]) -> datetime:
+        return datetime.fromtimestamp(self.clock() if now is None else now)
+
+    def limits(self, now: Optional[float] = None) -> WindowLimits:
+        when = self._now(now)
+        for w in self.windows:
+            if w.contains(when):
+                return WindowLimits(window=w, max_slots=w.max_slots, rate_limit=w.rate_limit, paused=w.paused)
+        return WindowLimits()
+
+    def seconds_to_boundary(self, now: Optional[float] = None, horizon: int = 3600) -> float:
+        """距离下一次限制变化的秒数（最多 horizon 秒）。"""
+        if not self.windows:
+            return float(horizon)
+        ts = self.clock() if now is None else now
+        current = self.limits(ts)
+        when = self._now(ts)
+        # 规则以分钟为粒度：逐分钟向前查找即可
+        base = when.replace(second=0, microsecond=0)
+        for step in range(1, horizon // 60 + 1):
+            probe = base + timedelta(minutes=step)
+            if self.limits(probe.timestamp()) != current:
+                return max(0.0, probe.timestamp() - ts)
+        return float(horizon)
@@ -0,0 +1,205 @@
+"""
+NebulaDL - Scratch Directory Module
+
+下载暂存目录：分片、.part、合并中间文件和转码输出都写在快速的本地目录
+（SSD/tmpfs）中，每个任务一个子目录；完成后再移动到下载目录。同一卷上直接重命名，
+跨卷时流式复制并校验后再替换，启动时清理上次遗留的暂存数据。下载目录中已有的同名文件
+不会被覆盖，新文件改用带序号的文件名。
+"""
+
+import os
+import time
+import shutil
+import hashlib
+import threading
+from typing import Optional
+
+
+SCRATCH_SUBDIR = 'nebuladl-scratch'
+COPY_CHUNK = 1024 * 1024
+# yt-dlp 下载中/合并中的临时文件，不移动到下载目录
+TEMP_SUFFIXES = ('.part', '.ytdl', '.temp', '.tmp')
+
+
+def _same_volume(src: str, dst_dir: str) -> bool:
+    try:
+        return os.stat(src).st_dev == os.stat(dst_dir).st_dev
+    except OSError:
+        return False
+
+
+def _digest_file(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(COPY_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def move_file(src: str, dst: str) -> str:
+    """
+    把 src 移动到 dst（已存在则覆盖）
+
+    同一卷：原子重命名。跨卷：边复制边计算哈希写入 dst 旁的临时文件，落盘后重新读取校验，
+    一致才替换为 dst 并删除 src；校验失败时保留 src 并抛出异常。
+    """
+    dst_dir = os.path.dirname(dst) or '.'
+    os.makedirs(dst_dir, exist_ok=True)
+    if _same_volume(src, dst_dir):
+        os.replace(src, dst)
+        return dst
+
+    tmp = dst + '.nebula-copy'
+    h = hashlib.blake2b(digest_size=16)
+    size = 0
+    try:
+        with open(src, 'rb') as fin, open(tmp, 'wb') as fout:
+            while True:
+                chunk = fin.read(COPY_CHUNK)
+                if not chunk:
+                    break
+                h.update(chunk)
+                fout.write(chunk)
+                size += len(chunk)
+            fout.flush()
+            os.fsync(fout.fileno())
+        if os.path.getsize(tmp) != size or _digest_file(tmp) != h.hexdigest():
+            raise OSError(f'复制校验失败：{os.path.basename(src)}')
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    os.remove(src)
+    return dst
+
+
+def _with_suffix(rel: str, index: int) -> str:
+    """'a/b.mp4' -> 'a/b-1.mp4'（index 为 0 时原样返回）"""
+    if not index:
+        return rel
+    root, ext = os.path.splitext(rel)
+    return f'{root}-{index}{ext}'
+
+
+def publish(scratch_dir: str, output_dir: str, final_path: Optional[str]) -> Optional[str]:
+    """
+    把任务暂存目录中已完成的文件按相对路径移动到下载目录
+
+    不覆盖下载目录中已有的文件：有同名文件时整批文件改用同一个空闲的 -1、-2 ... 后缀
+    （与转为 MP4 时的命名方式相同），主文件与同名封面保持配对。
+
+    Returns:
+        final_path 在下载目录中对应的新路径（final_path 不在暂存目录中时原样返回）
+    """
+    scratch_dir = os.path.abspath(scratch_dir)
+    final_abs = os.path.abspath(final_path) if final_path else ''
+    moved_final: Optional[str] = final_path
+
+    # 主文件最后移动：中途失败时下载目录中不会出现缺少封面等附属文件的“完成品”
+    files: list[str] = []
+    for dirpath, _dirnames, filenames in os.walk(scratch_dir):
+        for name in filenames:
+            if name.lower().endswith(TEMP_SUFFIXES):
+                continue
+            files.append(os.path.join(dirpath, name))
+    files.sort(key=lambda p: os.path.normcase(p) == os.path.normcase(final_abs))
+
+    rels = [os.path.relpath(src, scratch_dir) for src in files]
+    index = 0
+    while any(os.path.exists(os.path.join(output_dir, _with_suffix(rel, index))) for rel in rels):
+        index += 1
+
+    for src, rel in zip(files, rels):
+        dst = move_file(src, os.path.join(output_dir, _with_suffix(rel, index)))
+        if os.path.normcase(src) == os.path.normcase(final_abs):
+            moved_final = dst
+    return moved_final
+
+
+def _latest_mtime(path: str) -> float:
+    try:
+        latest = os.stat(path).st_mtime
+    except OSError:
+        return float('inf')
+    for dirpath, _dirnames, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                latest = max(latest, os.stat(os.path.join(dirpath, name)).st_mtime)
+            except OSError:
+                pass
+    return latest
+
+
+class ScratchSpace:
+    """暂存根目录管理（每个任务一个子目录）"""
+
+    GC_MIN_AGE_SECONDS = 300  # 最近仍在修改的目录可能属于另一个正在运行的实例
+
+    def __init__(self, root: str = ''):
+        self._lock = threading.Lock()
+        self._root = ''
+        self.configure(root)
+
+    def configure(self, root: str) -> None:
+        root = (root or '').strip()
+        with self._lock:
+            self._root = os.path.join(os.path.abspath(root), SCRATCH_SUBDIR) if root else ''
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._root)
+
+    @property
+    def root(self) -> str:
+        return self._root
+
+    def task_dir(self, task_id: str) -> Optional[str]:
+        """任务的暂存目录；未配置或无法创建时返回 None（直接写入下载目录）。"""
+        root = self._root
+        if not root:
+            return None
+        path = os.path.join(root, task_id)
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError:
+            return None
+        return path
+
+    def discard(self, task_id: str) -> None:
+        root = self._root
+        if root and task_id:
+            shutil.rmtree(os.path.join(root, task_id), ignore_errors=True)
+
+    def collect_garbage(self, keep: frozenset[str] = frozenset()) -> int:
+        """删除遗留的任务暂存目录（不在 keep 中且近期未修改），返回删除数量。"""
+        root = self._root
+        if not root or not os.path.isdir(root):
+            return 0
+        removed = 0
+        cutoff = time.time() - self.GC_MIN_AGE_SECONDS
+        for entry in os.scandir(root):
+            if entry.name in keep:
+                continue
+            # 写入已有的 .part 不会更新目录 mtime：取目录内最新的文件时间
+            if _latest_mtime(entry.path) > cutoff:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+            removed += 1
+        return removed
+
+
+# 全局单例
+scratch_space = ScratchSpace()
@@ -0,0 +1,239 @@
+"""
+NebulaDL - Settings Store Module
+
+设置以不可变快照（copy-on-write）的形式保存：读取方直接访问 `store.current` 的属性，无需加锁；
+写入时生成新快照并整体替换，随后向订阅者分发变更事件。
+落盘采用防抖 + 临时文件原子替换，避免界面连续修改时在桥接线程上反复同步写文件。
+"""
+
+import os
+import json
+import atexit
+import tempfile
+import threading
+from dataclasses import dataclass, field, fields, replace
+from typing import Optional, Any, Callable, Iterable
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    """写入临时文件后 os.replace，保证文件要么是旧内容要么是完整的新内容。"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+        raise
+
+
+class DebouncedJsonWriter:
+    """合并短时间内的多次写入，只落盘最后一次的数据。"""
+
+    def __init__(self, path: str, delay: float = 0.5):
+        self.path = path
+        self._delay = float(delay)
+        self._lock = threading.Lock()
+        self._pending: Optional[Callable[[], Any]] = None
+        self._timer: Optional[threading.Timer] = None
+        atexit.register(self.flush)
+
+    def schedule(self, snapshot: Callable[[], Any]) -> None:
+        """登记一次写入；snapshot 在真正落盘时才调用，以拿到最新数据。"""
+        with self._lock:
+            self._pending = snapshot
+            if self._timer is not None:
+                self._timer.cancel()
+            if self._delay <= 0:
+                self._timer = None
+            else:
+                self._timer = threading.Timer(self._delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+                return
+        self.flush()
+
+    def flush(self) -> None:
+        """立即写入尚未落盘的数据。"""
+        with self._lock:
+            snapshot = self._pending
+            self._pending = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if snapshot is None:
+                return
+            try:
+                write_json_atomic(self.path, snapshot())
+            except Exception:
+                # 设置保存失败不应影响主流程
+                pass
+
+
+def _as_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    # 兼容前端传 0/1 或 "true"/"false"
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _as_int(value: Any, default: int, lo: int, hi: int) -> int:
+    try:
+        v = int(value)
+    except Exception:
+        v = default
+    return max(lo, min(hi, v))
+
+
+@dataclass(frozen=True)
+class Settings:
+    """设置快照（不可变）。未识别的键原样保存在 extra 中，保证向前兼容。"""
+
+    download_path: str = ''
+    proxy: str = ''
+    threads: int = 1  # 并发数（1-16）
+    create_folder: bool = False
+    convert_mp4: bool = False
+    preallocate: bool = False  # 为大文件预分配磁盘空间
+    scratch_dir: str = ''  # 下载暂存目录（留空则直接写入下载目录）
+    cookie_browser_db: str = ''
+    live_segment_minutes: int = 30  # 直播录制分段时长（0 表示不分段）
+    schedule_windows: str = ''  # 时段规则文本（见 core/schedule.py）
+    bandwidth_limit: str = ''  # 全局带宽上限，如 '2M'（留空不限）
+    retry_attempts: int = 3  # 临时故障自动重试次数（0 表示不自动重试）
+    metrics_port: int = 0  # 本机 Prometheus 指标端口（0 表示关闭）
+    extra: dict[str, Any] = field(default_factory=dict, compare=False)
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], base: Optional['Settings'] = None) -> 'Settings':
+        """从字典构建快照：类型统一在这里转换一次，热路径上直接读属性。"""
+        cur = base or cls()
+        known = {f.name for f in fields(cls)} - {'extra'}
+        values: dict[str, Any] = {}
+        extra = dict(cur.extra)
+
+        for key, raw in data.items():
+            if key not in known:
+                extra[key] = raw
+                continue
+            if raw is None:
+                continue
+            if key == 'threads':
+                values[key] = _as_int(raw, cur.threads, 1, 16)
+            elif key == 'live_segment_minutes':
+                values[key] = _as_int(raw, cur.live_segment_minutes, 0, 720)
+            elif key == 'retry_attempts':
+                values[key] = _as_int(raw, cur.retry_attempts, 0, 10)
+            elif key == 'metrics_port':
+                values[key] = _as_int(raw, cur.metrics_port, 0, 65535)
+            elif key in ('create_folder', 'convert_mp4', 'preallocate'):
+                values[key] = _as_bool(raw)
+            elif key == 'schedule_windows':
+                values[key] = str(raw).replace('\r\n', '\n').strip()
+            else:
+                values[key] = str(raw).strip()
+
+        return replace(cur, extra=extra, **values)
+
+    def to_dict(self) -> dict[str, Any]:
+        data = dict(self.extra)
+        for f in fields(self):
+            if f.name != 'extra':
+                data[f.name] = getattr(self, f.name)
+        return data
+
+
+@dataclass(frozen=True)
+class SettingsChange:
+    """设置变更事件"""
+
+    keys: frozenset[str]
+    old: Settings
+    new: Settings
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.keys
+
+
+class SettingsStore:
+    """设置存储：快照读取无锁，写入防抖 + 原子落盘，并通知订阅者"""
+
+    SETTINGS_FILE = os.path.join(os.path.expanduser('~'), '.nebuladl_settings.json')
+    DEBOUNCE_SECONDS = 0.5
+
+    def __init__(self, path: Optional[str] = None, debounce: float = DEBOUNCE_SECONDS):
+        self._path = path or self.SETTINGS_FILE
+        self._lock = threading.Lock()
+        self._subscribers: list[tuple[Optional[frozenset[str]], Callable[[SettingsChange], None]]] = []
+        self._writer = DebouncedJsonWriter(self._path, delay=debounce)
+        self.current: Settings = Settings.from_dict(self._load())
+
+    def _load(self) -> dict[str, Any]:
+        """从用户目录加载设置"""
+        try:
+            if os.path.exists(self._path):
+                with open(self._path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                    if isinstance(data, dict):
+                        return data
+        except Exception:
+            pass
+        return {}
+
+    def update(self, **changes: Any) -> Optional[SettingsChange]:
+        """应用变更并安排落盘；没有实际变化时返回 None。"""
+        with self._lock:
+            old = self.current
+            new = Settings.from_dict(changes, base=old)
+            old_d, new_d = old.to_dict(), new.to_dict()
+            keys = frozenset(k for k in new_d if old_d.get(k) != new_d.get(k))
+            if not keys:
+                return None
+            self.current = new
+            subscribers = list(self._subscribers)
+
+        self._writer.schedule(lambda: self.current.to_dict())
+
+        event = SettingsChange(keys=keys, old=old, new=new)
+        for wanted, callback in subscribers:
+            if wanted is not None and not (wanted & keys):
+                continue
+            try:
+                callback(event)
+            except Exception:
+                pass
+        return event
+
+    def subscribe(
+        self,
+        callback: Callable[[SettingsChange], None],
+        keys: Optional[Iterable[str]] = None,
+    ) -> Callable[[], None]:
+        """订阅设置变更；keys 为空表示订阅全部。返回取消订阅函数。"""
+        entry = (frozenset(keys) if keys is not None else None, callback)
+        with self._lock:
+            self._subscribers.append(entry)
+
+        def _unsubscribe() -> None:
+            with self._lock:
+                try:
+                    self._subscribers.remove(entry)
+                except ValueError:
+                    pass
+
+        return _unsubscribe
+
+    def flush(self) -> None:
+        """立即写入待保存的设置"""
+        self._writer.flush()
+
+
+# 全局单例
+settings_store = SettingsStore()
@@ -0,0 +1,251 @@
+"""
+NebulaDL - Subscriptions Module
+
+频道/播放列表订阅：保存订阅链接，每个订阅维护一份已下载视频 ID 的存档
+（与 yt-dlp download-archive 相同的 "extractor id" 行格式，加载后以集合索引）。
+同步时惰性枚举条目（新视频在前），连续遇到已存档的 ID 即停止，只返回新条目。
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+from dataclasses import dataclass, asdict, fields, replace
+from typing import Optional, Any, Callable
+
+import yt_dlp
+
+from .settings import DebouncedJsonWriter
+from .canonical import url_canonicalizer
+
+
+@dataclass(frozen=True)
+class Subscription:
+    id: str
+    url: str
+    title: str = ''
+    format_id: str = 'best'
+    created: float = 0.0
+    last_sync: float = 0.0
+    last_new: int = 0
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> Optional['Subscription']:
+        known = {f.name for f in fields(cls)}
+        try:
+            sub = cls(**{k: v for k, v in data.items() if k in known})
+        except TypeError:
+            return None
+        return sub if sub.id and sub.url else None
+
+
+@dataclass(frozen=True)
+class SyncEntry:
+    url: str
+    archive_key: str   # "extractor id"
+    extractor: str
+    video_id: str
+    title: str = ''
+
+
+class SubscriptionStore:
+    """订阅列表与每个订阅的下载存档（线程安全）"""
+
+    SUBSCRIPTIONS_FILE = os.path.join(os.path.expanduser('~'), '.nebuladl_subscriptions.json')
+    ARCHIVE_DIR = os.path.join(os.path.expanduser('~'), '.nebuladl_archive')
+    STOP_AFTER_KNOWN = 3  # 连续遇到多少个已存档条目后停止枚举（容忍置顶/顺序微调）
+
+    def __init__(self, path: Optional[str] = None, archive_dir: Optional[str] = None):
+        self._path = path or self.SUBSCRIPTIONS_FILE
+        self._archive_dir = archive_dir or self.ARCHIVE_DIR
+        self._lock = threading.Lock()
+        self._subs: dict[str, Subscription] = {}
+        self._archives: dict[str, set[str]] = {}
+        self._writer = DebouncedJsonWriter(self._path)
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            if os.path.exists(self._path):
+                with open(self._path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if isinstance(data, list):
+                    for raw in data:
+                        sub = Subscription.from_dict(raw) if isinstance(raw, dict) else None
+                        if sub is not None:
+                            self._subs[sub.id] = sub
+        except Exception:
+            self._subs = {}
+
+    def _save(self) -> None:
+        self._writer.schedule(lambda: [asdict(s) for s in self.list_all()])
+
+    def _archive_path(self, sub_id: str) -> str:
+        return os.path.join(self._archive_dir, f'{sub_id}.txt')
+
+    def _archive(self, sub_id: str) -> set[str]:
+        """按需加载存档为集合（调用方持有 _lock）。"""
+        archive = self._archives.get(sub_id)
+        if archive is None:
+            archive = set()
+            try:
+                with open(self._archive_path(sub_id), 'r', encoding='utf-8') as f:
+                    archive.update(line.strip() for line in f if line.strip())
+            except OSError:
+                pass
+            self._archives[sub_id] = archive
+        return archive
+
+    # --- 订阅管理 ---
+    def list_all(self) -> list[Subscription]:
+        with self._lock:
+            return sorted(self._subs.values(), key=lambda s: s.created)
+
+    def get(self, sub_id: str) -> Optional[Subscription]:
+        with self._lock:
+            return self._subs.get(sub_id)
+
+    def add(self, url: str, format_id: str = 'best', title: str = '') -> Subscription:
+        url = (url or '').strip()
+        key = url_canonicalizer.video_key(url)
+        with self._lock:
+            for sub in self._subs.values():
+                if url_canonicalizer.video_key(sub.url) == key:
+                    return sub
+            sub = Subscription(id=uuid.uuid4().hex[:12], url=url, title=title,
+                               format_id=format_id or 'best', created=time.time())
+            self._subs[sub.id] = sub
+        self._save()
+        return sub
+
+    def remove(self, sub_id: str) -> bool:
+        with self._lock:
+            if self._subs.pop(sub_id, None) is None:
+                return False
+            self._archives.pop(sub_id, None)
+        try:
+            os.remove(self._archive_path(sub_id))
+        except OSError:
+            pass
+        self._save()
+        return True
+
+    def update(self, sub_id: str, **changes: Any) -> Optional[Subscription]:
+        with self._lock:
+            sub = self._subs.get(sub_id)
+            if sub is None:
+                return None
+            sub = replace(sub, **changes)
+            self._subs[sub_id] = sub
+        self._save()
+        return sub
+
+    # --- 存档 ---
+    def is_archived(self, sub_id: str, archive_key: str) -> bool:
+        with self._lock:
+            return archive_key in self._archive(sub_id)
+
+    def mark_done(self, sub_id: str, archive_key: str) -> None:
+        """条目下载完成后写入存档（追加一行，不重写整个文件）。"""
+        with self._lock:
+            if sub_id not in self._subs:
+                return
+            archive = self._archive(sub_id)
+            if archive_key in archive:
+                return
+            archive.add(archive_key)
+            try:
+                os.makedirs(self._archive_dir, exist_ok=True)
+                with open(self._archive_path(sub_id), 'a', encoding='utf-8') as f:
+                    f.write(archive_key + '\n')
+            except OSError:
+                pass
+
+    def archive_size(self, sub_id: str) -> int:
+        with self._lock:
+            return len(self._archive(sub_id))
+
+    # --- 同步 ---
+    def find_new_entries(
+        self,
+        sub: Subscription,
+        proxy: Optional[str] = None,
+        cookiefile: Optional[str] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> tuple[str, list[SyncEntry]]:
+        """
+        惰性枚举订阅中的条目，返回 (订阅标题, 新条目列表)
+
+        频道上传列表新视频在前：连续 STOP_AFTER_KNOWN 个条目已存档即停止，
+        后续页面不会被请求。
+        """
+        ydl_opts: dict[str, Any] = {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': 'in_playlist',
+            'lazy_playlist': True,
+            'socket_timeout': 30,
+        }
+        if proxy:
+            ydl_opts['proxy'] = proxy
+        if cookiefile:
+            ydl_opts['cookiefile'] = cookiefile
+
+        new_entries: list[SyncEntry] = []
+        seen: set[str] = set()
+        known_run = 0
+
+        ydl_opts_any: Any = ydl_opts
+        with yt_dlp.YoutubeDL(ydl_opts_any) as ydl:
+            # process=False 保留 entries 为惰性迭代器，按需翻页
+            info = ydl.extract_info(sub.url, download=False, process=False, ie_key=url_canonicalizer.ie_key(sub.url)) or {}
+            for _ in range(3):
+                # 频道主页等会先重定向到具体列表页
+                if info.get('_type') not in ('url', 'url_transparent') or not info.get('url'):
+                    break
+                info = ydl.extract_info(info['url'], download=False, process=False, ie_key=info.get('ie_key')) or {}
+            title = str(info.get('title') or info.get('uploader') or '')
+            default_ie = str(info.get('ie_key') or info.get('extractor_key') or '')
+
+            for entry in info.get('entries') or []:
+                if should_stop and should_stop():
+                    break
+                if not isinstance(entry, dict):
+                    continue
+                if entry.get('_type') == 'playlist':
+                    # 频道首页的子列表（视频/短视频/直播）不展开，应订阅具体的标签页
+                    continue
+
+                video_id = str(entry.get('id') or '').strip()
+                if not video_id:
+                    continue
+                extractor = str(entry.get('ie_key') or default_ie).strip().lower()
+                archive_key = f'{extractor} {video_id}'
+                if archive_key in seen:
+                    continue
+                seen.add(archive_key)
+
+                if self.is_archived(sub.id, archive_key):
+                    known_run += 1
+                    if known_run >= self.STOP_AFTER_KNOWN:
+                        break
+                    continue
+                known_run = 0
+
+                url = str(entry.get('url') or entry.get('webpage_url') or '').strip()
+                if not url:
+                    continue
+                new_entries.append(SyncEntry(
+                    url=url,
+                    archive_key=archive_key,
+                    extractor=extractor,
+                    video_id=video_id,
+                    title=str(entry.get('title') or ''),
+                ))
+
+        return title, new_entries
+
+
+# 全局单例
+subscription_store = SubscriptionStore()
@@ -0,0 +1,283 @@
+"""
+NebulaDL - Thumbnail Module
+
+封面缩略图服务：远程封面只下载一次，按内容哈希存入磁盘缓存（统一为 JPG）。
+有 Pillow 时在进程内转码/缩放，否则 JPG 原样保存、其它格式交给一次 FFmpeg 调用。
+界面通过本机回环 HTTP 服务加载缩放后的预览图，下载任务直接从缓存导出封面文件，
+不再为每个任务单独启动 FFmpeg。
+"""
+
+import io
+import os
+import json
+import shutil
+import hashlib
+import threading
+import subprocess
+import platform
+import urllib.parse
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Any
+
+from .settings import DebouncedJsonWriter
+
+try:
+    from PIL import Image  # type: ignore
+except Exception:  # pragma: no cover
+    Image = None
+
+
+FETCH_TIMEOUT = 20
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+PREVIEW_WIDTHS = (128, 320, 480, 720)
+CARD_PREVIEW_WIDTH = 480     # 解析结果卡片
+HISTORY_PREVIEW_WIDTH = 128  # 历史列表
+_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:20]
+
+
+def _is_jpeg(data: bytes) -> bool:
+    return data[:3] == b'\xff\xd8\xff'
+
+
+def _to_jpeg(data: bytes) -> Optional[bytes]:
+    """任意图片格式 -> JPG：Pillow 进程内转换，否则调用一次 FFmpeg（stdin/stdout 管道）。"""
+    if _is_jpeg(data):
+        return data
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as im:
+                out = io.BytesIO()
+                im.convert('RGB').save(out, 'JPEG', quality=90)
+                return out.getvalue()
+        except Exception:
+            pass
+    creationflags = subprocess.CREATE_NO_WINDOW if platform.system() == 'Windows' else 0
+    try:
+        proc = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', '-frames:v', '1',
+             '-f', 'image2', '-c:v', 'mjpeg', '-q:v', '3', 'pipe:1'],
+            input=data,
+            capture_output=True,
+            timeout=30,
+            creationflags=creationflags,
+        )
+    except Exception:
+        return None
+    return proc.stdout if proc.returncode == 0 and _is_jpeg(proc.stdout) else None
+
+
+class ThumbnailCache:
+    """按内容哈希寻址的封面缓存（线程安全）"""
+
+    CACHE_DIR = os.path.join(os.path.expanduser('~'), '.nebuladl_thumbs')
+
+    def __init__(self, root: Optional[str] = None):
+        self._root = root or self.CACHE_DIR
+        self._lock = threading.Lock()
+        self._index: dict[str, str] = {}      # url_key -> content hash
+        self._urls: dict[str, str] = {}       # url_key -> url（只允许获取登记过的地址）
+        self._inflight: dict[str, threading.Event] = {}
+        self._index_path = os.path.join(self._root, 'index.json')
+        self._writer = DebouncedJsonWriter(self._index_path, delay=1.0)
+        self.proxy: Optional[str] = None
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._index = {str(k): str(v) for k, v in data.items()}
+        except Exception:
+            self._index = {}
+
+    def _blob_path(self, digest: str, width: int = 0) -> str:
+        name = f'{digest}_w{width}.jpg' if width else f'{digest}.jpg'
+        return os.path.join(self._root, digest[:2], name)
+
+    def register(self, url: str) -> str:
+        """登记一个远程封面地址，返回其 key（本地服务只接受登记过的 key）。"""
+        key = _url_key(url)
+        with self._lock:
+            self._urls[key] = url
+        return key
+
+    def _fetch(self, url: str) -> Optional[bytes]:
+        handlers: list[Any] = []
+        if self.proxy:
+            handlers.append(urllib.request.ProxyHandler({'http': self.proxy, 'https': self.proxy}))
+        opener = urllib.request.build_opener(*handlers)
+        req = urllib.request.Request(url, headers={'User-Agent': _USER_AGENT})
+        try:
+            with opener.open(req, timeout=FETCH_TIMEOUT) as resp:
+                data = resp.read(MAX_IMAGE_BYTES + 1)
+        except Exception:
+            return None
+        return data if data and len(data) <= MAX_IMAGE_BYTES else None
+
+    def get(self, url: str) -> Optional[str]:
+        """返回封面 JPG 的本地路径；首次使用时下载并转码，同一地址的并发请求只下载一次。"""
+        if not url or not url.startswith(('http://', 'https://')):
+            return None
+        key = self.register(url)
+        while True:
+            with self._lock:
+                digest = self._index.get(key)
+                if digest and os.path.isfile(self._blob_path(digest)):
+                    return self._blob_path(digest)
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    self._inflight[key] = threading.Event()
+                    break
+            waiter.wait(timeout=FETCH_TIMEOUT * 2)
+
+        path: Optional[str] = None
+        try:
+            raw = self._fetch(url)
+            jpg = _to_jpeg(raw) if raw else None
+            if jpg:
+                digest = hashlib.sha256(jpg).hexdigest()
+                path = self._blob_path(digest)
+                if not os.path.isfile(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp = path + '.tmp'
+                    with open(tmp, 'wb') as f:
+                        f.write(jpg)
+                    os.replace(tmp, path)
+                with self._lock:
+                    self._index[key] = digest
+                self._writer.schedule(lambda: dict(self._index))
+        except OSError:
+            path = None
+        finally:
+            with self._lock:
+                event = self._inflight.pop(key, None)
+            if event is not None:
+                event.set()
+        return path
+
+    def get_by_key(self, key: str) -> Optional[str]:
+        with self._lock:
+            url = self._urls.get(key)
+            digest = self._index.get(key)
+        if digest and os.path.isfile(self._blob_path(digest)):
+            return self._blob_path(digest)
+        return self.get(url) if url else None
+
+    def preview(self, path: str, width: int) -> str:
+        """按宽度缩放的预览图（缓存）；没有 Pillow 时返回原图。"""
+        if Image is None or width <= 0:
+            return path
+        digest = os.path.splitext(os.path.basename(path))[0]
+        out = self._blob_path(digest, width)
+        if os.path.isfile(out):
+            return out
+        try:
+            with Image.open(path) as im:
+                if im.width <= width:
+                    return path
+                height = max(1, round(im.height * width / im.width))
+                resized = im.convert('RGB').resize((width, height), Image.LANCZOS)
+                tmp = out + '.tmp'
+                resized.save(tmp, 'JPEG', quality=85)
+                os.replace(tmp, out)
+            return out
+        except Exception:
+            return path
+
+    def export(self, url: str, dest: str) -> Optional[str]:
+        """把封面写到 dest（下载任务的封面文件）；失败返回 None。"""
+        src = self.get(url)
+        if not src:
+            return None
+        try:
+            os.makedirs(os.path.dirname(dest) or '.', exist_ok=True)
+            shutil.copyfile(src, dest)
+        except OSError:
+            return None
+        return dest
+
+
+class _ThumbHandler(BaseHTTPRequestHandler):
+    cache: ThumbnailCache
+
+    def do_GET(self) -> None:  # noqa: N802
+        parsed = urllib.parse.urlparse(self.path)
+        parts = parsed.path.strip('/').split('/')
+        if len(parts) != 2 or parts[0] != 't':
+            self.send_error(404)
+            return
+        query = urllib.parse.parse_qs(parsed.query)
+        try:
+            width = int((query.get('w') or ['0'])[0])
+        except ValueError:
+            width = 0
+        # 只允许固定的几档宽度，避免缓存被任意尺寸撑大
+        width = min((w for w in PREVIEW_WIDTHS if w >= width), default=0) if width > 0 else 0
+
+        path = self.cache.get_by_key(parts[1])
+        if not path:
+            self.send_error(404)
+            return
+        if width:
+            path = self.cache.preview(path, width)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(data)))
+        # 内容按哈希寻址，可长期缓存
+        self.send_header('Cache-Control', 'max-age=31536000, immutable')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class ThumbnailServer:
+    """只监听 127.0.0.1 的封面服务（按需启动）"""
+
+    def __init__(self, cache: ThumbnailCache):
+        self._cache = cache
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def _ensure_started(self) -> Optional[ThreadingHTTPServer]:
+        with self._lock:
+            if self._server is None:
+                handler = type('ThumbHandler', (_ThumbHandler,), {'cache': self._cache})
+                try:
+                    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+                except OSError:
+                    return None
+                server.daemon_threads = True
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                self._server = server
+            return self._server
+
+    def url_for(self, remote_url: str, width: int = 0) -> str:
+        """远程封面地址 -> 本地预览地址；服务不可用时返回原地址。"""
+        if not remote_url or not remote_url.startswith(('http://', 'https://')):
+            return remote_url or ''
+        server = self._ensure_started()
+        if server is None:
+            return remote_url
+        key = self._cache.register(remote_url)
+        port = server.server_address[1]
+        suffix = f'?w={int(width)}' if width else ''
+        return f'http://127.0.0.1:{port}/t/{key}{suffix}'
+
+
+# 全局单例
+thumbnail_cache = ThumbnailCache()
+thumbnail_server = ThumbnailServer(thumbnail_cache)
@@ -0,0 +1,266 @@
+"""
+NebulaDL - Task Timeline Module
+
+每个下载任务的结构化事件时间线：阶段切换（排队、解析、下载、合并、转码、移动）、
+字节数与速度采样、重试、FFmpeg 耗时以及 yt-dlp 的警告/错误。事件保存在有界环形缓冲区中，
+任务结束后与下载历史一起持久化，事后可以从界面或诊断信息中查看慢任务把时间花在了哪里。
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque, OrderedDict
+from typing import Optional, Any
+
+from .settings import DebouncedJsonWriter
+
+
+MAX_EVENTS = 256          # 每个任务保留的事件数（超出后丢弃最早的事件，阶段耗时不受影响）
+SAMPLE_INTERVAL = 2.0     # 速度采样间隔（秒）
+MAX_MESSAGE_CHARS = 300
+
+PHASE_LABELS = {
+    'queued': '排队',
+    'starting': '启动',
+    'extract': '解析',
+    'download': '下载',
+    'audio': '共享音轨',
+    'postprocess': '后处理',
+    'merge': '合并',
+    'convert': '转码',
+    'thumbnail': '封面',
+    'publish': '移动文件',
+    'waiting': '等待重试/时段',
+    'paused': '暂停',
+}
+
+EVENT_LABELS = {
+    'phase': '阶段',
+    'sample': '采样',
+    'file': '文件完成',
+    'retry': '重试',
+    'ffmpeg': 'FFmpeg',
+    'log': '日志',
+    'disk_wait': '等待磁盘空间',
+    'end': '结束',
+}
+
+
+class TaskTimeline:
+    """单个任务的事件时间线（线程安全）"""
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self._lock = threading.Lock()
+        self._created = time.time()
+        self._t0 = time.monotonic()
+        self._events: deque[dict[str, Any]] = deque(maxlen=max_events)
+        self._dropped = 0
+        self._phase = ''
+        self._phase_at = 0.0
+        self._durations: dict[str, float] = {}
+        self._last_sample = -SAMPLE_INTERVAL
+        self._status = ''
+
+    def _now(self) -> float:
+        return time.monotonic() - self._t0
+
+    def _append(self, kind: str, fields: dict[str, Any]) -> None:
+        """调用方持有 _lock。"""
+        if len(self._events) == self._events.maxlen:
+            self._dropped += 1
+        self._events.append({'t': round(self._now(), 2), 'ev': kind, **fields})
+
+    def _close_phase(self, now: float) -> None:
+        if self._phase:
+            self._durations[self._phase] = self._durations.get(self._phase, 0.0) + (now - self._phase_at)
+
+    @property
+    def phase_name(self) -> str:
+        return self._phase
+
+    def phase(self, name: str, **fields: Any) -> None:
+        """进入新阶段（同名阶段重复进入时忽略）；上一阶段的耗时计入汇总。"""
+        with self._lock:
+            if name == self._phase and not fields:
+                return
+            now = self._now()
+            self._close_phase(now)
+            self._phase = name
+            self._phase_at = now
+            self._append('phase', {'name': name, **fields})
+
+    def event(self, kind: str, **fields: Any) -> None:
+        with self._lock:
+            self._append(kind, fields)
+
+    def sample(self, downloaded: int, total: int = 0, speed: Optional[float] = None,
+               fragment: Optional[int] = None, fragments: Optional[int] = None) -> None:
+        """字节数/速度采样（按 SAMPLE_INTERVAL 限频）。"""
+        with self._lock:
+            now = self._now()
+            if now - self._last_sample < SAMPLE_INTERVAL:
+                return
+            self._last_sample = now
+            fields: dict[str, Any] = {'bytes': int(downloaded or 0)}
+            if total:
+                fields['total'] = int(total)
+            if speed:
+                fields['speed'] = int(speed)
+            if fragment is not None and fragments:
+                fields['frag'] = f'{fragment}/{fragments}'
+            self._append('sample', fields)
+
+    def log(self, level: str, message: str) -> None:
+        msg = str(message or '').strip()
+        if msg:
+            self.event('log', level=level, msg=msg[:MAX_MESSAGE_CHARS])
+
+    def finish(self, status: str, error: str = '') -> None:
+        """任务结束：关闭当前阶段并记录结果。"""
+        with self._lock:
+            now = self._now()
+            self._close_phase(now)
+            self._phase = ''
+            self._status = status
+            fields: dict[str, Any] = {'status': status}
+            if error:
+                fields['error'] = error[:MAX_MESSAGE_CHARS]
+            self._append('end', fields)
+
+    def to_dict(self) -> dict[str, Any]:
+        with self._lock:
+            durations = dict(self._durations)
+            if self._phase:
+                durations[self._phase] = durations.get(self._phase, 0.0) + (self._now() - self._phase_at)
+            return {
+                'created': self._created,
+                'status': self._status,
+                'elapsed': round(self._now(), 2),
+                'phases': {k: round(v, 2) for k, v in durations.items()},
+                'dropped': self._dropped,
+                'events': list(self._events),
+            }
+
+
+def _fmt_seconds(value: float) -> str:
+    value = float(value or 0)
+    if value < 60:
+        return f'{value:.1f}s'
+    minutes, seconds = divmod(int(value), 60)
+    if minutes < 60:
+        return f'{minutes}m{seconds:02d}s'
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}h{minutes:02d}m'
+
+
+def _fmt_bytes(value: Any) -> str:
+    size = float(value or 0)
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+    return f'{size:.1f}GB'
+
+
+def summarize(data: dict[str, Any]) -> str:
+    """一行阶段耗时汇总（按耗时从长到短）。"""
+    phases = data.get('phases') or {}
+    parts = [f'{PHASE_LABELS.get(k, k)} {_fmt_seconds(v)}'
+             for k, v in sorted(phases.items(), key=lambda kv: kv[1], reverse=True) if v >= 0.05]
+    total = _fmt_seconds(data.get('elapsed') or 0)
+    return f'总计 {total}' + (f'：{" · ".join(parts)}' if parts else '')
+
+
+def format_timeline(data: dict[str, Any]) -> str:
+    """时间线的可读文本（界面弹窗与诊断信息使用）。"""
+    lines = [summarize(data)]
+    if data.get('dropped'):
+        lines.append(f'（较早的 {data["dropped"]} 条事件已丢弃）')
+    for e in data.get('events') or []:
+        kind = e.get('ev', '')
+        detail = {k: v for k, v in e.items() if k not in ('t', 'ev')}
+        if kind == 'phase':
+            text = f'→ {PHASE_LABELS.get(detail.pop("name", ""), e.get("name", ""))}'
+        elif kind == 'sample':
+            text = _fmt_bytes(detail.pop('bytes', 0))
+            if 'total' in detail:
+                text += f' / {_fmt_bytes(detail.pop("total"))}'
+            if 'speed' in detail:
+                text += f'  {_fmt_bytes(detail.pop("speed"))}/s'
+            if 'frag' in detail:
+                text += f'  分片 {detail.pop("frag")}'
+        elif kind == 'ffmpeg':
+            text = f'{detail.pop("step", "")} {_fmt_seconds(detail.pop("seconds", 0))}'
+            if detail.pop('ok', True) is False:
+                text += '（失败）'
+        elif kind == 'log':
+            text = f'[{detail.pop("level", "")}] {detail.pop("msg", "")}'
+        else:
+            text = ''
+        rest = ' '.join(f'{k}={v}' for k, v in detail.items())
+        label = EVENT_LABELS.get(kind, kind)
+        lines.append(f'+{_fmt_seconds(e.get("t", 0)):>8}  {label} {text} {rest}'.rstrip())
+    return '\n'.join(lines)
+
+
+class TimelineStore:
+    """已结束任务的时间线（按 task_id 保存，数量有界，与下载历史并列持久化）"""
+
+    TIMELINE_FILE = os.path.join(os.path.expanduser('~'), '.nebuladl_timelines.json')
+    MAX_ENTRIES = 100
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path or self.TIMELINE_FILE
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._writer = DebouncedJsonWriter(self._path, delay=1.0)
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                for k, v in data.items():
+                    if isinstance(v, dict):
+                        self._entries[str(k)] = v
+        except Exception:
+            self._entries = OrderedDict()
+
+    def _snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return dict(self._entries)
+
+    def save(self, task_id: str, data: dict[str, Any]) -> None:
+        with self._lock:
+            self._entries.pop(task_id, None)
+            self._entries[task_id] = data
+            while len(self._entries) > self.MAX_ENTRIES:
+                self._entries.popitem(last=False)
+        self._writer.schedule(self._snapshot)
+
+    def get(self, task_id: str) -> Optional[dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(task_id)
+
+    def remove(self, task_id: str) -> None:
+        with self._lock:
+            if self._entries.pop(task_id, None) is None:
+                return
+        self._writer.schedule(self._snapshot)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        self._writer.schedule(self._snapshot)
+
+    def slowest(self, limit: int = 5) -> list[tuple[str, dict[str, Any]]]:
+        with self._lock:
+            items = list(self._entries.items())
+        items.sort(key=lambda kv: float(kv[1].get('elapsed') or 0), reverse=True)
+        return items[:limit]
+
+
+# 全局单例
+timeline_store = TimelineStore()
@@ -156,8 +156,112 @@ async function copyDiagnosticInfo() {
     }
 }
 
+// --- 虚拟列表：只渲染可视区域附近的行，滚动时按帧回收 ---
+class VirtualList {
+    constructor(container, { rowHeight, renderRow, onNearEnd = null, overscan = 6 }) {
+        this.container = container;
+        this.rowHeight = rowHeight;
+        this.renderRow = renderRow;
+        this.onNearEnd = onNearEnd;
+        this.overscan = overscan;
+        this.items = [];
+        this._rows = new Map(); // index -> element
+        this._frame = 0;
+
+        this.spacer = document.createElement('div');
+        this.spacer.style.position = 'relative';
+        container.innerHTML = '';
+        container.appendChild(this.spacer);
+
+        this._onScroll = () => this._schedule();
+        container.addEventListener('scroll', this._onScroll, { passive: true });
+    }
+
+    get attached() {
+        return this.spacer.parentNode === this.container;
+    }
+
+    setItems(items) {
+        this.items = items.slice();
+        this._clearRows();
+        this.container.scrollTop = 0;
+        this._schedule();
+    }
+
+    appendItems(items) {
+        if (!items.length) return;
+        this.items = this.items.concat(items);
+        this._schedule();
+    }
+
+    removeWhere(predicate) {
+        this.items = this.items.filter(item => !predicate(item));
+        this._clearRows();
+        this._schedule();
+    }
+
+    destroy() {
+        this.container.removeEventListener('scroll', this._onScroll);
+        if (this._frame) cancelAnimationFrame(this._frame);
+        this._frame = 0;
+        this._clearRows();
+        this.spacer.remove();
+    }
+
+    _clearRows() {
+        this._rows.forEach(el => el.remove());
+        this._rows.clear();
+    }
+
+    _schedule() {
+        if (this._frame) return;
+        this._frame = requestAnimationFrame(() => {
+            this._frame = 0;
+            this._render();
+        });
+    }
+
+    _render() {
+        const h = this.rowHeight;
+        const total = this.items.length;
+        this.spacer.style.height = `${total * h}px`;
+
+        const top = this.container.scrollTop;
+        const viewH = this.container.clientHeight || 600;
+        const first = Math.max(0, Math.floor(top / h) - this.overscan);
+        const last = Math.min(total, Math.ceil((top + viewH) / h) + this.overscan);
+
+        for (const [i, el] of this._rows) {
+            if (i < first || i >= last) {
+                el.remove();
+                this._rows.delete(i);
+            }
+        }
+
+        const frag = document.createDocumentFragment();
+        for (let i = first; i < last; i++) {
+            if (this._rows.has(i)) continue;
+            const el = this.renderRow(this.items[i], i);
+            el.style.position = 'absolute';
+            el.style.left = '0';
+            el.style.right = '0';
+            el.style.top = `${i * h}px`;
+            el.style.height = `${h}px`;
+            this._rows.set(i, el);
+            frag.appendChild(el);
+        }
+        this.spacer.appendChild(frag);
+
+        if (this.onNearEnd && last >= total - this.overscan) this.onNearEnd();
+    }
+}
+
 // --- 下载历史相关 ---
 let historySearchTimer = null;
+const HISTORY_PAGE_SIZE = 50;
+const HISTORY_ROW_HEIGHT = 76;   // 卡片高度 + 行间距
+let historyList = null;
+let historyPaging = { params: {}, cursor: null, loading: false, seq: 0 };
 
 async function showHistoryModal() {
     const modal = document.getElementById('historyModal');
@@ -190,31 +294,72 @@ function closeHistoryModal() {
 
 function debounceHistorySearch() {
     if (historySearchTimer) clearTimeout(historySearchTimer);
-    historySearchTimer = setTimeout(() => loadHistoryRecords(), 300);
+    // 后端按前缀缓存结果集，继续输入只在已有结果中收窄，可以缩短防抖
+    historySearchTimer = setTimeout(() => loadHistoryRecords(), 150);
+}
+
+function _historyQueryParams() {
+    const val = (id) => {
+        const el = document.getElementById(id);
+        return el ? String(el.value || '').trim() : '';
+    };
+    const params = {
+        q: val('historySearchInput'),
+        status: val('historyStatusFilter'),
+        site: val('historySiteFilter'),
+        sort: val('historySort') || '-time',
+    };
+    const days = parseInt(val('historyRangeFilter'));
+    if (days > 0) {
+        const since = new Date();
+        since.setHours(0, 0, 0, 0);
+        since.setDate(since.getDate() - (days - 1));
+        // 与历史记录中的本地 ISO 时间比较
+        const pad = (n) => String(n).padStart(2, '0');
+        params.since = `${since.getFullYear()}-${pad(since.getMonth() + 1)}-${pad(since.getDate())}`;
+    }
+    return params;
 }
 
 async function loadHistoryRecords() {
     if (!pywebviewReady || !_hasApi()) return;
 
-    const searchInput = document.getElementById('historySearchInput');
-    const query = searchInput ? searchInput.value.trim() : '';
+    // 新查询：之前未返回的分页请求作废
+    historyPaging = { params: _historyQueryParams(), cursor: null, loading: false, seq: historyPaging.seq + 1 };
+    await _fetchHistoryPage(true);
+}
+
+async function _loadMoreHistory() {
+    if (historyPaging.loading || !historyPaging.cursor) return;
+    await _fetchHistoryPage(false);
+}
 
+async function _fetchHistoryPage(reset) {
+    const seq = historyPaging.seq;
+    historyPaging.loading = true;
     try {
-        const raw = await window.pywebview.api.get_history(query || null);
+        const params = { ...historyPaging.params, cursor: historyPaging.cursor, limit: HISTORY_PAGE_SIZE };
+        const raw = await window.pywebview.api.query_history(params);
         const res = _parseMaybeJson(raw);
+        if (seq !== historyPaging.seq) return;
         if (res && res.success) {
-            renderHistoryList(res.records || []);
+            historyPaging.cursor = res.next_cursor || null;
+            renderHistoryList(res.records || [], !reset);
         }
     } catch (e) {
         console.error('加载历史失败:', e);
+    } finally {
+        if (seq === historyPaging.seq) historyPaging.loading = false;
     }
 }
 
-function renderHistoryList(records) {
+function renderHistoryList(records, append = false) {
     const container = document.getElementById('historyListContainer');
     if (!container) return;
 
-    if (!records || records.length === 0) {
+    if (!append && (!records || records.length === 0)) {
+        if (historyList) historyList.destroy();
+        historyList = null;
         container.innerHTML = `
             <div class="text-sm text-slate-500 text-center py-8">
                 <i class="fa-solid fa-inbox text-3xl mb-2 block text-slate-600"></i>
@@ -223,50 +368,77 @@ function renderHistoryList(records) {
         return;
     }
 
-    container.innerHTML = records.map(r => {
-        const title = _escapeHtml(r.title || r.url || '未知');
-        const statusIcon = r.status === 'completed'
-            ? '<i class="fa-solid fa-circle-check text-green-500"></i>'
-            : r.status === 'cancelled'
-                ? '<i class="fa-solid fa-ban text-slate-500"></i>'
-                : '<i class="fa-solid fa-circle-xmark text-red-500"></i>';
-        const timeStr = r.timestamp ? new Date(r.timestamp).toLocaleString() : '';
-        const formatBadge = r.format_id ? `<span class="text-[10px] bg-slate-700 px-1.5 py-0.5 rounded">${_escapeHtml(r.format_id)}</span>` : '';
-        const showFolderBtn = r.status === 'completed' && r.output_path;
-        // 使用 Base64 编码路径避免转义问题
-        const encodedPath = r.output_path ? btoa(unescape(encodeURIComponent(r.output_path))) : '';
+    if (!historyList || !historyList.attached) {
+        historyList = new VirtualList(container, {
+            rowHeight: HISTORY_ROW_HEIGHT,
+            renderRow: _renderHistoryRow,
+            onNearEnd: _loadMoreHistory,
+        });
+    }
 
-        return `
-            <div class="bg-slate-800/50 rounded-lg p-3 border border-slate-700/50 hover:border-slate-600 transition-colors">
-                <div class="flex items-start justify-between gap-2">
-                    <div class="flex-1 min-w-0">
-                        <div class="flex items-center gap-2 mb-1">
-                            ${statusIcon}
-                            <span class="text-sm font-medium text-white truncate">${title}</span>
-                        </div>
-                        <div class="flex items-center gap-2 text-xs text-slate-500">
-                            ${formatBadge}
-                            <span>${timeStr}</span>
-                        </div>
+    if (append) {
+        historyList.appendItems(records || []);
+    } else {
+        historyList.setItems(records);
+    }
+}
+
+function _renderHistoryRow(r) {
+    const row = document.createElement('div');
+    row.style.paddingBottom = '8px';
+
+    const title = _escapeHtml(r.title || r.url || '未知');
+    const statusIcon = r.status === 'completed'
+        ? '<i class="fa-solid fa-circle-check text-green-500"></i>'
+        : r.status === 'cancelled'
+            ? '<i class="fa-solid fa-ban text-slate-500"></i>'
+            : '<i class="fa-solid fa-circle-xmark text-red-500"></i>';
+    const timeStr = r.timestamp ? new Date(r.timestamp).toLocaleString() : '';
+    const formatBadge = r.format_id ? `<span class="text-[10px] bg-slate-700 px-1.5 py-0.5 rounded">${_escapeHtml(r.format_id)}</span>` : '';
+    const showFolderBtn = r.status === 'completed' && r.output_path;
+    // 使用 Base64 编码路径避免转义问题
+    const encodedPath = r.output_path ? btoa(unescape(encodeURIComponent(r.output_path))) : '';
+    const thumb = r.thumbnail_preview
+        ? `<img src="${_escapeHtml(r.thumbnail_preview)}" alt="" loading="lazy" class="w-16 h-9 rounded object-cover flex-shrink-0 bg-slate-700">`
+        : '';
+
+    row.innerHTML = `
+        <div class="h-full bg-slate-800/50 rounded-lg p-3 border border-slate-700/50 hover:border-slate-600 transition-colors">
+            <div class="flex items-start justify-between gap-2">
+                ${thumb}
+                <div class="flex-1 min-w-0">
+                    <div class="flex items-center gap-2 mb-1">
+                        ${statusIcon}
+                        <span class="text-sm font-medium text-white truncate">${title}</span>
                     </div>
-                    <div class="flex items-center gap-1 flex-shrink-0">
-                        ${showFolderBtn ? `
-                        <button onclick="openHistoryFolder('${encodedPath}')" title="打开文件夹"
-                            class="w-7 h-7 rounded-lg bg-slate-700/50 hover:bg-green-600/50 text-slate-400 hover:text-green-300 flex items-center justify-center transition-colors">
-                            <i class="fa-solid fa-folder-open text-xs"></i>
-                        </button>` : ''}
-                        <button onclick="redownloadRecord('${r.id}', '${_escapeHtml(r.title || '')}', '${_escapeHtml(r.format_id || 'best')}')" title="重新下载"
-                            class="w-7 h-7 rounded-lg bg-slate-700/50 hover:bg-blue-600/50 text-slate-400 hover:text-blue-300 flex items-center justify-center transition-colors">
-                            <i class="fa-solid fa-rotate-right text-xs"></i>
-                        </button>
-                        <button onclick="deleteHistoryRecord('${r.id}')" title="删除记录"
-                            class="w-7 h-7 rounded-lg bg-slate-700/50 hover:bg-red-600/50 text-slate-400 hover:text-red-300 flex items-center justify-center transition-colors">
-                            <i class="fa-solid fa-trash text-xs"></i>
-                        </button>
+                    <div class="flex items-center gap-2 text-xs text-slate-500">
+                        ${formatBadge}
+                        <span>${timeStr}</span>
                     </div>
                 </div>
-            </div>`;
-    }).join('');
+                <div class="flex items-center gap-1 flex-shrink-0">
+                    ${showFolderBtn ? `
+                    <button onclick="openHistoryFolder('${encodedPath}')" title="打开文件夹"
+                        class="w-7 h-7 rounded-lg bg-slate-700/50 hover:bg-green-600/50 text-slate-400 hover:text-green-300 flex items-center justify-center transition-colors">
+                        <i class="fa-solid fa-folder-open text-xs"></i>
+                    </button>` : ''}
+                    ${r.task_id ? `
+                    <button onclick="showTaskTimeline('${r.id}')" title="任务时间线"
+                        class="w-7 h-7 rounded-lg bg-slate-700/50 hover:bg-purple-600/50 text-slate-400 hover:text-purple-300 flex items-center justify-center transition-colors">
+                        <i class="fa-solid fa-timeline text-xs"></i>
+                    </button>` : ''}
+                    <button onclick="redownloadRecord('${r.id}', '${_escapeHtml(r.title || '')}', '${_escapeHtml(r.format_id || 'best')}')" title="重新下载"
+                        class="w-7 h-7 rounded-lg bg-slate-700/50 hover:bg-blue-600/50 text-slate-400 hover:text-blue-300 flex items-center justify-center transition-colors">
+                        <i class="fa-solid fa-rotate-right text-xs"></i>
+                    </button>
+                    <button onclick="deleteHistoryRecord('${r.id}')" title="删除记录"
+                        class="w-7 h-7 rounded-lg bg-slate-700/50 hover:bg-red-600/50 text-slate-400 hover:text-red-300 flex items-center justify-center transition-colors">
+                        <i class="fa-solid fa-trash text-xs"></i>
+                    </button>
+                </div>
+            </div>
+        </div>`;
+    return row;
 }
 
 async function openHistoryFolder(encodedPath) {
@@ -287,7 +459,9 @@ async function redownloadRecord(recordId, title, formatId) {
     try {
         const raw = await window.pywebview.api.redownload_from_history(recordId);
         const res = _parseMaybeJson(raw);
-        if (res && res.success) {
+        if (res && res.success && res.skipped) {
+            showAppDialog({ title: '已下载', message: `${res.message || '文件已存在'}\n${res.path || ''}`, type: 'info' });
+        } else if (res && res.success) {
             closeHistoryModal();
             // 在队列中创建项
             createQueueItem(title || '重新下载', formatId || 'best', 'mp4', res.task_id);
@@ -299,6 +473,22 @@ async function redownloadRecord(recordId, title, formatId) {
     }
 }
 
+async function showTaskTimeline(recordId) {
+    if (!pywebviewReady || !_hasApi()) return;
+
+    try {
+        const raw = await window.pywebview.api.get_task_timeline(recordId);
+        const res = _parseMaybeJson(raw);
+        if (res && res.success) {
+            showAppDialog({ title: '任务时间线', message: res.text || '', type: 'info' });
+        } else {
+            showAppDialog({ title: '提示', message: (res && res.error) || '没有该任务的时间线记录', type: 'info' });
+        }
+    } catch (e) {
+        showAppDialog({ title: '错误', message: String(e), type: 'error' });
+    }
+}
+
 async function deleteHistoryRecord(recordId) {
     if (!pywebviewReady || !_hasApi()) return;
 
@@ -306,7 +496,14 @@ async function deleteHistoryRecord(recordId) {
         const raw = await window.pywebview.api.delete_history_record(recordId);
         const res = _parseMaybeJson(raw);
         if (res && res.success) {
-            await loadHistoryRecords();
+            if (historyList && historyList.attached) {
+                // 本地移除该行，保留滚动位置和已加载的分页
+                // 游标按排序键定位，删除记录不影响后续分页
+                historyList.removeWhere(r => r.id === recordId);
+                if (historyList.items.length === 0) await loadHistoryRecords();
+            } else {
+                await loadHistoryRecords();
+            }
         }
     } catch (e) {
         console.error('删除记录失败:', e);
@@ -327,6 +524,155 @@ async function clearAllHistory() {
     }
 }
 
+// --- 订阅相关 ---
+async function showSubscriptionModal() {
+    const modal = document.getElementById('subscriptionModal');
+    const content = modal?.querySelector('div');
+    if (!modal) return;
+
+    modal.classList.remove('hidden');
+    void modal.offsetWidth;
+    modal.classList.remove('opacity-0');
+    if (content) {
+        content.classList.remove('scale-95');
+        content.classList.add('scale-100');
+    }
+
+    await loadSubscriptions();
+}
+
+function closeSubscriptionModal() {
+    const modal = document.getElementById('subscriptionModal');
+    const content = modal?.querySelector('div');
+    if (!modal) return;
+
+    modal.classList.add('opacity-0');
+    if (content) {
+        content.classList.remove('scale-100');
+        content.classList.add('scale-95');
+    }
+    setTimeout(() => modal.classList.add('hidden'), 300);
+}
+
+async function loadSubscriptions() {
+    if (!pywebviewReady || !_hasApi()) return;
+    try {
+        const raw = await window.pywebview.api.get_subscriptions();
+        const res = _parseMaybeJson(raw);
+        if (res && res.success) renderSubscriptionList(res.subscriptions || []);
+    } catch (e) {
+        console.error('加载订阅失败:', e);
+    }
+}
+
+function renderSubscriptionList(subs) {
+    const container = document.getElementById('subscriptionListContainer');
+    if (!container) return;
+
+    if (!subs.length) {
+        container.innerHTML = `
+            <div class="text-sm text-slate-500 text-center py-8">
+                <i class="fa-solid fa-rss text-3xl mb-2 block text-slate-600"></i>
+                暂无订阅
+            </div>`;
+        return;
+    }
+
+    container.innerHTML = subs.map(s => {
+        const name = _escapeHtml(s.title || s.url);
+        const urlEsc = _escapeHtml(s.url);
+        const synced = s.last_sync ? `上次同步 ${new Date(s.last_sync * 1000).toLocaleString()} · 新增 ${s.last_new}` : '尚未同步';
+        const spin = s.syncing ? ' fa-spin' : '';
+        return `
+            <div class="bg-slate-800/50 rounded-lg p-3 border border-slate-700/50 flex items-center justify-between gap-2">
+                <div class="flex-1 min-w-0">
+                    <div class="text-sm font-medium text-white truncate" title="${urlEsc}">${name}</div>
+                    <div class="flex items-center gap-2 text-xs text-slate-500">
+                        <span class="text-[10px] bg-slate-700 px-1.5 py-0.5 rounded">${_escapeHtml(s.format_id)}</span>
+                        <span>已下载 ${s.archived}</span>
+                        <span class="truncate">${synced}</span>
+                    </div>
+                </div>
+                <div class="flex items-center gap-1 flex-shrink-0">
+                    <button onclick="syncSubscription('${s.id}')" title="同步"
+                        class="w-7 h-7 rounded-lg bg-slate-700/50 hover:bg-orange-600/50 text-slate-400 hover:text-orange-300 flex items-center justify-center transition-colors">
+                        <i id="sub-sync-${s.id}" class="fa-solid fa-rotate text-xs${spin}"></i>
+                    </button>
+                    <button onclick="removeSubscription('${s.id}')" title="取消订阅"
+                        class="w-7 h-7 rounded-lg bg-slate-700/50 hover:bg-red-600/50 text-slate-400 hover:text-red-300 flex items-center justify-center transition-colors">
+                        <i class="fa-solid fa-trash text-xs"></i>
+                    </button>
+                </div>
+            </div>`;
+    }).join('');
+}
+
+async function addSubscription() {
+    if (!pywebviewReady || !_hasApi()) return;
+    const input = document.getElementById('subscriptionUrlInput');
+    const fmt = document.getElementById('subscriptionFormat');
+    const url = input ? input.value.trim() : '';
+    if (!url) return;
+
+    try {
+        const raw = await window.pywebview.api.add_subscription(url, fmt ? fmt.value : 'best');
+        const res = _parseMaybeJson(raw);
+        if (res && res.success) {
+            if (input) input.value = '';
+            await syncSubscription(res.subscription.id);
+        } else {
+            showAppDialog({ title: '订阅失败', message: res?.error || '订阅失败', type: 'error' });
+        }
+    } catch (e) {
+        showAppDialog({ title: '错误', message: String(e), type: 'error' });
+    }
+}
+
+async function removeSubscription(subId) {
+    if (!pywebviewReady || !_hasApi()) return;
+    try {
+        await window.pywebview.api.remove_subscription(subId);
+        await loadSubscriptions();
+    } catch (e) {
+        console.error('取消订阅失败:', e);
+    }
+}
+
+async function syncSubscription(subId) {
+    if (!pywebviewReady || !_hasApi()) return;
+    try {
+        await window.pywebview.api.sync_subscription(subId);
+        await loadSubscriptions();
+    } catch (e) {
+        console.error('同步订阅失败:', e);
+    }
+}
+
+async function syncAllSubscriptions() {
+    if (!pywebviewReady || !_hasApi()) return;
+    try {
+        await window.pywebview.api.sync_all_subscriptions();
+        await loadSubscriptions();
+    } catch (e) {
+        console.error('同步订阅失败:', e);
+    }
+}
+
+// Python 回调：订阅同步完成
+function onSubscriptionSynced(result) {
+    const res = _parseMaybeJson(result) || {};
+    if (res.success) {
+        for (const task of (res.tasks || [])) {
+            if (task.duplicate) continue;
+            createQueueItem(task.title || task.url, res.format_id || 'best', 'mp4', task.task_id);
+        }
+    } else if (res.error) {
+        showAppDialog({ title: '同步失败', message: res.error, type: 'error' });
+    }
+    const modal = document.getElementById('subscriptionModal');
+    if (modal && !modal.classList.contains('hidden')) loadSubscriptions();
+}
+
 function _hasApi() {
     return typeof window !== 'undefined' && window.pywebview && window.pywebview.api;
 }
@@ -396,6 +742,30 @@ function clearUrlInput() {
     _syncUrlClearButton();
 })();
 
+// --- 粘贴即预解析：后端并行解析并缓存，点击“解析”/下载时直接使用结果 ---
+const prefetchedUrls = new Map();   // url -> true(成功) / false(失败)
+
+function onPrefetchResult(url, ok) {
+    prefetchedUrls.set(String(url || ''), !!ok);
+    if (prefetchedUrls.size > 200) prefetchedUrls.delete(prefetchedUrls.keys().next().value);
+}
+
+function _prefetchUrls(text) {
+    if (!pywebviewReady || !_hasApi() || !window.pywebview.api.prefetch_analysis) return;
+    const urls = _parseUrlsFromInput(text).filter((u) => /^https?:\/\//i.test(u) && !prefetchedUrls.has(u));
+    if (!urls.length) return;
+    window.pywebview.api.prefetch_analysis(urls).catch(() => {});
+}
+
+(function _initUrlPrefetch() {
+    // 解析输入框和批量下载输入框；粘贴事件触发时输入框的值尚未更新
+    for (const id of ['urlInput', 'batchUrls']) {
+        const input = document.getElementById(id);
+        if (!input) continue;
+        input.addEventListener('paste', () => setTimeout(() => _prefetchUrls(input.value), 0));
+    }
+})();
+
 function _setAnalyzeLoading(loading) {
     const btn = _getAnalyzeButton();
     if (!btn) return;
@@ -403,17 +773,75 @@ function _setAnalyzeLoading(loading) {
     if (loading) {
         btn.dataset.originalHtml = btn.innerHTML;
         btn.innerHTML = '<i class="fa-solid fa-circle-notch fa-spin"></i> 解析中...';
-        btn.disabled = true;
+        // 解析中再次点击即取消
+        btn.title = '点击取消解析';
     } else {
         if (btn.dataset.originalHtml) {
             btn.innerHTML = btn.dataset.originalHtml;
             delete btn.dataset.originalHtml;
         }
-        btn.disabled = false;
+        btn.removeAttribute('title');
+    }
+    btn.disabled = false;
+}
+
+// --- 解析任务（后端可取消，结果通过回调返回） ---
+const analyzeRun = { active: false, seq: 0, jobIds: [], label: '' };
+const analyzeWaiters = new Map();
+const analyzeEarlyResults = new Map();
+
+function _waitAnalyzeResult(jobId) {
+    if (analyzeEarlyResults.has(jobId)) {
+        const res = analyzeEarlyResults.get(jobId);
+        analyzeEarlyResults.delete(jobId);
+        return Promise.resolve(res);
+    }
+    return new Promise((resolve) => analyzeWaiters.set(jobId, resolve));
+}
+
+function onAnalyzeResult(jobId, result) {
+    const resolve = analyzeWaiters.get(jobId);
+    if (resolve) {
+        analyzeWaiters.delete(jobId);
+        resolve(result);
+        return;
+    }
+    // 结果可能先于 analyze_video_async 的返回值到达
+    analyzeEarlyResults.set(jobId, result);
+    if (analyzeEarlyResults.size > 20) {
+        analyzeEarlyResults.delete(analyzeEarlyResults.keys().next().value);
+    }
+}
+
+function onAnalyzeProgress(jobId, message) {
+    if (!analyzeRun.active || !analyzeRun.jobIds.includes(jobId)) return;
+    // "[youtube] abc123: Downloading webpage" -> "Downloading webpage"
+    const step = String(message || '').replace(/^\[[^\]]*\]\s*/, '').replace(/^[^\s:]+:\s*/, '').slice(0, 40);
+    _setAnalyzeButtonText(`<i class="fa-solid fa-circle-notch fa-spin"></i> ${analyzeRun.label} ${_escapeHtml(step)}`);
+}
+
+async function _runAnalyzeJob(url, supersede) {
+    const submitted = _parseMaybeJson(await window.pywebview.api.analyze_video_async(url, supersede));
+    if (!submitted || !submitted.success) return submitted;
+    analyzeRun.jobIds.push(submitted.job_id);
+    return _parseMaybeJson(await _waitAnalyzeResult(submitted.job_id));
+}
+
+function cancelAnalyze() {
+    analyzeRun.seq += 1;
+    const jobIds = analyzeRun.jobIds.slice();
+    if (!_hasApi()) return;
+    for (const jobId of jobIds) {
+        window.pywebview.api.cancel_analysis(jobId).catch(() => {});
     }
 }
 
 async function analyzeVideo() {
+    if (analyzeRun.active) {
+        cancelAnalyze();
+        return;
+    }
+
     const input = document.getElementById('urlInput');
     const emptyState = document.getElementById('emptyState');
     const resultsList = document.getElementById('resultsList');
@@ -435,6 +863,8 @@ async function analyzeVideo() {
     }
 
     _setAnalyzeLoading(true);
+    analyzeRun.active = true;
+    const seq = ++analyzeRun.seq;
 
     try {
         if (resultsList) {
@@ -442,20 +872,29 @@ async function analyzeVideo() {
             resultsList.classList.add('hidden');
         }
 
+        // 所有链接同时提交（后端线程池限制并发，已预解析的直接命中缓存），按输入顺序逐个渲染
+        const pending = urls.map((url, i) => _runAnalyzeJob(url, i === 0));
         let okCount = 0;
+        const playlistUrls = [];
         for (let i = 0; i < urls.length; i++) {
+            if (seq !== analyzeRun.seq) return;
             const url = urls[i];
-            _setAnalyzeButtonText(`<i class="fa-solid fa-circle-notch fa-spin"></i> 解析中 (${i + 1}/${urls.length})...`);
-
-            const timeoutMs = 180000;
-            const timeoutPromise = new Promise((_, reject) => {
-                setTimeout(() => reject(new Error('__NEBULADL_ANALYZE_TIMEOUT__')), timeoutMs);
-            });
-            const raw = await Promise.race([
-                window.pywebview.api.analyze_video(url),
-                timeoutPromise
-            ]);
-            const res = _parseMaybeJson(raw);
+            analyzeRun.label = urls.length > 1 ? `解析中 (${i + 1}/${urls.length})` : '解析中';
+            _setAnalyzeButtonText(`<i class="fa-solid fa-circle-notch fa-spin"></i> ${analyzeRun.label}...`);
+
+            // 超时由后端执行（会真正中止提取），这里只等待结果回调
+            const res = await pending[i];
+            if (seq !== analyzeRun.seq || (res && res.cancelled)) return;
+
+            if (res && !res.success && res.playlist && Array.isArray(res.playlist.urls)) {
+                // 播放列表：条目链接转入批量下载
+                playlistUrls.push(...res.playlist.urls);
+                if (urls.length === 1) {
+                    _openBatchWithUrls(playlistUrls, String(res.error || ''));
+                    return;
+                }
+                continue;
+            }
 
             if (!res || !res.success) {
                 const errMsg = (res && res.error) ? String(res.error) : '视频解析失败';
@@ -492,6 +931,15 @@ async function analyzeVideo() {
             resultsList.appendChild(card);
             renderVideo(data, card);
             okCount += 1;
+            if (okCount === 1) {
+                if (emptyState) emptyState.classList.add('hidden');
+                resultsList.classList.remove('hidden');
+            }
+        }
+
+        if (playlistUrls.length > 0) {
+            _openBatchWithUrls(playlistUrls, `已展开播放列表，共 ${playlistUrls.length} 个视频`);
+            if (okCount === 0) return;
         }
 
         if (okCount > 0) {
@@ -507,12 +955,10 @@ async function analyzeVideo() {
         }
     } catch (e) {
         const msg = (e && e.message ? String(e.message) : String(e));
-        if (msg.includes('__NEBULADL_ANALYZE_TIMEOUT__')) {
-            showAppDialog({ title: '网络异常', message: '网络异常，解析超时，请检查网络连接或稍后再试', type: 'error' });
-        } else {
-            showAppDialog({ title: '系统错误', message: msg, type: 'error' });
-        }
+        showAppDialog({ title: '系统错误', message: msg, type: 'error' });
     } finally {
+        analyzeRun.active = false;
+        analyzeRun.jobIds = [];
         _setAnalyzeLoading(false);
     }
 }
@@ -522,13 +968,16 @@ function renderVideo(data, root) {
 
     const thumbImg = root.querySelector('.thumb-img');
     if (thumbImg) {
-        if (data.thumbnail) thumbImg.src = data.thumbnail;
-        thumbImg.onclick = () => openImagePreview(thumbImg.src);
+        // 优先使用本地缩略图服务（已缓存、已缩放），大图预览使用原尺寸
+        const thumbSrc = data.thumbnail_preview || data.thumbnail;
+        const fullSrc = data.thumbnail_full || data.thumbnail || thumbSrc;
+        if (thumbSrc) thumbImg.src = thumbSrc;
+        thumbImg.onclick = () => openImagePreview(fullSrc || thumbImg.src);
         thumbImg.onkeydown = (e) => {
             const key = e && e.key ? String(e.key) : '';
             if (key === 'Enter' || key === ' ') {
                 e.preventDefault();
-                openImagePreview(thumbImg.src);
+                openImagePreview(fullSrc || thumbImg.src);
             }
         };
     }
@@ -602,8 +1051,13 @@ function renderFormats(formats, root, videoData) {
         const sizeEsc = _escapeHtml(size);
 
         const badgeColor = 'bg-blue-900/30 text-blue-400 border-blue-900/50';
+        const groupable = /^\d+p$/.test(formatId);
+        const pickHtml = groupable
+            ? `<input type="checkbox" class="rendition-pick accent-blue-500" data-format-id="${_escapeHtml(formatId)}" data-label="${labelEsc}" data-ext="${extEsc}" title="多选分辨率">`
+            : '';
         row.innerHTML = `
             <div class="flex items-center gap-2">
+                ${pickHtml}
                 <span class="${badgeColor} text-xs px-2 py-0.5 rounded border">${extEsc}</span>
             </div>
             <div class="text-sm text-slate-300">${labelEsc}</div>
@@ -632,6 +1086,67 @@ function renderFormats(formats, root, videoData) {
         const last = rows[rows.length - 1];
         last.classList.remove('border-b');
     }
+
+    const picks = table.querySelectorAll('.rendition-pick');
+    if (picks.length > 1) {
+        const footer = document.createElement('div');
+        footer.className = 'hidden px-4 py-2 bg-slate-800/50 border-t border-slate-800 items-center justify-end';
+        const groupBtn = document.createElement('button');
+        groupBtn.className = 'bg-blue-600 hover:bg-blue-500 text-white text-xs px-3 py-1.5 rounded-md transition-all';
+        groupBtn.onclick = () => startGroupDownload(videoData, table, groupBtn);
+        footer.appendChild(groupBtn);
+        table.appendChild(footer);
+
+        const sync = () => {
+            const n = table.querySelectorAll('.rendition-pick:checked').length;
+            groupBtn.innerHTML = `<i class="fa-solid fa-layer-group mr-1"></i> 下载所选 ${n} 个分辨率（共享音轨）`;
+            footer.classList.toggle('hidden', n < 2);
+            footer.classList.toggle('flex', n >= 2);
+        };
+        picks.forEach(p => p.addEventListener('change', sync));
+        sync();
+    }
+}
+
+async function startGroupDownload(videoData, table, btn) {
+    const url = String((videoData && videoData.url) ? videoData.url : '').trim();
+    const title = String((videoData && videoData.title) ? videoData.title : '');
+    const picks = Array.from(table.querySelectorAll('.rendition-pick:checked'));
+    if (!url || picks.length === 0) return;
+    if (!pywebviewReady || !_hasApi()) {
+        showAppDialog({ title: '系统提示', message: '应用 API 尚未就绪', type: 'warning' });
+        return;
+    }
+
+    const byId = {};
+    for (const p of picks) byId[p.dataset.formatId] = p;
+
+    if (btn) btn.disabled = true;
+    try {
+        const raw = await window.pywebview.api.start_group_download(url, picks.map(p => p.dataset.formatId));
+        const res = _parseMaybeJson(raw);
+        if (!res || !res.success) {
+            showAppDialog({ title: '下载失败', message: (res && res.error) ? res.error : '下载启动失败', type: 'error' });
+            return;
+        }
+
+        for (const t of (res.tasks || [])) {
+            const p = byId[t.format_id];
+            createQueueItem(title || '下载任务', p ? p.dataset.label : t.format_id, p ? p.dataset.ext : 'mp4', t.task_id);
+        }
+        for (const p of picks) p.checked = false;
+        picks[0].dispatchEvent(new Event('change'));
+
+        const skipped = Array.isArray(res.skipped) ? res.skipped : [];
+        if (skipped.length > 0) {
+            showAppDialog({ title: '部分已跳过', message: `${skipped.length} 个分辨率的文件已存在，未重复下载`, type: 'info' });
+        }
+        _scrollToQueue();
+    } catch (e) {
+        showAppDialog({ title: '系统错误', message: (e && e.message ? e.message : String(e)), type: 'error' });
+    } finally {
+        if (btn) btn.disabled = false;
+    }
 }
 
 function _setFormatButtonUi(btn, mode) {
@@ -734,7 +1249,16 @@ async function startDownload(videoUrl, videoTitle, formatId, label, ext, btnElem
             return;
         }
 
-        // Updated: Pass task_id
+        if (res.skipped) {
+            if (btnElement) {
+                btnElement.disabled = false;
+                btnElement.classList.remove('opacity-50', 'cursor-not-allowed');
+            }
+            showAppDialog({ title: '已下载', message: `${res.message || '文件已存在'}\n${res.path || ''}`, type: 'info' });
+            return;
+        }
+
+        // Updated: Pass task_id (duplicates attach to the existing queue item)
         createQueueItem(videoTitle || '下载任务', label, ext, res.task_id);
 
         if (btnElement) {
@@ -757,10 +1281,31 @@ async function startDownload(videoUrl, videoTitle, formatId, label, ext, btnElem
     }
 }
 
+// 队列项元素引用缓存：进度更新时不再重复 querySelector
+const taskRefs = new Map();
+
+function _getTaskRefs(taskId) {
+    const id = String(taskId || '');
+    const refs = taskRefs.get(id);
+    if (refs && refs.item.isConnected) return refs;
+    taskRefs.delete(id);
+    return null;
+}
+
+function _removeQueueItem(taskId) {
+    const refs = _getTaskRefs(taskId);
+    if (refs) refs.item.remove();
+    taskRefs.delete(String(taskId || ''));
+    pendingProgress.delete(String(taskId || ''));
+}
+
 function createQueueItem(title, label, ext, taskId) {
     const queue = document.getElementById('downloadQueue');
     if (!queue) return;
 
+    // Same task requested again: keep the existing item (it already tracks progress).
+    if (taskId && _getTaskRefs(taskId)) return;
+
     const item = document.createElement('div');
     // Use ID for updates
     item.id = 'task-' + taskId;
@@ -809,26 +1354,35 @@ function createQueueItem(title, label, ext, taskId) {
 
     // Removed manual onclick binding since we use inline onclick for clarity and closure capture
 
+    const pauseBtn = item.querySelector(`#btn-pause-${safeTaskId}`);
+    taskRefs.set(String(safeTaskId), {
+        item,
+        bar: item.querySelector('.progress-bar'),
+        statusEl: item.querySelector('.status-text'),
+        pauseBtn,
+        pauseIcon: pauseBtn ? pauseBtn.querySelector('i') : null,
+        retryBtn: item.querySelector(`#btn-retry-${safeTaskId}`),
+    });
 
     queue.prepend(item);
     // currentQueueItem = item; // No longer used for single tracking
 }
 
 function cancelOrCloseQueueItem(taskId) {
-    const item = document.getElementById('task-' + taskId);
-    if (!item) return;
+    const refs = _getTaskRefs(taskId);
+    if (!refs) return;
+    const { item, statusEl } = refs;
 
-    const statusEl = item.querySelector('.status-text');
     const status = (statusEl && statusEl.textContent) ? statusEl.textContent.trim() : '';
     // If task is already finished/cancelled/failed, close immediately.
     if (status.includes('下载完成') || status.includes('已取消') || status.includes('下载失败')) {
-        item.remove();
+        _removeQueueItem(taskId);
         return;
     }
 
     // Second click after cancellation closes/removes the queue card.
     if (item.dataset.cancelled === '1') {
-        item.remove();
+        _removeQueueItem(taskId);
         return;
     }
 
@@ -836,30 +1390,34 @@ function cancelOrCloseQueueItem(taskId) {
     cancelDownload(taskId);
 }
 
-function updateProgress(taskId, percent, status) {
-    // Support both old signature (percent, status) and new (taskId, percent, status)
-    // If taskId is number or string looking like ID, use it. If it looks like percent (number), shift args.
-    // Actually, safest is to check if element exists.
+// 进度更新按帧合并：同一任务一帧内只写一次 DOM（只保留最新值）
+const pendingProgress = new Map();
+let progressFrame = 0;
 
-    let id = taskId;
-    let p = percent;
-    let s = status;
+function updateProgress(taskId, percent, status) {
+    const id = String(taskId ?? '');
+    if (!id) return;
+    pendingProgress.set(id, { percent, status });
+    if (!progressFrame) progressFrame = requestAnimationFrame(_flushProgress);
+}
 
-    // Handle legacy calls if any
-    if (typeof taskId === 'number' && typeof percent === 'string') {
-        // Old signature: updateProgress(percent, status)
-        // We can't identify the task easily unless we kept currentQueueItem.
-        // But prompt implies Python sends taskId now.
-        // Assuming new signature is strictly followed by Python.
-    }
+function _flushProgress() {
+    progressFrame = 0;
+    const batch = Array.from(pendingProgress);
+    pendingProgress.clear();
+    for (const [id, u] of batch) _applyProgress(id, u.percent, u.status);
+}
 
-    const item = document.getElementById('task-' + id);
-    if (!item) return;
+// 立即应用（完成/失败等终态），并丢弃该任务尚未写入的进度
+function _applyProgressNow(taskId, percent, status) {
+    pendingProgress.delete(String(taskId));
+    _applyProgress(String(taskId), percent, status);
+}
 
-    const bar = item.querySelector('.progress-bar');
-    const statusEl = item.querySelector('.status-text');
-    const pauseBtn = item.querySelector(`#btn-pause-${id}`);
-    const pauseIcon = pauseBtn ? pauseBtn.querySelector('i') : null;
+function _applyProgress(id, p, s) {
+    const refs = _getTaskRefs(id);
+    if (!refs) return;
+    const { bar, statusEl, pauseIcon } = refs;
 
     const pNum = Number(p);
     if (bar && !Number.isNaN(pNum) && pNum >= 0) {
@@ -898,41 +1456,37 @@ function _resetFormatButtonForTask(taskId) {
 }
 
 function onDownloadComplete(taskId) {
-    updateProgress(taskId, 100, '下载完成');
+    _applyProgressNow(taskId, 100, '下载完成');
     _resetFormatButtonForTask(taskId);
-    const item = document.getElementById('task-' + taskId);
-    if (item) {
-        const bar = item.querySelector('.progress-bar');
+    const refs = _getTaskRefs(taskId);
+    if (refs) {
+        const { bar, pauseBtn } = refs;
         if (bar) {
             bar.classList.remove('bg-blue-500');
             bar.classList.add('bg-green-500');
         }
         // 隐藏暂停按钮
-        const pauseBtn = item.querySelector(`#btn-pause-${taskId}`);
         if (pauseBtn) pauseBtn.classList.add('hidden');
     }
 }
 
 function onDownloadError(taskId, message) {
-    updateProgress(taskId, 0, '下载失败');
+    _applyProgressNow(taskId, 0, '下载失败');
     _resetFormatButtonForTask(taskId);
-    const item = document.getElementById('task-' + taskId);
-    if (item) {
-        const retryBtn = item.querySelector(`#btn-retry-${taskId}`);
+    const refs = _getTaskRefs(taskId);
+    if (refs) {
+        const { retryBtn, pauseBtn, statusEl, bar } = refs;
         if (retryBtn) retryBtn.classList.remove('hidden');
 
-        const pauseBtn = item.querySelector(`#btn-pause-${taskId}`);
         if (pauseBtn) {
             pauseBtn.disabled = true;
             pauseBtn.classList.add('opacity-50', 'cursor-not-allowed');
         }
 
-        const statusEl = item.querySelector('.status-text');
         if (statusEl) {
             statusEl.textContent = message || '下载失败';
             statusEl.classList.add('text-red-400');
         }
-        const bar = item.querySelector('.progress-bar');
         if (bar) {
             bar.classList.remove('bg-blue-500');
             bar.classList.add('bg-red-500');
@@ -946,13 +1500,9 @@ async function retryTask(taskId) {
     if (!tid) return;
     if (!pywebviewReady || !_hasApi()) return;
 
-    const item = document.getElementById('task-' + tid);
-    if (!item) return;
-
-    const retryBtn = item.querySelector(`#btn - retry - ${tid} `);
-    const pauseBtn = item.querySelector(`#btn - pause - ${tid} `);
-    const statusEl = item.querySelector('.status-text');
-    const bar = item.querySelector('.progress-bar');
+    const refs = _getTaskRefs(tid);
+    if (!refs) return;
+    const { retryBtn, pauseBtn, statusEl, bar } = refs;
 
     if (retryBtn) {
         retryBtn.disabled = true;
@@ -1004,7 +1554,7 @@ async function cancelDownload(taskId) {
     try {
         // Pass taskId if available
         await window.pywebview.api.cancel_download(taskId);
-        updateProgress(taskId, 0, '已取消');
+        _applyProgressNow(taskId, 0, '已取消');
         _resetFormatButtonForTask(taskId);
     } catch {
         // ignore
@@ -1016,11 +1566,11 @@ async function togglePause(taskId) {
     if (!tid) return;
     if (!pywebviewReady || !_hasApi()) return;
 
-    const item = document.getElementById('task-' + tid);
-    const statusEl = item ? item.querySelector('.status-text') : null;
-    const status = statusEl ? String(statusEl.textContent || '') : '';
-    const pauseBtn = item ? item.querySelector(`#btn-pause-${tid}`) : null;
-    const pauseIcon = pauseBtn ? pauseBtn.querySelector('i') : null;
+    const refs = _getTaskRefs(tid);
+    const statusEl = refs ? refs.statusEl : null;
+    const pending = pendingProgress.get(tid);
+    const status = pending ? String(pending.status || '') : (statusEl ? String(statusEl.textContent || '') : '');
+    const pauseIcon = refs ? refs.pauseIcon : null;
 
     const btn = taskButtons[tid];
 
@@ -1167,6 +1717,62 @@ async function removeCookieMapping(domain) {
     await refreshCookieMappings();
 }
 
+async function refreshBrowserCookieSources() {
+    const select = document.getElementById('browserCookieSelect');
+    if (!select || !pywebviewReady || !_hasApi()) return;
+
+    try {
+        const raw = await window.pywebview.api.get_browser_cookie_sources();
+        const res = _parseMaybeJson(raw);
+        if (!res || !res.success) return;
+
+        const current = String(res.current || '');
+        const items = Array.isArray(res.items) ? res.items.slice() : [];
+        if (current && !items.some(it => it && it.path === current)) {
+            items.push({ browser: '自定义', profile: current.split(/[/\\]/).slice(-2, -1)[0] || '', path: current });
+        }
+
+        let html = '<option value="">不使用浏览器 Cookie</option>';
+        for (const it of items) {
+            const path = String((it && it.path) || '');
+            if (!path) continue;
+            const label = `${it.browser || ''} · ${it.profile || ''}`;
+            html += `<option value="${_escapeHtml(path)}" title="${_escapeHtml(path)}">${_escapeHtml(label)}</option>`;
+        }
+        select.innerHTML = html;
+        select.value = current;
+    } catch {
+        // ignore
+    }
+}
+
+async function setBrowserCookieDb(path) {
+    if (!pywebviewReady || !_hasApi()) return;
+    try {
+        const raw = await window.pywebview.api.set_browser_cookie_db(String(path || ''));
+        const res = _parseMaybeJson(raw);
+        if (!res || !res.success) {
+            showAppDialog({ title: '保存失败', message: (res && res.error) ? res.error : '保存失败', type: 'error' });
+        }
+    } catch (e) {
+        showAppDialog({ title: '保存失败', message: (e && e.message ? e.message : String(e)), type: 'error' });
+    }
+    await refreshBrowserCookieSources();
+}
+
+async function chooseBrowserCookieDb() {
+    if (!pywebviewReady || !_hasApi()) return;
+    try {
+        const pickRaw = await window.pywebview.api.choose_cookie_file();
+        const pick = _parseMaybeJson(pickRaw);
+        if (pick && pick.success && pick.path) {
+            await setBrowserCookieDb(pick.path);
+        }
+    } catch {
+        // ignore
+    }
+}
+
 // --- Cookie Guide Modal Logic ---
 const cookieGuideModal = document.getElementById('cookieGuideModal');
 
@@ -1221,6 +1827,17 @@ function closeBatchModal() {
     setTimeout(() => batchModal.classList.add('hidden'), 300);
 }
 
+function _openBatchWithUrls(urls, message) {
+    const urlsArea = document.getElementById('batchUrls');
+    if (!urlsArea) return;
+    const existing = urlsArea.value.split('\n').map(u => u.trim()).filter(u => u.length > 0);
+    const seen = new Set(existing);
+    const added = urls.filter((u) => !seen.has(u) && seen.add(u));
+    urlsArea.value = existing.concat(added).join('\n');
+    showBatchModal();
+    if (message) showAppDialog({ title: '播放列表', message, type: 'info' });
+}
+
 async function startBatchDownload() {
     const urlsArea = document.getElementById('batchUrls');
     const formatSelect = document.getElementById('batchFormat');
@@ -1267,6 +1884,11 @@ async function startBatchDownload() {
                 const label = (formatId === 'audio' ? 'Audio Only' : (formatId === 'best' ? 'Best Quality' : formatId));
                 createQueueItem(task.title || task.url, label, 'mp4', task.task_id);
             }
+
+            const skipped = Array.isArray(res.skipped) ? res.skipped : [];
+            if (skipped.length > 0) {
+                showAppDialog({ title: '部分已跳过', message: `${skipped.length} 个链接的文件已存在，未重复下载`, type: 'info' });
+            }
         } else {
             showAppDialog({ title: '启动失败', message: (res && res.error) ? res.error : '批量任务启动失败', type: 'error' });
         }
@@ -1303,6 +1925,41 @@ async function showSettingsModal() {
                     convertMp4El.checked = !!settings.convert_mp4;
                 }
 
+                const scratchEl = document.getElementById('settingScratchDir');
+                if (scratchEl) {
+                    scratchEl.value = settings.scratch_dir || '';
+                }
+
+                const preallocateEl = document.getElementById('settingPreallocate');
+                if (preallocateEl) {
+                    preallocateEl.checked = !!settings.preallocate;
+                }
+
+
+                const liveSegmentEl = document.getElementById('settingLiveSegment');
+                if (liveSegmentEl && settings.live_segment_minutes != null) {
+                    liveSegmentEl.value = settings.live_segment_minutes;
+                }
+
+                const retryEl = document.getElementById('settingRetryAttempts');
+                if (retryEl && settings.retry_attempts != null) {
+                    retryEl.value = settings.retry_attempts;
+                }
+
+                const metricsPortEl = document.getElementById('settingMetricsPort');
+                if (metricsPortEl && settings.metrics_port != null) {
+                    metricsPortEl.value = settings.metrics_port;
+                }
+
+                const bandwidthEl = document.getElementById('settingBandwidthLimit');
+                if (bandwidthEl) {
+                    bandwidthEl.value = settings.bandwidth_limit || '';
+                }
+
+                const scheduleEl = document.getElementById('settingScheduleWindows');
+                if (scheduleEl) {
+                    scheduleEl.value = settings.schedule_windows || '';
+                }
 
                 if (settings.threads) {
                     document.getElementById('settingThreads').value = settings.threads;
@@ -1315,6 +1972,7 @@ async function showSettingsModal() {
     }
 
     await refreshCookieMappings();
+    await refreshBrowserCookieSources();
     await loadVersionInfo();
 
     settingsModal.classList.remove('hidden');
@@ -1344,12 +2002,34 @@ async function selectDownloadFolder() {
     }
 }
 
+async function selectScratchFolder() {
+    if (!pywebviewReady || !_hasApi()) return;
+    try {
+        const path = await window.pywebview.api.choose_directory();
+        if (path) {
+            document.getElementById('settingScratchDir').value = path;
+        }
+    } catch (e) {
+        console.error(e);
+    }
+}
+
 async function saveSettings() {
     const path = document.getElementById('settingDownloadPath').value;
     const proxy = document.getElementById('settingProxy').value;
     const threads = document.getElementById('settingThreads').value;
     const createFolder = document.getElementById('settingCreateFolder').checked;
     const convertMp4 = document.getElementById('settingConvertMp4').checked;
+    const preallocateEl = document.getElementById('settingPreallocate');
+    const scratchEl = document.getElementById('settingScratchDir');
+    const liveSegmentEl = document.getElementById('settingLiveSegment');
+    const liveSegment = liveSegmentEl ? parseInt(liveSegmentEl.value) : NaN;
+    const scheduleEl = document.getElementById('settingScheduleWindows');
+    const bandwidthEl = document.getElementById('settingBandwidthLimit');
+    const retryEl = document.getElementById('settingRetryAttempts');
+    const retryAttempts = retryEl ? parseInt(retryEl.value) : NaN;
+    const metricsPortEl = document.getElementById('settingMetricsPort');
+    const metricsPort = metricsPortEl ? parseInt(metricsPortEl.value) : NaN;
 
     if (!pywebviewReady || !_hasApi()) {
         // 本地模拟保存
@@ -1364,8 +2044,19 @@ async function saveSettings() {
             threads: parseInt(threads),
             create_folder: createFolder,
             convert_mp4: convertMp4,
+            preallocate: preallocateEl ? preallocateEl.checked : false,
         };
-        await window.pywebview.api.save_settings(data);
+        if (!Number.isNaN(liveSegment)) data.live_segment_minutes = liveSegment;
+        if (scheduleEl) data.schedule_windows = scheduleEl.value;
+        if (bandwidthEl) data.bandwidth_limit = bandwidthEl.value;
+        if (scratchEl) data.scratch_dir = scratchEl.value;
+        if (!Number.isNaN(retryAttempts)) data.retry_attempts = retryAttempts;
+        if (!Number.isNaN(metricsPort)) data.metrics_port = metricsPort;
+        const res = _parseMaybeJson(await window.pywebview.api.save_settings(data));
+        if (res && res.success === false) {
+            showAppDialog({ title: '保存失败', message: res.error || '未知错误', type: 'error' });
+            return;
+        }
         closeSettingsModal();
         showAppDialog({ title: '成功', message: '设置已保存', type: 'success' });
     } catch (e) {
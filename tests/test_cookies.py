@@ -0,0 +1,160 @@
+"""
+BrowserCookieStore 针对 fixture SQLite Cookie 数据库的测试（Firefox / Chromium）
+"""
+
+import os
+import sys
+import time
+import sqlite3
+
+import pytest
+
+from core import cookies
+from core.cookies import BrowserCookieStore, _read_cookie_rows, _CHROMIUM_EPOCH_OFFSET
+
+
+FUTURE = int(time.time()) + 86400
+PAST = int(time.time()) - 86400
+
+
+def _chromium_time(ts: int) -> int:
+    return (ts + _CHROMIUM_EPOCH_OFFSET) * 1_000_000
+
+
+def _make_firefox_db(path: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(
+        'CREATE TABLE moz_cookies (id INTEGER PRIMARY KEY, host TEXT, name TEXT, value TEXT, '
+        'path TEXT, expiry INTEGER, isSecure INTEGER)'
+    )
+    conn.executemany(
+        'INSERT INTO moz_cookies (host, name, value, path, expiry, isSecure) VALUES (?, ?, ?, ?, ?, ?)',
+        [
+            ('.example.com', 'SID', 'abc', '/', FUTURE, 1),
+            ('video.example.com', 'pref', 'hd', '/watch', 0, 0),
+            ('.example.com', 'old', 'gone', '/', PAST, 0),
+            ('.other.org', 'SID', 'nope', '/', FUTURE, 0),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _v10_encrypt(value: str) -> bytes:
+    """Linux Chromium 的 v10 加密（固定密钥 'peanuts'）。"""
+    from yt_dlp.aes import aes_cbc_encrypt_bytes
+    from yt_dlp.cookies import LinuxChromeCookieDecryptor
+
+    key = LinuxChromeCookieDecryptor.derive_key(b'peanuts')
+    return b'v10' + aes_cbc_encrypt_bytes(value.encode(), key, b' ' * 16)
+
+
+def _make_chromium_profile(root: str, rows: list[tuple]) -> str:
+    profile = os.path.join(root, 'User Data', 'Default')
+    os.makedirs(os.path.join(profile, 'Network'))
+    path = os.path.join(profile, 'Network', 'Cookies')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+    conn.execute("INSERT INTO meta VALUES ('version', '23')")
+    conn.execute(
+        'CREATE TABLE cookies (host_key TEXT, name TEXT, value TEXT, encrypted_value BLOB, '
+        'path TEXT, expires_utc INTEGER, is_secure INTEGER)'
+    )
+    conn.executemany('INSERT INTO cookies VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_firefox_rows_filtered_by_domain_and_expiry(tmp_path):
+    db = str(tmp_path / 'cookies.sqlite')
+    _make_firefox_db(db)
+
+    rows = _read_cookie_rows(db, 'example.com')
+
+    assert sorted((r[0], r[5], r[6]) for r in rows) == [
+        ('.example.com', 'SID', 'abc'),
+        ('video.example.com', 'pref', 'hd'),
+    ]
+    sid = next(r for r in rows if r[5] == 'SID')
+    assert sid[1] is True and sid[3] is True and sid[4] == FUTURE
+
+
+def _wait_for_jar(store: BrowserCookieStore, domain: str, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        jar = store.cookiefile_for(domain)
+        if jar:
+            return jar
+        time.sleep(0.02)
+    return None
+
+
+def test_store_writes_netscape_jar(tmp_path):
+    db = str(tmp_path / 'cookies.sqlite')
+    _make_firefox_db(db)
+    store = BrowserCookieStore(db_path=db, cache_dir=str(tmp_path / 'jars'))
+
+    # 首次使用不等待提取：后台提取完成后才有 jar
+    jar = _wait_for_jar(store, 'www.example.com')
+
+    assert jar and os.path.isfile(jar)
+    with open(jar, encoding='utf-8') as f:
+        lines = [ln for ln in f.read().splitlines() if ln and not ln.startswith('#')]
+    assert '.example.com\tTRUE\t/\tTRUE\t%d\tSID\tabc' % FUTURE in lines
+    assert all('nope' not in ln for ln in lines)
+    # 缓存命中：不再重新提取
+    os.remove(db)
+    assert store.cookiefile_for('example.com') == jar
+
+
+def test_profile_extracted_once_for_all_domains(tmp_path, monkeypatch):
+    db = str(tmp_path / 'cookies.sqlite')
+    _make_firefox_db(db)
+    calls = []
+    real = cookies._read_profile_cookies
+
+    def _counting(path):
+        calls.append(path)
+        return real(path)
+
+    monkeypatch.setattr(cookies, '_read_profile_cookies', _counting)
+    store = BrowserCookieStore(cache_dir=str(tmp_path / 'jars'))
+    store.configure(db)
+
+    assert _wait_for_jar(store, 'example.com')
+    # 快照就绪后其它域名同步切分，不再提取
+    assert store.cookiefile_for('other.org')
+    assert store.cookiefile_for('missing.net') is None
+    assert len(calls) == 1
+
+    # 显式刷新会重新提取整个配置
+    assert store.refresh('example.com')
+    assert len(calls) == 2
+
+
+def test_missing_db_keeps_previous_jar(tmp_path):
+    db = str(tmp_path / 'cookies.sqlite')
+    _make_firefox_db(db)
+    store = BrowserCookieStore(db_path=db, cache_dir=str(tmp_path / 'jars'))
+    jar = store.refresh('example.com')
+    os.remove(db)
+
+    assert store.refresh('example.com') == jar
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='v10 fixture uses the Linux Chromium key')
+def test_chromium_encrypted_values_are_decrypted(tmp_path):
+    pytest.importorskip('yt_dlp.cookies')
+    db = _make_chromium_profile(str(tmp_path), [
+        ('.example.com', 'SID', '', _v10_encrypt('secret'), '/', _chromium_time(FUTURE), 1),
+        ('.example.com', 'plain', 'visible', b'', '/', 0, 0),
+        ('.example.com', 'old', '', _v10_encrypt('gone'), '/', _chromium_time(PAST), 0),
+        ('.other.org', 'SID', '', _v10_encrypt('nope'), '/', _chromium_time(FUTURE), 0),
+    ])
+
+    rows = _read_cookie_rows(db, 'example.com')
+
+    assert sorted((r[5], r[6]) for r in rows) == [('SID', 'secret'), ('plain', 'visible')]
+    sid = next(r for r in rows if r[5] == 'SID')
+    assert sid[4] == FUTURE and sid[3] is True
@@ -0,0 +1,144 @@
+"""
+WindowPolicy 在注入时钟下的测试：时段边界、跨午夜时段、并发/带宽上限
+"""
+
+from datetime import datetime
+
+import pytest
+
+from core.schedule import WindowPolicy, WindowLimits, parse_windows, parse_rate
+
+
+class FakeClock:
+    """可手动推进的时钟（本地时间）"""
+
+    def __init__(self, when: datetime):
+        self.now = when.timestamp()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def set(self, when: datetime) -> None:
+        self.now = when.timestamp()
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+# 2024-01-01 是周一；选在一月避开夏令时切换
+MONDAY = datetime(2024, 1, 1)
+
+
+def _at(day: int, hour: int, minute: int = 0, second: int = 0) -> datetime:
+    """周一起第 day 天（0=周一）的本地时间"""
+    return MONDAY.replace(day=1 + day, hour=hour, minute=minute, second=second)
+
+
+def test_window_boundaries_are_start_inclusive_end_exclusive():
+    clock = FakeClock(_at(0, 8, 59, 59))
+    policy = WindowPolicy.from_text('09:00-18:00 slots=2', clock=clock)
+
+    assert policy.limits() == WindowLimits()
+    clock.set(_at(0, 9))
+    assert policy.limits().max_slots == 2
+    clock.set(_at(0, 17, 59, 59))
+    assert policy.limits().max_slots == 2
+    clock.set(_at(0, 18))
+    assert policy.limits() == WindowLimits()
+
+
+def test_seconds_to_boundary_follows_fake_clock():
+    clock = FakeClock(_at(0, 8, 30))
+    policy = WindowPolicy.from_text('09:00-18:00 slots=2', clock=clock)
+
+    assert policy.seconds_to_boundary() == 30 * 60
+    clock.advance(29 * 60 + 15)
+    assert policy.seconds_to_boundary() == 45
+    clock.set(_at(0, 9))
+    assert policy.seconds_to_boundary(horizon=24 * 3600) == 9 * 3600
+    # 超出 horizon 时返回 horizon
+    assert policy.seconds_to_boundary(horizon=3600) == 3600
+
+
+def test_window_wrapping_past_midnight():
+    clock = FakeClock(_at(0, 22, 59))
+    policy = WindowPolicy.from_text('23:00-07:00 slots=16', clock=clock)
+
+    assert policy.limits().max_slots is None
+    assert policy.seconds_to_boundary() == 60
+    clock.set(_at(0, 23))
+    assert policy.limits().max_slots == 16
+    clock.set(_at(1, 0))
+    assert policy.limits().max_slots == 16
+    clock.set(_at(1, 6, 59))
+    assert policy.limits().max_slots == 16
+    clock.set(_at(1, 7))
+    assert policy.limits().max_slots is None
+
+
+def test_wrapping_window_days_belong_to_start_day():
+    # 周五夜间开始的时段延续到周六早上；周六夜间不生效
+    clock = FakeClock(_at(4, 23, 30))
+    policy = WindowPolicy.from_text('23:00-07:00 days=5 pause', clock=clock)
+
+    assert policy.limits().paused
+    clock.set(_at(5, 3))
+    assert policy.limits().paused
+    clock.set(_at(5, 23, 30))
+    assert not policy.limits().paused
+    clock.set(_at(3, 23, 30))
+    assert not policy.limits().paused
+
+
+def test_rate_and_slot_caps_switch_with_clock():
+    text = '\n'.join([
+        '12:00-13:00 pause',
+        '09:00-18:00 days=1-5 slots=2 rate=2M',
+        '01:00-07:00 slots=16',
+    ])
+    clock = FakeClock(_at(0, 10))
+    policy = WindowPolicy.from_text(text, clock=clock)
+
+    limits = policy.limits()
+    assert (limits.max_slots, limits.rate_limit, limits.paused) == (2, 2 * 1024 ** 2, False)
+
+    # 第一条匹配的规则生效：午间暂停覆盖工作时段规则
+    clock.set(_at(0, 12, 30))
+    limits = policy.limits()
+    assert limits.paused and limits.max_slots is None and limits.rate_limit is None
+    assert policy.seconds_to_boundary() == 30 * 60
+
+    clock.set(_at(0, 3))
+    limits = policy.limits()
+    assert (limits.max_slots, limits.rate_limit) == (16, None)
+
+    # 周末不受工作时段规则限制，但午间暂停仍然生效
+    clock.set(_at(5, 10))
+    assert policy.limits() == WindowLimits()
+    clock.set(_at(5, 12, 30))
+    assert policy.limits().paused
+
+
+def test_explicit_now_overrides_clock():
+    clock = FakeClock(_at(0, 3))
+    policy = WindowPolicy.from_text('09:00-18:00 slots=2', clock=clock)
+
+    assert policy.limits(_at(0, 10).timestamp()).max_slots == 2
+    assert policy.limits().max_slots is None
+
+
+def test_invalid_lines_are_reported_and_skipped():
+    windows, errors = parse_windows('09:00-18:00 slots=2\n25:00-26:00 slots=1\n10:00-11:00 rate=fast\n# 注释')
+    assert len(windows) == 1
+    assert errors == ['25:00-26:00 slots=1', '10:00-11:00 rate=fast']
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('500K', 500 * 1024),
+    ('1.5M', int(1.5 * 1024 ** 2)),
+    ('2MiB/s', 2 * 1024 ** 2),
+    ('100', 100),
+    ('fast', None),
+])
+def test_parse_rate(text, expected):
+    assert parse_rate(text) == expected
@@ -0,0 +1,51 @@
+"""
+publish() 把暂存目录中的文件移动到下载目录的测试
+"""
+
+import os
+
+from core.scratch import publish
+
+
+def _write(path: str, data: bytes) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_publish_moves_files_and_skips_temp_files(tmp_path):
+    scratch, out = str(tmp_path / 'scratch'), str(tmp_path / 'out')
+    final = _write(os.path.join(scratch, 'List', 'Video.mp4'), b'video')
+    _write(os.path.join(scratch, 'List', 'Video.jpg'), b'cover')
+    _write(os.path.join(scratch, 'Other.f137.mp4.part'), b'partial')
+
+    moved = publish(scratch, out, final)
+
+    assert moved == os.path.join(out, 'List', 'Video.mp4')
+    assert _read(moved) == b'video'
+    assert _read(os.path.join(out, 'List', 'Video.jpg')) == b'cover'
+    assert not os.path.exists(os.path.join(out, 'Other.f137.mp4.part'))
+    assert not os.path.exists(final)
+
+
+def test_publish_never_overwrites_and_keeps_new_download(tmp_path):
+    scratch, out = str(tmp_path / 'scratch'), str(tmp_path / 'out')
+    _write(os.path.join(out, 'Video.mp4'), b'old')
+    _write(os.path.join(out, 'Video-1.jpg'), b'old cover')
+    final = _write(os.path.join(scratch, 'Video.mp4'), b'new')
+    _write(os.path.join(scratch, 'Video.jpg'), b'new cover')
+
+    moved = publish(scratch, out, final)
+
+    # 已有文件保持不变；新文件与封面使用同一个空闲序号
+    assert _read(os.path.join(out, 'Video.mp4')) == b'old'
+    assert _read(os.path.join(out, 'Video-1.jpg')) == b'old cover'
+    assert moved == os.path.join(out, 'Video-2.mp4')
+    assert _read(moved) == b'new'
+    assert _read(os.path.join(out, 'Video-2.jpg')) == b'new cover'